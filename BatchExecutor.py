@@ -0,0 +1,197 @@
+import signal
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from Instrumentation import ListSink, set_sink, emit, is_enabled
+from DeviceScheduler import DeviceScheduler
+
+STATUS_PROCESSED = "processed"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+# 单个压缩包的处理结果，reason 是简短的机器可读原因，便于调用方汇总
+ZipResult = namedtuple('ZipResult', ['path', 'status', 'reason'])
+# 去重时与其它压缩包内容相同、因此未处理的压缩包：ZipResult(路径, STATUS_SKIPPED, DUPLICATE_REASON)
+DUPLICATE_REASON = "duplicate"
+
+def _run_with_captured_log(func, zip_path, kwargs, capture_spans=False):
+    # 在子进程中执行，日志（以及开启统计时的 span）先缓存下来，整体交回主进程按顺序输出
+    lines = []
+    spans = ListSink() if capture_spans else None
+    previous_sink = set_sink(spans)
+    try:
+        result = func(zip_path, logger=lines.append, **kwargs)
+    except Exception as e:
+        lines.append(f"错误: 处理 '{zip_path}' 时发生未捕获的错误: {e}")
+        lines.append(traceback.format_exc())
+        result = ZipResult(zip_path, STATUS_FAILED, "error")
+    finally:
+        set_sink(previous_sink)
+    return result, lines, spans.records if spans is not None else []
+
+def summarize_results(results):
+    counts = {STATUS_PROCESSED: 0, STATUS_SKIPPED: 0, STATUS_FAILED: 0}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    return counts
+
+def _ignore_interrupts():
+    # 子进程不响应 Ctrl+C，由主进程决定是取消后续任务还是整体中断，避免压缩包写到一半
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _cancelled(cancel):
+    return cancel is not None and cancel.is_set()
+
+def _archive_kwargs(kwargs, prefetcher, zip_path):
+    # 有预读时把这个压缩包的预读结果作为 prefetched 参数传给处理函数
+    if prefetcher is None:
+        return kwargs
+    return dict(kwargs, prefetched=prefetcher.take(zip_path))
+
+def _log_prefetch_summary(prefetcher, logger):
+    if prefetcher is not None and is_enabled():
+        logger(prefetcher.summary_line())
+
+def _log_device_summary(scheduler, logger):
+    # 跨多个设备或开启了统计时输出各设备的吞吐量
+    lines = scheduler.summary_lines()
+    if len(lines) > 1 or (lines and is_enabled()):
+        logger("\n各设备吞吐量:")
+        for line in lines:
+            logger(line)
+
+def run_batch(func, zip_paths, logger=print, jobs=1, header="", progress=None, cancel=None, device_limit=None,
+              prefetcher=None, **kwargs):
+    """对每个压缩包执行 func(zip_path, logger=..., **kwargs)，按输入顺序返回 ZipResult 列表。
+
+    jobs <= 1 时在当前进程逐个执行；否则用进程池并行，每个压缩包的日志在完成后整体回放给 logger。
+    处理顺序由 DeviceScheduler 决定：不同设备并行推进，同一设备同时处理的数量不超过 device_limit
+    （为空时机械硬盘为 1，其余不限），设备内按目录和 inode 排序。
+    progress 不为空时，每完成一个压缩包调用一次 progress(已完成数, 总数, ZipResult)。
+    cancel 是 threading.Event，被设置后正在处理的压缩包会正常做完，其余的不再开始，也不出现在返回值里。
+    prefetcher 不为空时，处理当前压缩包的同时在后台预读接下来的几个（见 Prefetch.Prefetcher）。
+    """
+    total = len(zip_paths)
+    label = f" {header}" if header else ""
+    results = [None] * total
+    scheduler = DeviceScheduler(zip_paths, device_limit)
+    done = 0
+
+    if jobs is None or jobs <= 1 or total <= 1:
+        while (item := scheduler.next()) is not None:
+            if _cancelled(cancel):
+                logger(f"\n已取消: 剩余 {total - done} 个压缩包未处理。")
+                break
+            i, zip_path = item
+            done += 1
+            logger(f"\n--- ({done}/{total}){label} ---")
+            archive_kwargs = _archive_kwargs(kwargs, prefetcher, zip_path)
+            if prefetcher is not None:
+                prefetcher.schedule(scheduler.upcoming(prefetcher.depth))
+            results[i] = func(zip_path, logger=logger, **archive_kwargs)
+            scheduler.done(i, results[i].status == STATUS_PROCESSED)
+            if progress is not None:
+                progress(done, total, results[i])
+        _log_device_summary(scheduler, logger)
+        _log_prefetch_summary(prefetcher, logger)
+        return [result for result in results if result is not None]
+
+    pending = {}
+    cancel_requested = False
+    with ProcessPoolExecutor(max_workers=min(jobs, total), initializer=_ignore_interrupts) as executor:
+        while True:
+            if _cancelled(cancel) and not cancel_requested:
+                cancel_requested = True
+                # 还没开始的压缩包不再提交，已在子进程中运行的照常做完
+                logger(f"\n已取消: 剩余 {scheduler.remaining()} 个压缩包未处理，等待正在处理的压缩包完成...")
+            # 只在有空闲进程时才从调度器取任务，这样各设备的在途数量就是实际正在处理的数量
+            while not cancel_requested and len(pending) < jobs:
+                item = scheduler.next()
+                if item is None:
+                    break
+                i, zip_path = item
+                pending[executor.submit(_run_with_captured_log, func, zip_path,
+                                        _archive_kwargs(kwargs, prefetcher, zip_path), is_enabled())] = i
+            if prefetcher is not None and not cancel_requested:
+                prefetcher.schedule(scheduler.upcoming(prefetcher.depth))
+            if not pending:
+                break
+            for future in wait(pending, return_when=FIRST_COMPLETED).done:
+                i = pending.pop(future)
+                done += 1
+                try:
+                    result, lines, spans = future.result()
+                except Exception as e:
+                    # 子进程崩溃或参数无法序列化等情况，不影响其余压缩包
+                    result = ZipResult(zip_paths[i], STATUS_FAILED, "error")
+                    lines, spans = [f"错误: 工作进程处理 '{zip_paths[i]}' 失败, 原因: {e}"], []
+                for record in spans:
+                    emit(record)
+                logger(f"\n--- ({done}/{total}){label} ---")
+                for line in lines:
+                    logger(line)
+                results[i] = result
+                scheduler.done(i, result.status == STATUS_PROCESSED)
+                if progress is not None:
+                    progress(done, total, result)
+    _log_device_summary(scheduler, logger)
+    _log_prefetch_summary(prefetcher, logger)
+    return [result for result in results if result is not None]
+
+def run_pipeline(func, zip_paths, logger=print, jobs=1, header="", progress=None, cancel=None, prefetcher=None,
+                 **kwargs):
+    """与 run_batch 相同，但 zip_paths 可以是边查找边产出的迭代器，发现一个就提交一个。
+
+    总数事先未知，progress 的总数参数为 None；同时在途的压缩包最多 jobs * 2 个，
+    查找/去重会在进程池忙碌时暂停，不会把整个书库一次性读进内存。结果按完成顺序返回。
+    有 prefetcher 时迭代器会提前取出 prefetcher.depth 个路径用于预读。
+    """
+    label = f" {header}" if header else ""
+    results = []
+    if prefetcher is not None:
+        zip_paths = prefetcher.lookahead(zip_paths)
+
+    if jobs is None or jobs <= 1:
+        for zip_path in zip_paths:
+            if _cancelled(cancel):
+                logger("\n已取消: 剩余压缩包不再处理。")
+                break
+            logger(f"\n--- ({len(results)+1}){label} ---")
+            results.append(func(zip_path, logger=logger, **_archive_kwargs(kwargs, prefetcher, zip_path)))
+            if progress is not None:
+                progress(len(results), None, results[-1])
+        _log_prefetch_summary(prefetcher, logger)
+        return results
+
+    def collect(finished):
+        for future in finished:
+            zip_path = pending.pop(future)
+            try:
+                result, lines, spans = future.result()
+            except Exception as e:
+                result = ZipResult(zip_path, STATUS_FAILED, "error")
+                lines, spans = [f"错误: 工作进程处理 '{zip_path}' 失败, 原因: {e}"], []
+            for record in spans:
+                emit(record)
+            results.append(result)
+            logger(f"\n--- ({len(results)}){label} ---")
+            for line in lines:
+                logger(line)
+            if progress is not None:
+                progress(len(results), None, result)
+
+    pending = {}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_ignore_interrupts) as executor:
+        for zip_path in zip_paths:
+            if _cancelled(cancel):
+                logger("\n已取消: 等待正在处理的压缩包完成...")
+                break
+            pending[executor.submit(_run_with_captured_log, func, zip_path,
+                                    _archive_kwargs(kwargs, prefetcher, zip_path), is_enabled())] = zip_path
+            if len(pending) >= jobs * 2:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        while pending:
+            collect(wait(pending, return_when=FIRST_COMPLETED).done)
+    _log_prefetch_summary(prefetcher, logger)
+    return results
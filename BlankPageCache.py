@@ -0,0 +1,72 @@
+import io
+import zlib
+import zipfile
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from PIL import Image
+
+from ZipInternals import get_compressor
+
+DEFAULT_CACHE_BUDGET = 64 * 1024 * 1024
+
+# data 是编码后的图片，compressed_data 是按 compress_type 压缩后可直接写入压缩包的数据
+BlankPage = namedtuple('BlankPage', ['data', 'crc', 'file_size', 'compressed_data', 'compress_size', 'compress_type'])
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_bytes = 0
+_cache_budget = DEFAULT_CACHE_BUDGET
+
+def image_format_for_name(filename):
+    suffix = Path(filename).suffix.lower()
+    return 'JPEG' if suffix in ['.jpg', '.jpeg'] else suffix.lstrip('.').upper()
+
+def set_blank_page_cache_budget(max_bytes):
+    global _cache_budget
+    with _cache_lock:
+        _cache_budget = max_bytes
+        _evict_locked()
+
+def clear_blank_page_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+def _evict_locked():
+    global _cache_bytes
+    while _cache and _cache_bytes > _cache_budget:
+        _, page = _cache.popitem(last=False)
+        _cache_bytes -= len(page.data) + len(page.compressed_data)
+
+def _compress(data, compress_type, compresslevel):
+    compressor = get_compressor(compress_type, compresslevel)
+    if compressor is None:
+        return data
+    return compressor.compress(data) + compressor.flush()
+
+def _encode_blank_page(size, image_format, compress_type, compresslevel, save_options):
+    white_image = Image.new('RGB', size, 'white')
+    buffer = io.BytesIO()
+    white_image.save(buffer, format=image_format, **dict(save_options))
+    data = buffer.getvalue()
+    compressed_data = _compress(data, compress_type, compresslevel)
+    return BlankPage(data, zlib.crc32(data), len(data), compressed_data, len(compressed_data), compress_type)
+
+def get_blank_page(size, image_format, compress_type=zipfile.ZIP_DEFLATED, compresslevel=None, **save_options):
+    """返回指定尺寸/格式的纯白页面，同一进程内按 (宽, 高, 格式, 编码参数, 压缩方式) 复用编码结果"""
+    global _cache_bytes
+    key = (tuple(size), image_format, tuple(sorted(save_options.items())), compress_type, compresslevel)
+    with _cache_lock:
+        page = _cache.get(key)
+        if page is not None:
+            _cache.move_to_end(key)
+            return page
+    page = _encode_blank_page(tuple(size), image_format, compress_type, compresslevel, key[2])
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = page
+            _cache_bytes += len(page.data) + len(page.compressed_data)
+            _evict_locked()
+    return page
@@ -0,0 +1,215 @@
+import os
+import mmap
+import struct
+import zipfile
+from array import array
+
+EOCD_SIGNATURE = b'PK\x05\x06'
+EOCD_STRUCT = struct.Struct('<4s4H2LH')
+ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_LOCATOR_STRUCT = struct.Struct('<4sLQL')
+ZIP64_EOCD_SIGNATURE = b'PK\x06\x06'
+ZIP64_EOCD_STRUCT = struct.Struct('<4sQ2H2L4Q')
+CENTRAL_HEADER_SIGNATURE = b'PK\x01\x02'
+CENTRAL_HEADER_STRUCT = struct.Struct('<4s4B4HL2L5H2L')
+ZIP64_EXTRA_ID = 0x0001
+UTF8_FLAG = 0x800
+# EOCD 之后最多还有 65535 字节的注释
+EOCD_SEARCH_SIZE = EOCD_STRUCT.size + 0xFFFF
+
+def _map_region(fileno, file_size, start):
+    # mmap 的起点必须按分配粒度对齐，返回 (映射, 映射起点)
+    aligned = start - start % mmap.ALLOCATIONGRANULARITY
+    return mmap.mmap(fileno, file_size - aligned, access=mmap.ACCESS_READ, offset=aligned), aligned
+
+class CentralDirectoryEntry:
+    """CentralDirectory 中一个条目的只读视图，提供 ZipArchiveIndex 用到的 ZipInfo 属性"""
+    __slots__ = ('directory', 'index')
+
+    def __init__(self, directory, index):
+        self.directory = directory
+        self.index = index
+
+    @property
+    def filename(self):
+        raw_name = self.directory.raw_names[self.index]
+        # 与 zipfile 相同：有 UTF-8 标志按 UTF-8 解码，否则按 cp437
+        filename = raw_name.decode('utf-8' if self.flag_bits & UTF8_FLAG else 'cp437')
+        # 与 ZipInfo.__init__ 相同：在 NUL 处截断，Windows 上把路径分隔符统一为 '/'
+        null_byte = filename.find(chr(0))
+        if null_byte >= 0:
+            filename = filename[0:null_byte]
+        if os.sep != "/" and os.sep in filename:
+            filename = filename.replace(os.sep, "/")
+        return filename
+
+    @property
+    def flag_bits(self):
+        return self.directory.flag_bits[self.index]
+
+    @property
+    def compress_type(self):
+        return self.directory.compress_types[self.index]
+
+    @property
+    def CRC(self):
+        return self.directory.crcs[self.index]
+
+    @property
+    def compress_size(self):
+        return self.directory.compress_sizes[self.index]
+
+    @property
+    def file_size(self):
+        return self.directory.file_sizes[self.index]
+
+    @property
+    def header_offset(self):
+        return self.directory.header_offsets[self.index]
+
+    def is_dir(self):
+        return self.filename.endswith('/')
+
+class CentralDirectory:
+    """只解析中央目录里的文件名、标志、压缩方式、CRC、大小和偏移，数值字段存放在 array 里。
+
+    用于演练、跳过判断等只需要文件列表的场合，比 zipfile.ZipFile 为每个条目构造完整 ZipInfo 更省时省内存。
+    """
+
+    def __init__(self):
+        self.raw_names = []
+        self.flag_bits = array('H')
+        self.compress_types = array('H')
+        self.crcs = array('L')
+        self.compress_sizes = array('Q')
+        self.file_sizes = array('Q')
+        self.header_offsets = array('Q')
+        self.start_dir = 0
+        self.file_size = 0
+
+    def __len__(self):
+        return len(self.raw_names)
+
+    def infolist(self):
+        return [CentralDirectoryEntry(self, i) for i in range(len(self.raw_names))]
+
+def _find_eocd(view, view_start, file_size):
+    # 注释里也可能出现 EOCD 签名：从后往前找注释长度恰好延伸到文件末尾的那一个，
+    # 都不符合时（文件末尾有多余数据）与 zipfile 一样取最后一个
+    search_start = max(0, file_size - EOCD_SEARCH_SIZE - view_start)
+    fallback = -1
+    position = len(view)
+    while True:
+        position = view.rfind(EOCD_SIGNATURE, search_start, position)
+        if position < 0:
+            break
+        if position + EOCD_STRUCT.size <= len(view):
+            if fallback < 0:
+                fallback = position
+            comment_length = EOCD_STRUCT.unpack_from(view, position)[-1]
+            if view_start + position + EOCD_STRUCT.size + comment_length == file_size:
+                return position
+    if fallback < 0:
+        raise zipfile.BadZipFile("File is not a zip file")
+    return fallback
+
+def locate_central_directory(view, view_start, file_size):
+    """返回 (中央目录偏移, 中央目录大小, 条目数, 前置数据长度)"""
+    eocd_pos = _find_eocd(view, view_start, file_size)
+    (_, disk_number, disk_start, _, count, cd_size, cd_offset,
+     _) = EOCD_STRUCT.unpack_from(view, eocd_pos)
+    eocd_offset = view_start + eocd_pos
+    locator_pos = eocd_pos - ZIP64_LOCATOR_STRUCT.size
+    if locator_pos >= 0 and view[locator_pos:locator_pos + 4] == ZIP64_LOCATOR_SIGNATURE:
+        _, disk_number, _, disks = ZIP64_LOCATOR_STRUCT.unpack_from(view, locator_pos)
+        if disk_number != 0 or disks > 1:
+            raise zipfile.BadZipFile("zipfiles that span multiple disks are not supported")
+        record_pos = locator_pos - ZIP64_EOCD_STRUCT.size
+        if record_pos >= 0 and view[record_pos:record_pos + 4] == ZIP64_EOCD_SIGNATURE:
+            (_, _, _, _, disk_number, disk_start, _, count, cd_size,
+             cd_offset) = ZIP64_EOCD_STRUCT.unpack_from(view, record_pos)
+            eocd_offset = view_start + record_pos
+    elif disk_number != 0 or disk_start != 0:
+        raise zipfile.BadZipFile("zipfiles that span multiple disks are not supported")
+    # 压缩包前面拼接了其它数据（例如自解压程序）时，记录里的偏移需要整体后移
+    concat = eocd_offset - cd_size - cd_offset
+    if concat < 0:
+        raise zipfile.BadZipFile("Bad offset for central directory")
+    return cd_offset + concat, cd_size, count, concat
+
+def _apply_zip64_extra(extra, file_size, compress_size, header_offset):
+    position = 0
+    while position + 4 <= len(extra):
+        extra_id, length = struct.unpack_from('<HH', extra, position)
+        if extra_id == ZIP64_EXTRA_ID:
+            data_pos, data_end = position + 4, position + 4 + length
+            try:
+                if file_size == 0xFFFFFFFF:
+                    file_size, = struct.unpack_from('<Q', extra[:data_end], data_pos)
+                    data_pos += 8
+                if compress_size == 0xFFFFFFFF:
+                    compress_size, = struct.unpack_from('<Q', extra[:data_end], data_pos)
+                    data_pos += 8
+                if header_offset == 0xFFFFFFFF:
+                    header_offset, = struct.unpack_from('<Q', extra[:data_end], data_pos)
+            except struct.error:
+                raise zipfile.BadZipFile("Corrupt zip64 extra field") from None
+            break
+        position += 4 + length
+    return file_size, compress_size, header_offset
+
+def parse_central_directory(view, view_start, file_size):
+    """从覆盖文件 [view_start, file_size) 的缓冲区（mmap 或 bytes）中解析中央目录，返回 CentralDirectory。
+
+    缓冲区不包含整个中央目录时抛出 BadZipFile。
+    """
+    directory = CentralDirectory()
+    directory.file_size = file_size
+    cd_offset, cd_size, _, concat = locate_central_directory(view, view_start, file_size)
+    if cd_offset < view_start:
+        raise zipfile.BadZipFile("Central directory is outside of the buffer")
+    directory.start_dir = cd_offset
+
+    position = cd_offset - view_start
+    end = position + cd_size
+    header_size = CENTRAL_HEADER_STRUCT.size
+    while position < end:
+        if position + header_size > len(view):
+            raise zipfile.BadZipFile("Truncated central directory")
+        header = CENTRAL_HEADER_STRUCT.unpack_from(view, position)
+        if header[0] != CENTRAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile("Bad magic number for central directory")
+        flag_bits, compress_type = header[5], header[6]
+        crc, compress_size, file_size_field = header[9], header[10], header[11]
+        name_length, extra_length, comment_length = header[12], header[13], header[14]
+        header_offset = header[18]
+        name_start = position + header_size
+        extra_start = name_start + name_length
+        directory.raw_names.append(bytes(view[name_start:extra_start]))
+        if 0xFFFFFFFF in (file_size_field, compress_size, header_offset):
+            file_size_field, compress_size, header_offset = _apply_zip64_extra(
+                view[extra_start:extra_start + extra_length], file_size_field, compress_size, header_offset)
+        directory.flag_bits.append(flag_bits)
+        directory.compress_types.append(compress_type)
+        directory.crcs.append(crc)
+        directory.compress_sizes.append(compress_size)
+        directory.file_sizes.append(file_size_field)
+        directory.header_offsets.append(header_offset + concat)
+        position = extra_start + extra_length + comment_length
+    return directory
+
+def read_central_directory(zip_path):
+    """用 mmap 映射文件末尾，定位 EOCD/Zip64 记录后只解析中央目录，返回 CentralDirectory"""
+    with open(zip_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < EOCD_STRUCT.size:
+            raise zipfile.BadZipFile("File is not a zip file")
+        view, view_start = _map_region(f.fileno(), file_size, max(0, file_size - EOCD_SEARCH_SIZE))
+        try:
+            cd_offset = locate_central_directory(view, view_start, file_size)[0]
+            if cd_offset < view_start:
+                view.close()
+                view, view_start = _map_region(f.fileno(), file_size, cd_offset)
+            return parse_central_directory(view, view_start, file_size)
+        finally:
+            view.close()
@@ -0,0 +1,146 @@
+import os
+import time
+from collections import deque
+
+# 机械硬盘同时只处理一个压缩包，避免磁头在几个文件之间来回寻道
+ROTATIONAL_DEVICE_JOBS = 1
+
+def _is_rotational(dev):
+    """Linux 下根据 /sys/dev/block 判断设备是否为机械硬盘，无法判断时返回 False"""
+    try:
+        base = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+    except (AttributeError, OverflowError, ValueError):
+        return False
+    # 分区没有自己的 queue 目录，需要看所属的整块磁盘
+    for path in (os.path.join(base, 'queue', 'rotational'), os.path.join(base, '..', 'queue', 'rotational')):
+        try:
+            with open(path) as f:
+                return f.read().strip() == '1'
+        except OSError:
+            continue
+    return False
+
+def _mount_point(path, dev):
+    # 沿父目录向上，直到所在设备改变
+    current = os.path.dirname(os.path.abspath(path))
+    while True:
+        parent = os.path.dirname(current)
+        if parent == current:
+            return current
+        try:
+            if os.stat(parent).st_dev != dev:
+                return current
+        except OSError:
+            return current
+        current = parent
+
+def device_label(dev, sample_path):
+    try:
+        name = f"{os.major(dev)}:{os.minor(dev)}"
+    except (AttributeError, OverflowError, ValueError):
+        name = str(dev)
+    return f"{name} ({_mount_point(sample_path, dev)})"
+
+class _DeviceQueue:
+    def __init__(self, dev, limit, label):
+        self.dev = dev
+        self.limit = limit
+        self.label = label
+        self.pending = deque()  # (序号, 路径)，已按目录和 inode 排好序
+        self.in_flight = 0
+        self.archives = 0
+        self.bytes = 0
+        self.started = None
+        self.finished = None
+
+class DeviceScheduler:
+    """按所在设备(st_dev)调度一批压缩包：不同设备并行推进，每个设备同时处理的数量有上限。
+
+    同一设备内按目录、再按 inode 排序，让读写尽量顺着磁盘上的布局进行。
+    device_limit 为空时机械硬盘限制为 ROTATIONAL_DEVICE_JOBS 个，其余设备不限制（只受进程数限制）。
+    """
+
+    def __init__(self, zip_paths, device_limit=None):
+        self.devices = {}
+        self.device_of = {}
+        self.sizes = {}
+        entries = []
+        for i, zip_path in enumerate(zip_paths):
+            try:
+                st = os.stat(zip_path)
+                dev, ino, size = st.st_dev, st.st_ino, st.st_size
+            except OSError:
+                # 无法访问的文件交给处理函数报告错误
+                dev, ino, size = None, 0, 0
+            entries.append((dev, os.path.dirname(zip_path), ino, i, zip_path, size))
+        for dev, _, _, i, zip_path, size in sorted(entries, key=lambda e: (str(e[0]), e[1], e[2], e[3])):
+            queue = self.devices.get(dev)
+            if queue is None:
+                limit = device_limit
+                if limit is None and dev is not None and _is_rotational(dev):
+                    limit = ROTATIONAL_DEVICE_JOBS
+                label = device_label(dev, zip_path) if dev is not None else "?"
+                queue = self.devices[dev] = _DeviceQueue(dev, limit, label)
+            queue.pending.append((i, zip_path))
+            self.device_of[i] = queue
+            self.sizes[i] = size
+        self.rotation = deque(self.devices.values())
+
+    def remaining(self):
+        return sum(len(queue.pending) for queue in self.devices.values())
+
+    def next(self):
+        """返回下一个可以开始的 (序号, 路径)；所有设备都已达到上限或没有剩余时返回 None"""
+        best = None
+        for queue in self.rotation:
+            if not queue.pending or (queue.limit is not None and queue.in_flight >= queue.limit):
+                continue
+            if best is None or queue.in_flight < best.in_flight:
+                best = queue
+        if best is None:
+            return None
+        # 轮转起点，在途数量相同的设备轮流获得下一个名额
+        self.rotation.remove(best)
+        self.rotation.append(best)
+        best.in_flight += 1
+        if best.started is None:
+            best.started = time.perf_counter()
+        return best.pending.popleft()
+
+    def upcoming(self, count):
+        """按设备轮转顺序估计接下来会开始的 count 个路径（不考虑并发上限），供预读使用"""
+        paths = []
+        iterators = [iter(queue.pending) for queue in self.rotation if queue.pending]
+        while iterators and len(paths) < count:
+            for iterator in list(iterators):
+                item = next(iterator, None)
+                if item is None:
+                    iterators.remove(iterator)
+                    continue
+                paths.append(item[1])
+                if len(paths) >= count:
+                    break
+        return paths
+
+    def done(self, index, rewritten=True):
+        # 跳过的压缩包只读了中央目录，不计入数据量
+        queue = self.device_of[index]
+        queue.in_flight -= 1
+        queue.archives += 1
+        if rewritten:
+            queue.bytes += self.sizes[index]
+        queue.finished = time.perf_counter()
+
+    def summary_lines(self):
+        """每个设备一行：完成的压缩包数、改写的数据量（按处理前的大小）和吞吐量（从第一个开始到最后一个完成）"""
+        lines = []
+        for queue in self.devices.values():
+            if not queue.archives:
+                continue
+            elapsed = queue.finished - queue.started
+            megabytes = queue.bytes / (1024 * 1024)
+            rate = f"{megabytes / elapsed:.1f} MB/s" if elapsed > 0 and megabytes else "-"
+            limit = f", 并发上限 {queue.limit}" if queue.limit is not None else ""
+            lines.append(f"  设备 {queue.label}: {queue.archives} 个压缩包, {megabytes:.1f} MB, "
+                         f"{elapsed:.1f} 秒, {rate}{limit}")
+        return lines
@@ -0,0 +1,98 @@
+import os
+
+from ZipWriteLogic import iter_zip_files
+
+STATUS_PENDING = "pending"
+# 后台展开文件夹时每找到这么多个压缩包交给界面一次
+EXPAND_BATCH_SIZE = 500
+
+def _path_key(path):
+    # 同一文件用不同写法（相对路径、大小写不敏感的文件系统）拖入时也能去重
+    return os.path.normcase(os.path.abspath(path))
+
+class FileListModel:
+    """GUI 文件列表的数据：拖入的原始路径、展开后的压缩包行及每行的状态。
+
+    只在主线程中修改；视图按行号读取 paths/statuses，不需要为每个压缩包创建控件。
+    """
+
+    def __init__(self):
+        self.roots = []
+        self.paths = []
+        self.statuses = []
+        self.rows = {}
+        self._root_keys = set()
+        self.counts = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add_roots(self, paths):
+        """登记拖入的路径，返回其中新出现的（已拖入过的不再展开）"""
+        added = []
+        for path in paths:
+            key = _path_key(path)
+            if key not in self._root_keys:
+                self._root_keys.add(key)
+                self.roots.append(path)
+                added.append(path)
+        return added
+
+    def add(self, path, status=STATUS_PENDING):
+        """追加一行，返回行号；已在列表中的返回 None"""
+        key = _path_key(path)
+        if key in self.rows:
+            return None
+        row = self.rows[key] = len(self.paths)
+        self.paths.append(path)
+        self.statuses.append(status)
+        self.counts[status] = self.counts.get(status, 0) + 1
+        return row
+
+    def set_status(self, path, status):
+        """更新一行的状态并返回行号；处理过程中才发现的压缩包追加在末尾"""
+        row = self.rows.get(_path_key(path))
+        if row is None:
+            return self.add(path, status)
+        old = self.statuses[row]
+        if old != status:
+            self.statuses[row] = status
+            self.counts[old] -= 1
+            self.counts[status] = self.counts.get(status, 0) + 1
+        return row
+
+    def reset_statuses(self):
+        self.statuses = [STATUS_PENDING] * len(self.paths)
+        self.counts = {STATUS_PENDING: len(self.paths)} if self.paths else {}
+
+    def mark_pending_as(self, status):
+        # 处理结束后仍是待处理的行（例如去重时被判定为重复）统一改为 status
+        changed = self.counts.pop(STATUS_PENDING, 0)
+        if changed:
+            self.statuses = [status if s == STATUS_PENDING else s for s in self.statuses]
+            self.counts[status] = self.counts.get(status, 0) + changed
+        return changed
+
+    def clear(self):
+        self.__init__()
+
+def expand_paths(paths, on_batch, logger=print, cancel=None, batch_size=EXPAND_BATCH_SIZE):
+    """在后台线程中展开拖入的文件和文件夹，每找到 batch_size 个压缩包调用一次 on_batch(路径列表)。
+
+    使用与处理时相同的 iter_zip_files，列表中显示的就是实际会被处理的压缩包。返回找到的总数。
+    """
+    batch = []
+    total = 0
+    for zip_path in iter_zip_files(paths, logger=logger):
+        if cancel is not None and cancel.is_set():
+            break
+        batch.append(zip_path)
+        if len(batch) >= batch_size:
+            on_batch(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        on_batch(batch)
+        total += len(batch)
+    return total
+
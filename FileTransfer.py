@@ -0,0 +1,89 @@
+import os
+import errno
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，也没有 reflink
+    fcntl = None
+
+# linux/fs.h: FICLONERANGE = _IOW(0x94, 13, struct file_clone_range)
+FICLONERANGE = 0x4020940d
+FILE_CLONE_RANGE_STRUCT = struct.Struct('qQQQ')
+
+# 这些错误表示文件系统不支持克隆（例如 ext4），而不是这一次调用的参数问题
+REFLINK_UNSUPPORTED_ERRNOS = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.ENOSYS)
+
+# 不支持 reflink 的 (源设备, 目标设备) 组合，避免对每个条目都重复一次注定失败的 ioctl
+_reflink_unsupported = set()
+_copy_file_range_available = hasattr(os, 'copy_file_range')
+_sendfile_available = hasattr(os, 'sendfile')
+
+def _reflink(src_fd, src_offset, dst_fd, dst_offset, length):
+    # btrfs/XFS 上只增加共享区段的引用，不产生任何数据读写；偏移和长度都必须按块对齐
+    fcntl.ioctl(dst_fd, FICLONERANGE, FILE_CLONE_RANGE_STRUCT.pack(src_fd, src_offset, length, dst_offset))
+
+def _copy_bytes(src_fd, src_offset, dst_fd, dst_offset, length):
+    """用 copy_file_range 或 sendfile 在内核中复制，返回实际复制的字节数；遇到不支持或出错时提前返回"""
+    global _copy_file_range_available
+    copied = 0
+    if _copy_file_range_available:
+        try:
+            while copied < length:
+                count = os.copy_file_range(src_fd, dst_fd, length - copied,
+                                           src_offset + copied, dst_offset + copied)
+                if count == 0:
+                    return copied
+                copied += count
+            return copied
+        except OSError as e:
+            # 跨文件系统等情况改用 sendfile；真正的读写错误留给调用方的普通读写路径报告
+            if e.errno == errno.ENOSYS:
+                _copy_file_range_available = False
+    if _sendfile_available:
+        try:
+            # sendfile 写入目标文件的当前位置
+            os.lseek(dst_fd, dst_offset + copied, os.SEEK_SET)
+            while copied < length:
+                count = os.sendfile(dst_fd, src_fd, src_offset + copied, length - copied)
+                if count == 0:
+                    return copied
+                copied += count
+        except OSError:
+            pass
+    return copied
+
+def copy_range(src, src_offset, dst, dst_offset, length):
+    """把 src 文件中 [src_offset, src_offset + length) 的内容复制到 dst 的 dst_offset 处，不经过 Python 缓冲区。
+
+    src/dst 是已打开的文件对象，dst 中 dst_offset 之前的缓冲数据须已 flush。
+    依次尝试 reflink（按块对齐的中间部分）、copy_file_range、sendfile，返回已复制的字节数；
+    平台不支持时返回 0，未复制的剩余部分由调用方自行读写。
+    """
+    if length <= 0:
+        return 0
+    try:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+    copied = 0
+    if fcntl is not None:
+        src_stat, dst_stat = os.fstat(src_fd), os.fstat(dst_fd)
+        devices = (src_stat.st_dev, dst_stat.st_dev)
+        block = dst_stat.st_blksize or 4096
+        if devices not in _reflink_unsupported and (src_offset - dst_offset) % block == 0:
+            head = (-src_offset) % block
+            middle = (length - head) // block * block if length > head else 0
+            if middle:
+                # 先按字节复制到块边界，中间整块克隆，剩余的尾部在下面按字节复制
+                copied = _copy_bytes(src_fd, src_offset, dst_fd, dst_offset, head)
+                if copied < head:
+                    return copied
+                try:
+                    _reflink(src_fd, src_offset + head, dst_fd, dst_offset + head, middle)
+                    copied += middle
+                except OSError as e:
+                    if e.errno in REFLINK_UNSUPPORTED_ERRNOS:
+                        _reflink_unsupported.add(devices)
+    return copied + _copy_bytes(src_fd, src_offset + copied, dst_fd, dst_offset + copied, length - copied)
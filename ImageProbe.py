@@ -0,0 +1,97 @@
+import struct
+from PIL import Image
+
+PROBE_CHUNK_SIZE = 4096
+# JPEG 的 SOF 可能排在很大的 EXIF/ICC 段之后，超过这个距离就交给 PIL
+JPEG_PROBE_LIMIT = 1024 * 1024
+
+# SOF0-SOF15，去掉 DHT(C4)、JPG(C8)、DAC(CC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+class _StreamReader:
+    # 在不可随意回退的流（如 ZipExtFile）上按需读取，并记住已读的字节
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = bytearray()
+
+    def ensure(self, size):
+        while len(self.buffer) < size:
+            chunk = self.stream.read(max(PROBE_CHUNK_SIZE, size - len(self.buffer)))
+            if not chunk:
+                return False
+            self.buffer += chunk
+        return True
+
+def _probe_png(reader):
+    if reader.ensure(24) and reader.buffer[12:16] == b'IHDR':
+        return struct.unpack('>II', reader.buffer[16:24])
+    return None
+
+def _probe_gif(reader):
+    if reader.ensure(10):
+        return struct.unpack('<HH', reader.buffer[6:10])
+    return None
+
+def _probe_bmp(reader):
+    if not reader.ensure(26):
+        return None
+    header_size = struct.unpack('<I', reader.buffer[14:18])[0]
+    if header_size == 12:
+        return struct.unpack('<HH', reader.buffer[18:22])
+    width, height = struct.unpack('<ii', reader.buffer[18:26])
+    return width, abs(height)
+
+def _probe_jpeg(reader):
+    pos = 2
+    while pos < JPEG_PROBE_LIMIT:
+        if not reader.ensure(pos + 4):
+            return None
+        if reader.buffer[pos] != 0xFF:
+            return None
+        marker = reader.buffer[pos + 1]
+        if marker == 0xFF:  # 填充字节
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # 无长度字段的标记
+            pos += 2
+            continue
+        segment_length = struct.unpack('>H', reader.buffer[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            if not reader.ensure(pos + 9):
+                return None
+            height, width = struct.unpack('>HH', reader.buffer[pos + 5:pos + 9])
+            return width, height
+        if marker == 0xDA:  # 已到图像数据，仍未找到 SOF
+            return None
+        pos += 2 + segment_length
+    return None
+
+def probe_image_size(stream):
+    """只读取图片文件头来获取 (宽, 高)，支持 JPEG/PNG/GIF/BMP；无法识别时返回 None"""
+    reader = _StreamReader(stream)
+    if not reader.ensure(2):
+        return None
+    head = reader.buffer
+    if head[:2] == b'\xff\xd8':
+        size = _probe_jpeg(reader)
+    elif reader.ensure(8) and reader.buffer[:8] == b'\x89PNG\r\n\x1a\n':
+        size = _probe_png(reader)
+    elif reader.ensure(6) and reader.buffer[:6] in (b'GIF87a', b'GIF89a'):
+        size = _probe_gif(reader)
+    elif head[:2] == b'BM':
+        size = _probe_bmp(reader)
+    else:
+        size = None
+    if size is None or size[0] <= 0 or size[1] <= 0:
+        return None
+    return size
+
+def read_image_size(open_stream):
+    """open_stream 每次调用返回一个新的只读流；先尝试文件头解析，失败再用 PIL 打开"""
+    with open_stream() as f:
+        size = probe_image_size(f)
+    if size is not None:
+        return size
+    with open_stream() as f:
+        with Image.open(f) as img:
+            return img.size
@@ -0,0 +1,192 @@
+import json
+import functools
+import time
+import threading
+import unicodedata
+
+# 计时区间(span)的记录是一个字典: name、duration(秒)，以及可选的 archive 和下面这些累计计数
+SPAN_COUNTERS = ('bytes_read', 'bytes_written', 'bytes_decompressed', 'archives')
+
+_sink = None
+
+def set_sink(sink):
+    """设置全局输出目标，返回原来的目标；传入 None 即关闭统计"""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+def get_sink():
+    return _sink
+
+def is_enabled():
+    return _sink is not None
+
+class _NullSpan:
+    # 未开启统计时所有 span 共用这一个对象，不计时也不分配内存
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add(self, **counts):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    enabled = True
+
+    def __init__(self, sink, name, fields):
+        self.sink = sink
+        self.record = {"name": name, **fields}
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record["duration"] = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.sink.emit(self.record)
+        return False
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.record[key] = self.record.get(key, 0) + value
+
+def span(name, **fields):
+    """with span("rewrite", archive=path) as s: ...; s.add(bytes_written=n)"""
+    sink = _sink
+    if sink is None:
+        return _NULL_SPAN
+    return Span(sink, name, fields)
+
+def traced(name):
+    """装饰处理单个压缩包的函数 func(zip_path, ...)：每个压缩包一个 span，并记录结果状态"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(zip_path, *args, **kwargs):
+            if _sink is None:
+                return func(zip_path, *args, **kwargs)
+            with span(name, archive=zip_path, archives=1) as archive_span:
+                result = func(zip_path, *args, **kwargs)
+                if getattr(result, 'status', None):
+                    archive_span.record["status"] = result.status
+                return result
+        return wrapper
+    return decorate
+
+def traced_run(name):
+    """装饰整批处理的入口函数 func(paths, logger=..., ...)：整次运行一个 span，结束后输出汇总表"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(initial_paths, *args, logger=print, **kwargs):
+            if _sink is None:
+                return func(initial_paths, *args, logger=logger, **kwargs)
+            with span(name) as run_span:
+                results = func(initial_paths, *args, logger=logger, **kwargs)
+                run_span.add(archives=len(results))
+            log_summary(logger)
+            return results
+        return wrapper
+    return decorate
+
+def emit(record):
+    # 转发已经结束的 span，例如子进程里记录后交回主进程的
+    if _sink is not None:
+        _sink.emit(record)
+
+class ListSink:
+    """把记录保存在列表里，子进程用它收集 span 交回主进程"""
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+class JsonLinesSink:
+    """每个 span 写一行 JSON"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+# 汇总表第一列之后的列：(标题, 宽度)
+SUMMARY_COLUMNS = (('次数', 8), ('耗时(s)', 10), ('读取MB', 10), ('写入MB', 10), ('解压MB', 10), ('MB/s', 9), ('个/s', 9))
+
+def _pad(text, width, align):
+    # 按终端显示宽度补齐：中文等全角字符占两列，str.format 的宽度按字符数计算会错位
+    display_width = sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text)
+    padding = ' ' * max(0, width - display_width)
+    return text + padding if align == '<' else padding + text
+
+class AggregatingSink:
+    """按 span 名称汇总次数、总耗时和各项计数，用于运行结束时的汇总表"""
+
+    def __init__(self):
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def emit(self, record):
+        with self.lock:
+            total = self.totals.setdefault(record["name"], dict.fromkeys(('count', 'duration') + SPAN_COUNTERS, 0))
+            total['count'] += 1
+            total['duration'] += record.get("duration", 0.0)
+            for key in SPAN_COUNTERS:
+                total[key] += record.get(key, 0)
+
+    def summary_lines(self):
+        lines = [_pad('阶段', 20, '<') + "".join(_pad(title, width, '>') for title, width in SUMMARY_COLUMNS)]
+        for name, total in sorted(self.totals.items()):
+            duration = total['duration']
+            megabytes = (total['bytes_read'] + total['bytes_written']) / (1024 * 1024)
+            throughput = f"{megabytes / duration:.1f}" if duration > 0 and megabytes else "-"
+            archive_rate = f"{total['archives'] / duration:.1f}" if duration > 0 and total['archives'] else "-"
+            lines.append(f"{_pad(name, 20, '<')}{total['count']:>8}{duration:>10.3f}"
+                         f"{total['bytes_read'] / (1024 * 1024):>10.1f}{total['bytes_written'] / (1024 * 1024):>10.1f}"
+                         f"{total['bytes_decompressed'] / (1024 * 1024):>10.1f}{throughput:>9}{archive_rate:>9}")
+        return lines
+
+class TeeSink:
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def emit(self, record):
+        for sink in self.sinks:
+            sink.emit(record)
+
+    def summary_lines(self):
+        for sink in self.sinks:
+            if hasattr(sink, 'summary_lines'):
+                return sink.summary_lines()
+        return []
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+def log_summary(logger=print):
+    """当前目标支持汇总时，把汇总表输出到 logger"""
+    if _sink is None or not hasattr(_sink, 'summary_lines'):
+        return
+    lines = _sink.summary_lines()
+    if len(lines) > 1:
+        logger("\n耗时统计:")
+        for line in lines:
+            logger(line)
@@ -0,0 +1,236 @@
+import os
+import threading
+from bisect import bisect_right
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from CentralDirectory import EOCD_STRUCT, EOCD_SEARCH_SIZE, locate_central_directory, parse_central_directory
+from ZipArchiveIndex import ZipArchiveIndex
+from ZipCache import file_signature
+
+# 网络盘上每次读取都要等一个往返，这些线程只做读取，数量与 CPU 无关
+PREFETCH_WORKERS = 4
+# 所有已预读、尚未被取走的数据总量上限，以及单个压缩包的上限（超出的条目不预读，用到时再读）
+PREFETCH_BUDGET_BYTES = 64 * 1024 * 1024
+PREFETCH_ARCHIVE_LIMIT = 4 * 1024 * 1024
+# 只需要文件头的条目（例如取图片尺寸）预读的字节数
+PREFETCH_MEMBER_BYTES = 64 * 1024
+LOCAL_HEADER_SIZE = 30
+# 本地文件头的文件名和扩展字段长度要读到本地头才知道，按这个余量多读一些
+LOCAL_HEADER_SLACK = 1024
+
+# ranges 是按偏移排序的 [(偏移, 数据), ...]，最后一段是包含中央目录的文件末尾
+PrefetchedArchive = namedtuple('PrefetchedArchive', ['path', 'signature', 'size', 'ranges'])
+
+def prefetch_archive(zip_path, reads_planner, limit=PREFETCH_ARCHIVE_LIMIT):
+    """读取压缩包末尾的中央目录，以及 reads_planner(index) 要求的条目，返回 PrefetchedArchive。
+
+    reads_planner 返回 [(ZipInfo, 最多读取的数据字节数或 None), ...]。
+    中央目录超过 limit 时返回 None；条目按顺序读取，直到总量达到 limit 为止。
+    """
+    with open(zip_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        if size < EOCD_STRUCT.size:
+            return None
+        tail_start = max(0, size - EOCD_SEARCH_SIZE)
+        f.seek(tail_start)
+        tail = f.read(size - tail_start)
+        cd_offset = locate_central_directory(tail, tail_start, size)[0]
+        if cd_offset < tail_start:
+            if size - cd_offset > limit:
+                return None
+            f.seek(cd_offset)
+            tail = f.read(tail_start - cd_offset) + tail
+            tail_start = cd_offset
+        directory = parse_central_directory(tail, tail_start, size)
+
+        used = len(tail)
+        ranges = []
+        for info, max_bytes in reads_planner(ZipArchiveIndex(directory.infolist())):
+            data_size = info.compress_size if max_bytes is None else min(info.compress_size, max_bytes)
+            start = info.header_offset
+            end = min(start + LOCAL_HEADER_SIZE + LOCAL_HEADER_SLACK + data_size, tail_start)
+            if end <= start:
+                # 条目整个落在已读取的文件末尾里
+                continue
+            if used + end - start > limit:
+                break
+            f.seek(start)
+            ranges.append((start, f.read(end - start)))
+            used += end - start
+    ranges.sort(key=lambda r: r[0])
+    ranges.append((tail_start, tail))
+    # 与 ZipCache.file_signature 的格式相同
+    return PrefetchedArchive(zip_path, (st.st_size, st.st_mtime_ns, st.st_ino), size, ranges)
+
+def usable_prefetch(zip_path, prefetched):
+    """预读之后文件被改动过时返回 None，调用方改为直接读取文件"""
+    if prefetched is None or prefetched.path != zip_path:
+        return None
+    try:
+        if file_signature(zip_path) != prefetched.signature:
+            return None
+    except OSError:
+        return None
+    return prefetched
+
+def prefetched_central_directory(prefetched):
+    tail_start, tail = prefetched.ranges[-1]
+    return parse_central_directory(tail, tail_start, prefetched.size)
+
+class PrefetchedFile:
+    """供 zipfile.ZipFile 读取的只读文件对象：落在预读范围内的读取直接返回缓存数据，
+    其余读取（以及 fileno）才打开真实文件。"""
+
+    def __init__(self, prefetched):
+        self.name = prefetched.path
+        self._size = prefetched.size
+        self._ranges = prefetched.ranges
+        self._starts = [offset for offset, _ in prefetched.ranges]
+        self._position = 0
+        self._file = None
+        self._open_lock = threading.Lock()
+
+    def _real_file(self):
+        with self._open_lock:
+            if self._file is None:
+                self._file = open(self.name, 'rb')
+            return self._file
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return offset
+
+    def read(self, n=-1):
+        position = self._position
+        if n is None or n < 0:
+            n = max(0, self._size - position)
+        i = bisect_right(self._starts, position) - 1
+        if i >= 0:
+            start, data = self._ranges[i]
+            end = start + len(data)
+            if position + n <= end or end >= self._size:
+                chunk = data[position - start:position - start + n]
+                self._position += len(chunk)
+                return chunk
+        f = self._real_file()
+        f.seek(position)
+        chunk = f.read(n)
+        self._position += len(chunk)
+        return chunk
+
+    def fileno(self):
+        return self._real_file().fileno()
+
+    def close(self):
+        with self._open_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def _prefetch_or_none(zip_path, reads_planner, limit):
+    # 预读只是优化，任何错误都留给真正处理时按原来的方式报告
+    try:
+        return prefetch_archive(zip_path, reads_planner, limit)
+    except Exception:
+        return None
+
+class Prefetcher:
+    """在后台线程中预读接下来 depth 个压缩包的中央目录和 reads_planner 要求的条目。
+
+    每个压缩包最多占用 archive_limit 字节，同时持有的压缩包数不超过 budget // archive_limit，
+    所以预读数据的总量不超过 budget。处理某个压缩包前用 take(path) 取走它的预读结果。
+    """
+
+    def __init__(self, reads_planner, depth, budget=PREFETCH_BUDGET_BYTES, archive_limit=PREFETCH_ARCHIVE_LIMIT,
+                 workers=PREFETCH_WORKERS):
+        self.reads_planner = reads_planner
+        self.depth = depth
+        self.archive_limit = min(archive_limit, budget)
+        self.slots = max(1, budget // self.archive_limit)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.queued = deque()
+        self.ready = 0
+        self.waited = 0
+        self.missed = 0
+
+    def _start_queued(self):
+        with self.lock:
+            while self.queued and len(self.futures) < self.slots:
+                zip_path = self.queued.popleft()
+                self.futures[zip_path] = self.executor.submit(_prefetch_or_none, zip_path, self.reads_planner,
+                                                              self.archive_limit)
+
+    def schedule(self, zip_paths):
+        """登记接下来要处理的压缩包，已登记过的忽略"""
+        with self.lock:
+            for zip_path in zip_paths:
+                if zip_path not in self.futures and zip_path not in self.queued:
+                    self.queued.append(zip_path)
+        self._start_queued()
+
+    def take(self, zip_path):
+        """返回 zip_path 的预读结果；还没开始预读的不再预读，返回 None；正在预读的等它读完"""
+        with self.lock:
+            future = self.futures.pop(zip_path, None)
+            if future is None and zip_path in self.queued:
+                self.queued.remove(zip_path)
+        if future is None or future.cancel():
+            self.missed += 1
+            result = None
+        else:
+            if future.done():
+                self.ready += 1
+            else:
+                self.waited += 1
+            result = future.result()
+        self._start_queued()
+        return result
+
+    def lookahead(self, zip_paths):
+        """包装逐个产出路径的迭代器：每个路径都提前 depth 个被取出并登记预读"""
+        window = deque()
+        for zip_path in zip_paths:
+            window.append(zip_path)
+            self.schedule([zip_path])
+            if len(window) > self.depth:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+    def summary_line(self):
+        return f"  预读: {self.ready} 个已就绪, {self.waited} 个等待预读完成, {self.missed} 个未预读"
+
+    def close(self):
+        with self.lock:
+            self.queued.clear()
+            self.futures.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+@contextmanager
+def open_prefetcher(reads_planner, depth):
+    """depth 为 0 时不预读，得到 None"""
+    if not depth:
+        yield None
+        return
+    prefetcher = Prefetcher(reads_planner, depth)
+    try:
+        yield prefetcher
+    finally:
+        prefetcher.close()
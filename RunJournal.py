@@ -0,0 +1,155 @@
+import os
+import json
+import hashlib
+
+from BatchExecutor import ZipResult, STATUS_FAILED, STATUS_SKIPPED, DUPLICATE_REASON
+from ZipCache import default_cache_path, file_signature
+
+JOURNAL_STATE_PLANNED = "planned"
+JOURNAL_STATE_DONE = "done"
+JOURNAL_STATE_FAILED = "failed"
+
+def default_journal_path(operation, initial_paths):
+    # 同一组输入路径、同一种操作共用一个日志，下次运行相同的任务时自动续上
+    key = "\n".join(sorted(os.path.abspath(p) for p in initial_paths))
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.dirname(default_cache_path()), 'journals', f"{operation}-{digest}.jsonl")
+
+class RunJournal:
+    """批处理的进度日志，运行中断后下次可以跳过已完成的压缩包继续处理。
+
+    每条记录是一行 JSON（路径、操作、状态、完成后的文件签名），只追加写入并立即 fsync；
+    中断时写了一半的最后一行在读取时丢弃，所以每次更新要么完整生效，要么不生效。
+    打开时会把历史记录压缩成每个压缩包一行，通过临时文件 + os.replace 原子替换。
+    """
+
+    def __init__(self, path, operation):
+        self.path = path
+        self.operation = operation
+        self.entries = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._load()
+        self._compact()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get("operation") == self.operation:
+                    self.entries[record["path"]] = record
+
+    def _compact(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def _append(self, records):
+        if not records:
+            return
+        self.file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        for record in records:
+            self.entries[record["path"]] = record
+
+    def completed_result(self, zip_path):
+        """压缩包已在之前的运行中完成且之后没有改动时，返回当时的结果，否则返回 None"""
+        record = self.entries.get(zip_path)
+        if record is None or record["state"] != JOURNAL_STATE_DONE:
+            return None
+        try:
+            if list(file_signature(zip_path)) != record["signature"]:
+                return None
+        except OSError:
+            return None
+        return ZipResult(zip_path, record["status"], record["reason"])
+
+    def _clean_orphan_temp(self, zip_path, logger):
+        # 上次在处理中途被中断的压缩包可能留下 process_single_zip 的临时文件
+        record = self.entries.get(zip_path)
+        temp_path = zip_path + ".tmp"
+        if record is not None and record["state"] == JOURNAL_STATE_PLANNED and os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+                logger(f"  -> 已清理上次中断留下的临时文件: {os.path.basename(temp_path)}")
+            except OSError as e:
+                logger(f"警告: 无法删除临时文件 {temp_path}, 原因: {e}")
+
+    def resume(self, zip_paths, logger=print):
+        """拆分出之前已完成的压缩包，返回 (待处理列表, 已完成结果列表)，并清理中断留下的临时文件"""
+        resumed_results = []
+        todo = list(self.iter_resume(zip_paths, resumed_results, logger))
+        if resumed_results:
+            logger(f"  -> 续接上次运行: {len(resumed_results)} 个压缩包已完成，已跳过。")
+        return todo, resumed_results
+
+    def iter_resume(self, zip_paths, resumed_results, logger=print):
+        """resume 的流式版本：逐个产出待处理的压缩包，已完成的结果追加到 resumed_results"""
+        for zip_path in zip_paths:
+            result = self.completed_result(zip_path)
+            if result is not None:
+                resumed_results.append(result)
+                continue
+            self._clean_orphan_temp(zip_path, logger)
+            yield zip_path
+
+    def mark_planned(self, zip_paths):
+        self._append([{"path": p, "operation": self.operation, "state": JOURNAL_STATE_PLANNED}
+                      for p in zip_paths])
+
+    def iter_planned(self, zip_paths):
+        for zip_path in zip_paths:
+            self.mark_planned([zip_path])
+            yield zip_path
+
+    def mark_done(self, result):
+        record = {"path": result.path, "operation": self.operation, "status": result.status, "reason": result.reason}
+        if result.status == STATUS_FAILED:
+            # 失败的压缩包下次仍要重试
+            record["state"] = JOURNAL_STATE_FAILED
+        else:
+            try:
+                record["signature"] = list(file_signature(result.path))
+                record["state"] = JOURNAL_STATE_DONE
+            except OSError:
+                record["state"] = JOURNAL_STATE_FAILED
+        self._append([record])
+
+    def mark_duplicate(self, zip_path):
+        # 去重时被跳过的压缩包也记为完成，续接时不必重新计算哈希，也不会因为原件已完成而被当作独立文件处理
+        self.mark_done(ZipResult(zip_path, STATUS_SKIPPED, DUPLICATE_REASON))
+
+    def track(self, progress=None):
+        """包装 run_batch 的 progress 回调，每完成一个压缩包就写入日志"""
+        def on_progress(done, total, result):
+            self.mark_done(result)
+            if progress is not None:
+                progress(done, total, result)
+        return on_progress
+
+    def close(self, completed=False):
+        """completed 为真表示整批任务已经跑完，日志不再需要，直接删除"""
+        self.file.close()
+        if completed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.file.closed:
+            self.close()
+        return False
@@ -0,0 +1,450 @@
+import os
+import sys
+import time
+import errno
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from BatchExecutor import (
+    _run_with_captured_log,
+    _ignore_interrupts,
+    _cancelled,
+    ZipResult,
+    STATUS_PROCESSED,
+    STATUS_SKIPPED,
+    STATUS_FAILED
+)
+from ZipCache import file_signature
+from ZipWriteLogic import find_all_zip_files, process_single_zip, compress_workers_per_job, INSERT_LOGIC_VERSION
+from ZipDeleteLogic import remove_white_page_from_zip, REMOVE_LOGIC_VERSION
+
+# 压缩包的签名（大小、修改时间、inode）保持不变达到这么多秒，或者修改时间已早于这么多秒之前，才认为已经写完
+WATCH_SETTLE_SECONDS = 5.0
+WATCH_POLL_INTERVAL = 2.0
+# 轮询模式只在目录修改时间变化时重新列出文件；每隔这么久完整检查一次，发现原地改写的压缩包
+WATCH_FULL_RESCAN_INTERVAL = 300.0
+# 目录修改时间离现在太近时不缓存，避免粒度较粗的文件系统（FAT、SMB）在同一时间戳内新建的文件被漏掉
+WATCH_MTIME_SLACK = 2.0
+# 主循环最长阻塞这么久就检查一次是否已取消
+WATCH_WAKEUP_INTERVAL = 1.0
+# 最多记住这么多个处理过的压缩包的签名，超出时忘掉最早处理的（整个目录被移走等收不到逐个文件事件的情况）
+WATCH_HANDLED_LIMIT = 100000
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# 新建文件先收到 IN_CREATE，写完关闭时收到 IN_CLOSE_WRITE，重命名或移入时收到 IN_MOVED_TO；
+# 删除或移走时收到 IN_DELETE / IN_MOVED_FROM，用来忘掉已处理压缩包的记录
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_ONLYDIR
+INOTIFY_EVENT_STRUCT = struct.Struct('iIII')
+INOTIFY_READ_SIZE = 64 * 1024
+
+WATCH_OPERATIONS = {
+    "insert": (process_single_zip, INSERT_LOGIC_VERSION),
+    "remove": (remove_white_page_from_zip, REMOVE_LOGIC_VERSION),
+}
+
+def _signature(zip_path):
+    try:
+        return file_signature(zip_path)
+    except OSError:
+        return None
+
+def _list_directory(directory):
+    """返回 (子目录列表, 压缩包列表)；与 _scan_zip_files 一样不进入符号链接目录"""
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except OSError:
+        return None
+    subdirs, zip_paths = [], []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            if not entry.is_symlink():
+                subdirs.append(entry.path)
+        elif entry.name.lower().endswith('.zip'):
+            zip_paths.append(entry.path)
+    return subdirs, zip_paths
+
+def _load_inotify():
+    """返回带 inotify 函数的 libc；不是 Linux 或加载失败时返回 None"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class InotifyWatcher:
+    """用 inotify 监视目录树，新建、写完或移入的压缩包路径交给 notify(path)。
+
+    后台线程阻塞在 select 上，没有事件时不占用 CPU；新建的子目录会自动加入监视。
+    """
+
+    def __init__(self, libc, roots, notify, logger=print):
+        self.libc = libc
+        self.roots = roots
+        self.notify = notify
+        self.logger = logger
+        self.watches = {}  # 监视描述符 -> 目录
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.stop_read, self.stop_write = os.pipe()
+        self.thread = None
+        try:
+            for root in roots:
+                self._watch_tree(root, report_existing=False)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, directory, report_existing=True):
+        # 先加监视再列目录，这期间新建的文件最多被通知两次，不会漏掉
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(current), INOTIFY_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                # 多半是 ENOSPC：超出了 fs.inotify.max_user_watches
+                raise OSError(error, os.strerror(error), current)
+            self.watches[wd] = current
+            listing = _list_directory(current)
+            if listing is None:
+                continue
+            subdirs, zip_paths = listing
+            pending.extend(subdirs)
+            if report_existing:
+                for zip_path in zip_paths:
+                    self.notify(zip_path)
+
+    def _handle_events(self, data):
+        position = 0
+        while position + INOTIFY_EVENT_STRUCT.size <= len(data):
+            wd, mask, _, length = INOTIFY_EVENT_STRUCT.unpack_from(data, position)
+            name_start = position + INOTIFY_EVENT_STRUCT.size
+            name = data[name_start:name_start + length].rstrip(b'\0')
+            position = name_start + length
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，可能漏掉了文件，重新扫描全部监视目录
+                self.logger("警告: 文件系统事件过多，重新扫描监视目录。")
+                for root in self.roots:
+                    self._watch_tree(root)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+            elif path.lower().endswith('.zip'):
+                self.notify(path)
+
+    def _run(self):
+        while True:
+            readable, _, _ = select.select([self.fd, self.stop_read], [], [])
+            if self.stop_read in readable:
+                return
+            try:
+                data = os.read(self.fd, INOTIFY_READ_SIZE)
+            except BlockingIOError:
+                continue
+            try:
+                self._handle_events(data)
+            except OSError as e:
+                self.logger(f"警告: 无法监视新目录, 原因: {e}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.thread is not None:
+            os.write(self.stop_write, b'\0')
+            self.thread.join()
+            self.thread = None
+        for fd in (self.fd, self.stop_read, self.stop_write):
+            os.close(fd)
+
+class PollingWatcher:
+    """没有 inotify 时定期检查目录树，发现的压缩包路径交给 notify(path)。
+
+    每轮每个目录只 stat 一次，只有修改时间变化的目录才重新列出文件；
+    原地改写不改变目录的修改时间，所以每隔 full_rescan_interval 完整检查一次。
+    """
+
+    def __init__(self, roots, notify, interval=WATCH_POLL_INTERVAL, full_rescan_interval=WATCH_FULL_RESCAN_INTERVAL):
+        self.roots = roots
+        self.notify = notify
+        self.interval = interval
+        self.full_rescan_interval = full_rescan_interval
+        self.directories = {}  # 目录 -> (修改时间, 子目录列表, 压缩包列表)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.poll(report=False)
+        self.last_full_scan = time.monotonic()
+
+    def poll(self, report=True, full=False):
+        seen = set()
+        pending = list(self.roots)
+        while pending:
+            directory = pending.pop()
+            seen.add(directory)
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            cached = self.directories.get(directory)
+            if cached is not None and cached[0] == mtime:
+                pending.extend(cached[1])
+                if report and full:
+                    for zip_path in cached[2]:
+                        self.notify(zip_path)
+                continue
+            listing = _list_directory(directory)
+            if listing is None:
+                continue
+            subdirs, zip_paths = listing
+            if time.time() - mtime / 1e9 < WATCH_MTIME_SLACK:
+                mtime = None
+            self.directories[directory] = (mtime, subdirs, zip_paths)
+            pending.extend(subdirs)
+            if report:
+                # 上次列出、这次不见了的压缩包也通知一次，SettleTracker 会发现它已不存在
+                removed = set(cached[2]) - set(zip_paths) if cached is not None else ()
+                for zip_path in zip_paths + sorted(removed):
+                    self.notify(zip_path)
+        for directory in self.directories.keys() - seen:
+            if report:
+                for zip_path in self.directories[directory][2]:
+                    self.notify(zip_path)
+            del self.directories[directory]
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            full = time.monotonic() - self.last_full_scan >= self.full_rescan_interval
+            if full:
+                self.last_full_scan = time.monotonic()
+            self.poll(full=full)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="polling-watcher", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+def open_watcher(roots, notify, logger=print, use_inotify=True, poll_interval=WATCH_POLL_INTERVAL):
+    libc = _load_inotify() if use_inotify else None
+    if libc is not None:
+        try:
+            watcher = InotifyWatcher(libc, roots, notify, logger=logger)
+            logger("使用 inotify 监视文件变化。")
+            return watcher
+        except OSError as e:
+            logger(f"警告: 无法使用 inotify, 改为每 {poll_interval:g} 秒轮询一次, 原因: {e}")
+    else:
+        logger(f"每 {poll_interval:g} 秒轮询一次文件变化。")
+    return PollingWatcher(roots, notify, interval=poll_interval)
+
+class SettleTracker:
+    """跟踪等待写完的压缩包，以及处理过的压缩包当时的签名。
+
+    处理完成后的签名记录在 handled 中，签名不变的通知一律忽略，
+    所以处理本身（改写、重命名）触发的文件事件不会导致重复处理。
+    压缩包被删除或移走后收到通知时删掉它的记录，记录数超过 handled_limit 时忘掉最早处理的。
+    """
+
+    def __init__(self, settle=WATCH_SETTLE_SECONDS, handled_limit=WATCH_HANDLED_LIMIT):
+        self.settle = settle
+        self.handled_limit = handled_limit
+        self.pending = {}  # 路径 -> (签名, 首次看到该签名的时间)
+        self.handled = {}  # 路径 -> 处理完成时的签名
+        self.running = set()
+
+    def observe(self, zip_path, now):
+        if zip_path in self.running:
+            return
+        signature = _signature(zip_path)
+        if signature is None:
+            self.pending.pop(zip_path, None)
+            self.handled.pop(zip_path, None)
+            return
+        if signature == self.handled.get(zip_path):
+            self.pending.pop(zip_path, None)
+            return
+        current = self.pending.get(zip_path)
+        if current is None or current[0] != signature:
+            self.pending[zip_path] = (signature, now)
+
+    def take_ready(self, now):
+        """重新 stat 等待中的压缩包，返回已经写完的列表，并把它们标记为处理中"""
+        ready = []
+        for zip_path, (signature, since) in list(self.pending.items()):
+            current = _signature(zip_path)
+            if current is None:
+                del self.pending[zip_path]
+            elif current != signature:
+                self.pending[zip_path] = (current, now)
+            elif now - since >= self.settle or time.time() - signature[1] / 1e9 >= self.settle:
+                del self.pending[zip_path]
+                self.running.add(zip_path)
+                ready.append(zip_path)
+        return sorted(ready)
+
+    def next_deadline(self):
+        if not self.pending:
+            return None
+        return min(since for _, since in self.pending.values()) + self.settle
+
+    def finish(self, zip_path):
+        self.running.discard(zip_path)
+        # 先删再加，handled 按处理完成的先后排列
+        self.handled.pop(zip_path, None)
+        signature = _signature(zip_path)
+        if signature is None:
+            return
+        self.handled[zip_path] = signature
+        while len(self.handled) > self.handled_limit:
+            del self.handled[next(iter(self.handled))]
+
+def watch_folders(initial_paths, operation="insert", logger=print, jobs=1, cache=None, cancel=None,
+                  on_result=None, settle=WATCH_SETTLE_SECONDS, poll_interval=WATCH_POLL_INTERVAL,
+                  use_inotify=True, **kwargs):
+    """持续监视文件夹，新增或改动的压缩包写完后立即处理，直到 cancel 被设置，返回各状态的计数。
+
+    启动时先处理文件夹中已有的压缩包（缓存中记录为已处理且未改动的会跳过）。
+    同时处理的压缩包最多 jobs 个，每处理完一个调用一次 on_result(ZipResult)。
+    kwargs 原样传给单个压缩包的处理函数，例如 in_place、compression。
+    """
+    func, logic_version = WATCH_OPERATIONS[operation]
+    kwargs.setdefault("compress_workers", compress_workers_per_job(jobs))
+    counts = {STATUS_PROCESSED: 0, STATUS_SKIPPED: 0, STATUS_FAILED: 0}
+    roots = []
+    for path in initial_paths:
+        if os.path.isdir(path):
+            roots.append(os.path.abspath(path))
+        else:
+            logger(f"警告: 监视模式只支持文件夹，已跳过: {path}")
+    if not roots:
+        logger("任务中止: 没有可以监视的文件夹。")
+        return counts
+
+    events = queue.Queue()
+    tracker = SettleTracker(settle)
+    waiting = deque()
+    futures = {}
+    done = 0
+
+    def finish(zip_path, result, lines):
+        nonlocal done
+        done += 1
+        tracker.finish(zip_path)
+        counts[result.status] = counts.get(result.status, 0) + 1
+        logger(f"\n--- ({done}) 自动处理 ---")
+        for line in lines:
+            logger(line)
+        if cache is not None:
+            cache.record_results([result], operation, logic_version)
+        if on_result is not None:
+            on_result(result)
+
+    def collect(zip_path, future):
+        del futures[future]
+        try:
+            result, lines, _ = future.result()
+        except Exception as e:
+            result = ZipResult(zip_path, STATUS_FAILED, "error")
+            lines = [f"错误: 工作进程处理 '{zip_path}' 失败, 原因: {e}"]
+        finish(zip_path, result, lines)
+
+    def handle(event):
+        kind, zip_path, future = event
+        if kind == "done":
+            collect(zip_path, future)
+        else:
+            tracker.observe(zip_path, time.monotonic())
+
+    watcher = open_watcher(roots, lambda zip_path: events.put(("changed", zip_path, None)),
+                           logger=logger, use_inotify=use_inotify, poll_interval=poll_interval)
+    executor = ProcessPoolExecutor(max_workers=jobs, initializer=_ignore_interrupts) if jobs > 1 else None
+    try:
+        watcher.start()
+        # 监视开始之后再扫描已有的压缩包，两者之间新放入的文件不会漏掉
+        for zip_path in find_all_zip_files(roots, logger=logger):
+            tracker.observe(zip_path, time.monotonic())
+        logger(f"\n开始监视 {len(roots)} 个文件夹: 新的压缩包写完 {settle:g} 秒后自动处理，按 Ctrl+C 停止。")
+
+        while not _cancelled(cancel):
+            for zip_path in tracker.take_ready(time.monotonic()):
+                if cache is not None and cache.get_outcome(zip_path, operation, logic_version) is not None:
+                    # 上次运行已经处理过且之后没有改动
+                    tracker.finish(zip_path)
+                else:
+                    waiting.append(zip_path)
+
+            while waiting and len(futures) < max(1, jobs) and not _cancelled(cancel):
+                zip_path = waiting.popleft()
+                if executor is None:
+                    lines = []
+                    result = func(zip_path, logger=lines.append, **kwargs)
+                    finish(zip_path, result, lines)
+                else:
+                    future = executor.submit(_run_with_captured_log, func, zip_path, kwargs)
+                    futures[future] = zip_path
+                    future.add_done_callback(lambda f, p=zip_path: events.put(("done", p, f)))
+
+            timeout = WATCH_WAKEUP_INTERVAL
+            deadline = tracker.next_deadline()
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+            try:
+                handle(events.get(timeout=timeout))
+                while True:
+                    handle(events.get_nowait())
+            except queue.Empty:
+                pass
+    finally:
+        watcher.close()
+        if executor is not None:
+            if futures:
+                logger(f"\n正在停止: 等待 {len(futures)} 个正在处理的压缩包完成...")
+            executor.shutdown(wait=True)
+            # 已经结束的任务的完成事件还在队列里，逐个收尾后再返回
+            for future, zip_path in list(futures.items()):
+                collect(zip_path, future)
+    logger(f"\n监视已停止: 处理 {counts[STATUS_PROCESSED]} 个，跳过 {counts[STATUS_SKIPPED]} 个，"
+           f"失败 {counts[STATUS_FAILED]} 个。")
+    return counts
@@ -0,0 +1,95 @@
+import os
+import re
+
+UTF8_FLAG = 0x800
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+FALLBACK_ENCODINGS = ['utf-8', 'gbk', 'shift-jis', 'big5']
+
+_NUMBER_PATTERN = re.compile(r'(\d+)')
+
+def natural_sort_key(s):
+    split_list = _NUMBER_PATTERN.split(s)
+    result_key = []
+    for text_part in split_list:
+        if text_part.isdigit():
+            result_key.append(int(text_part))
+        else:
+            result_key.append(text_part.lower())
+    return result_key
+
+def _decode_zip_filename(filename_bytes):
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return filename_bytes.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return f"DECODE_ERROR_{filename_bytes.hex()}"
+
+def detect_archive_encoding(raw_names):
+    """返回能解码全部文件名的第一个编码；没有时返回 None，由调用方逐个文件名回退"""
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            for raw_name in raw_names:
+                raw_name.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+class ZipArchiveIndex:
+    """对中央目录只遍历一次，缓存解码后的文件名、最深目录的图片列表（已自然排序）以及文件名到条目的映射"""
+
+    def __init__(self, infolist):
+        self.infos = list(infolist)
+
+        # 非 UTF-8 文件名先统一判定整个压缩包的编码，而不是每个条目都逐个尝试
+        raw_names = [info.filename.encode('cp437', 'replace')
+                     for info in self.infos if not info.flag_bits & UTF8_FLAG]
+        self.encoding = detect_archive_encoding(raw_names)
+
+        self.names = []
+        self.name_to_info = {}
+        max_depth = -1
+        deepest_name = None
+        for info in self.infos:
+            if info.flag_bits & UTF8_FLAG:
+                name = info.filename
+            else:
+                raw_name = info.filename.encode('cp437', 'replace')
+                name = raw_name.decode(self.encoding) if self.encoding else _decode_zip_filename(raw_name)
+            self.names.append(name)
+            if not info.is_dir():
+                if name not in self.name_to_info:
+                    depth = name.count('/')
+                    if depth > max_depth:
+                        max_depth = depth
+                        deepest_name = name
+                self.name_to_info[name] = info
+
+        self.deepest_dir = os.path.dirname(deepest_name) if deepest_name is not None else ''
+        self.sort_keys = {}
+        images = []
+        for name in self.name_to_info:
+            if os.path.dirname(name) == self.deepest_dir and os.path.splitext(os.path.basename(name))[1].lower() in IMAGE_EXTENSIONS:
+                self.sort_keys[name] = natural_sort_key(name)
+                images.append(name)
+        self.images = sorted(images, key=self.sort_keys.__getitem__)
+
+    @classmethod
+    def from_zipfile(cls, zin):
+        return cls(zin.infolist())
+
+    def is_empty(self):
+        return not self.name_to_info
+
+    def entries(self):
+        # (条目, 解码后的文件名)，顺序与中央目录一致
+        return zip(self.infos, self.names)
+
+    def original_images(self):
+        return [img for img in self.images if not os.path.splitext(os.path.basename(img))[0].endswith('-1')]
+
+    def sibling_path(self, name, suffix='-1'):
+        # 与 name 同目录、在文件名主干后加 suffix 的路径，例如 001.jpg -> 001-1.jpg
+        stem, ext = os.path.splitext(os.path.basename(name))
+        return os.path.join(os.path.dirname(name), f"{stem}{suffix}{ext}").replace("\\", "/")
@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import sqlite3
+
+from BatchExecutor import ZipResult, STATUS_FAILED, STATUS_SKIPPED
+
+CACHE_SCHEMA_VERSION = 1
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_MAX_AGE_DAYS = 90
+
+def default_cache_path():
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+    elif sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'crossfix', 'cache.sqlite3')
+
+def file_signature(file_path):
+    # 路径 + 大小 + 修改时间 + inode 都没变，才认为文件没有被改动过
+    st = os.stat(file_path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+class ZipCache:
+    """保存压缩包的哈希值和上次处理结果的 SQLite 缓存，只在创建它的线程中使用"""
+
+    def __init__(self, db_path=None, max_entries=DEFAULT_MAX_ENTRIES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.db_path = db_path or default_cache_path()
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self._create_schema()
+        self.evict()
+
+    def _create_schema(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != CACHE_SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS hashes")
+            self.conn.execute("DROP TABLE IF EXISTS outcomes")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS hashes (
+            path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER,
+            partial_hash TEXT, full_hash TEXT, used REAL)""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS outcomes (
+            path TEXT, operation TEXT, logic_version INTEGER,
+            size INTEGER, mtime_ns INTEGER, inode INTEGER,
+            status TEXT, reason TEXT, used REAL, PRIMARY KEY (path, operation))""")
+        self.conn.execute(f"PRAGMA user_version = {CACHE_SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def evict(self):
+        cutoff = time.time() - self.max_age_days * 86400
+        for table in ('hashes', 'outcomes'):
+            self.conn.execute(f"DELETE FROM {table} WHERE used < ?", (cutoff,))
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+        self.conn.commit()
+
+    def invalidate(self, operation=None):
+        """清除处理结果；operation 为空时连同哈希一起清空"""
+        if operation is None:
+            self.conn.execute("DELETE FROM hashes")
+            self.conn.execute("DELETE FROM outcomes")
+        else:
+            self.conn.execute("DELETE FROM outcomes WHERE operation = ?", (operation,))
+        self.conn.commit()
+
+    def get_hashes(self, file_path, signature):
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, inode, partial_hash, full_hash FROM hashes WHERE path = ?",
+            (file_path,)).fetchone()
+        if row is None or tuple(row[:3]) != tuple(signature):
+            return None, None
+        self.conn.execute("UPDATE hashes SET used = ? WHERE path = ?", (time.time(), file_path))
+        return row[3], row[4]
+
+    def put_hashes(self, file_path, signature, partial_hash=None, full_hash=None):
+        old_partial, old_full = self.get_hashes(file_path, signature)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_path, *signature, partial_hash or old_partial, full_hash or old_full, time.time()))
+
+    def get_outcome(self, file_path, operation, logic_version):
+        try:
+            signature = file_signature(file_path)
+        except OSError:
+            return None
+        row = self.conn.execute(
+            "SELECT logic_version, size, mtime_ns, inode, status, reason FROM outcomes "
+            "WHERE path = ? AND operation = ?", (file_path, operation)).fetchone()
+        if row is None or row[0] != logic_version or tuple(row[1:4]) != signature:
+            return None
+        self.conn.execute("UPDATE outcomes SET used = ? WHERE path = ? AND operation = ?",
+                          (time.time(), file_path, operation))
+        return row[4], row[5]
+
+    def put_outcome(self, result, operation, logic_version):
+        if result.status == STATUS_FAILED:
+            self.conn.execute("DELETE FROM outcomes WHERE path = ? AND operation = ?", (result.path, operation))
+            return
+        try:
+            # 处理后文件已经变了，记录的是处理后的状态，下次运行直接跳过
+            signature = file_signature(result.path)
+        except OSError:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (result.path, operation, logic_version, *signature, result.status, result.reason, time.time()))
+
+    def split_cached(self, zip_paths, operation, logic_version, logger=print):
+        """拆分出上次已处理且之后未改动的压缩包，返回 (待处理列表, 跳过结果列表)"""
+        todo, cached_results = [], []
+        for zip_path in zip_paths:
+            outcome = self.get_outcome(zip_path, operation, logic_version)
+            if outcome is None:
+                todo.append(zip_path)
+            else:
+                cached_results.append(ZipResult(zip_path, STATUS_SKIPPED, "cached"))
+        if cached_results:
+            logger(f"  -> 缓存命中: {len(cached_results)} 个压缩包自上次处理后未改动，已跳过。")
+        return todo, cached_results
+
+    def iter_uncached(self, zip_paths, operation, logic_version, cached_results):
+        """split_cached 的流式版本：逐个产出需要处理的压缩包，命中缓存的结果追加到 cached_results"""
+        for zip_path in zip_paths:
+            if self.get_outcome(zip_path, operation, logic_version) is None:
+                yield zip_path
+            else:
+                cached_results.append(ZipResult(zip_path, STATUS_SKIPPED, "cached"))
+
+    def record_results(self, results, operation, logic_version):
+        for result in results:
+            if result.reason != "cached":
+                self.put_outcome(result, operation, logic_version)
+        self.conn.commit()
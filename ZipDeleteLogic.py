@@ -1,124 +1,187 @@
 import os
 import zipfile
-import io
 import shutil
-import copy
 import traceback
-from pathlib import Path
+from collections import namedtuple
 from PIL import Image
 
+from ImageProbe import probe_image_size
+from BlankPageCache import get_blank_page, image_format_for_name
+from Instrumentation import span, traced, traced_run
 from ZipWriteLogic import (
-    natural_sort_key,
     find_all_zip_files,
     deduplicate_files_by_hash,
-    _decode_zip_filename,
-    UTF8_FLAG  
+    collect_duplicates,
+    _copy_entries,
+    compress_workers_per_job,
+    open_archive_for_plan,
+    open_prefetcher,
+    rollback_in_place_journal,
+    rewrite_counters,
+    RAW_COPY_CHUNK_SIZE,
+    run_batch,
+    run_pipelined,
+    ZipResult,
+    STATUS_PROCESSED,
+    STATUS_SKIPPED,
+    STATUS_FAILED
 )
 
+# 删除逻辑有改动时递增，缓存中旧版本的处理结果随之失效
+REMOVE_LOGIC_VERSION = 2
+
+WHITE_CHECK_BAND_HEIGHT = 64
+
 def is_image_completely_white(img_obj: Image.Image) -> bool:
-    grayscale_img = img_obj.convert('L')
-    min_val, max_val = grayscale_img.getextrema()
-    return min_val == 255 and max_val == 255
+    # 按横条逐块转换灰度并取极值，遇到第一块不是纯白的横条就提前结束；
+    # 旧版本生成或被其它工具重新保存过的白页 CRC 对不上，仍要完整检查到最后一块
+    width, height = img_obj.size
+    for top in range(0, height, WHITE_CHECK_BAND_HEIGHT):
+        band = img_obj.crop((0, top, width, min(top + WHITE_CHECK_BAND_HEIGHT, height)))
+        if band.convert('L').getextrema() != (255, 255):
+            return False
+    return True
+
+def is_known_blank_page(zin, info, filename):
+    """条目的 CRC 和大小与本程序生成的同尺寸白页完全一致时，无需解码即可认定为白页"""
+    with zin.open(info) as f:
+        size = probe_image_size(f)
+    if size is None:
+        return False
+    blank_page = get_blank_page(size, image_format_for_name(filename), compress_type=zipfile.ZIP_STORED)
+    return info.CRC == blank_page.crc and info.file_size == blank_page.file_size
+
+# reason 为 None 表示找到了待检查的白页 target_path，否则是跳过原因
+RemovePlan = namedtuple('RemovePlan', ['reason', 'target_path'])
 
-def remove_white_page_from_zip(zip_path, logger=print):
+def plan_removal(index):
+    """只根据中央目录找出可能是白页的条目，是否纯白还需要进一步检查"""
+    if index.is_empty():
+        return RemovePlan("empty", None)
+    if not index.images:
+        return RemovePlan("no_images", None)
+    target_image = next((img for img in index.images if img != index.images[0]), None)
+    if target_image is None:
+        return RemovePlan("too_few_images", None)
+    target_full_path = index.sibling_path(target_image)
+    if target_full_path not in index.name_to_info:
+        return RemovePlan("no_target", target_full_path)
+    return RemovePlan(None, target_full_path)
+
+def removal_reads(index):
+    """供 Prefetcher 使用：预读待检查的整个白页条目，判断是否纯白需要完整解码"""
+    plan = plan_removal(index)
+    if plan.reason is not None:
+        return []
+    return [(index.name_to_info[plan.target_path], None)]
+
+@traced("remove")
+def remove_white_page_from_zip(zip_path, logger=print, buffer_size=RAW_COPY_CHUNK_SIZE, compression=None,
+                               compress_workers=1, prefetched=None):
     logger(f"--- 正在检查文件: {os.path.basename(zip_path)} ---")
     temp_zip_path = zip_path + ".tmp"
-    file_to_delete = None
 
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zin:
-            # (这里的代码与之前版本相同, 使用了从 logic.py 导入的函数)
-            filename_to_info_map = {}
-            for info in zin.infolist():
-                if info.flag_bits & UTF8_FLAG:
-                    filename = info.filename
-                else:
-                    filename = _decode_zip_filename(info.filename.encode('cp437', 'replace'))
-                if not info.is_dir():
-                    filename_to_info_map[filename] = info
-            
-            correct_file_list = list(filename_to_info_map.keys())
-            if not correct_file_list:
-                logger(f"跳过: '{os.path.basename(zip_path)}' 是空的。")
-                return
-
-            deepest_dir = os.path.dirname(max(correct_file_list, key=lambda p: p.count('/')))
-            image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
-            images_in_deepest_dir = sorted(
-                [f for f in correct_file_list 
-                 if os.path.dirname(f) == deepest_dir and Path(f).suffix.lower() in image_extensions],
-                key=natural_sort_key
-            )
-
-            if not images_in_deepest_dir:
-                logger(f"跳过: 在 '{deepest_dir}' 中未找到图片。")
-                return
-
-            for i in images_in_deepest_dir:
-                if i!=images_in_deepest_dir[0]:
-                    target_image=i
-                    break
-            target_image_name = f"{Path(target_image).stem}-1{Path(target_image).suffix}"
-            target_full_path = os.path.join(deepest_dir, target_image_name).replace("\\", "/")
-
-            if target_full_path not in filename_to_info_map:
-                logger(f"信息: 未找到目标文件 '{target_image_name}'，无需操作。")
-                return
-                
+        # 插入扉页的原地写入被中断过时先回滚到写入前的状态，再按原样检查
+        rollback_in_place_journal(zip_path, logger=logger)
+        zin, index, plan = open_archive_for_plan(zip_path, plan_removal, prefetched)
+        if plan.reason == "empty":
+            logger(f"跳过: '{os.path.basename(zip_path)}' 是空的。")
+            return ZipResult(zip_path, STATUS_SKIPPED, plan.reason)
+        if plan.reason == "no_images":
+            logger(f"跳过: 在 '{index.deepest_dir}' 中未找到图片。")
+            return ZipResult(zip_path, STATUS_SKIPPED, plan.reason)
+        if plan.reason == "too_few_images":
+            logger(f"跳过: 在 '{index.deepest_dir}' 中图片不足2张。")
+            return ZipResult(zip_path, STATUS_SKIPPED, plan.reason)
+        if plan.reason == "no_target":
+            logger(f"信息: 未找到目标文件 '{os.path.basename(plan.target_path)}'，无需操作。")
+            return ZipResult(zip_path, STATUS_SKIPPED, plan.reason)
+
+        with zin:
+            file_to_delete = plan.target_path
+            target_image_name = os.path.basename(file_to_delete)
             logger(f"  -> 发现目标文件 '{target_image_name}', 正在分析内容...")
-            target_info = filename_to_info_map[target_full_path]
-            with zin.open(target_info) as f_target:
-                img_data = io.BytesIO(f_target.read())
-                with Image.open(img_data) as img:
-                    if is_image_completely_white(img):
-                        logger(f"  -> 确认: '{target_image_name}' 是纯白图片，准备删除。")
-                        file_to_delete = target_full_path
-                    else:
-                        logger(f"  -> 分析完成: '{target_image_name}' 不是纯白图片，不进行操作。")
-                        return
-
-        if file_to_delete:
-            with zipfile.ZipFile(zip_path, 'r') as zin:
+            target_info = index.name_to_info[file_to_delete]
+            with span("image_decode", archive=zip_path) as decode_span:
+                if is_known_blank_page(zin, target_info, target_image_name):
+                    logger(f"  -> 确认: '{target_image_name}' 与本程序生成的白页一致，准备删除。")
+                else:
+                    decode_span.add(bytes_decompressed=target_info.file_size)
+                    with zin.open(target_info) as f_target:
+                        with Image.open(f_target) as img:
+                            if is_image_completely_white(img):
+                                logger(f"  -> 确认: '{target_image_name}' 是纯白图片，准备删除。")
+                            else:
+                                logger(f"  -> 分析完成: '{target_image_name}' 不是纯白图片，不进行操作。")
+                                return ZipResult(zip_path, STATUS_SKIPPED, "not_white")
+
+            kept_entries = [(info, name) for info, name in index.entries() if name != file_to_delete]
+            with span("rewrite", archive=zip_path) as rewrite_span:
                 with zipfile.ZipFile(temp_zip_path, 'w', zipfile.ZIP_DEFLATED) as zout:
-                    for info in zin.infolist():
-                        if info.flag_bits & UTF8_FLAG:
-                            correct_filename_str = info.filename
-                        else:
-                            correct_filename_str = _decode_zip_filename(info.filename.encode('cp437', 'replace'))
-                        if correct_filename_str != file_to_delete:
-                            info_copy = copy.copy(info)
-                            info_copy.filename = correct_filename_str
-                            info_copy.extra = b''
-                            zout.writestr(info_copy, zin.read(info.filename))
+                    for _ in _copy_entries(zin, zout, kept_entries, compression, buffer_size, compress_workers):
+                        pass
+                if rewrite_span.enabled:
+                    rewrite_span.add(**rewrite_counters(kept_entries, temp_zip_path, compression))
             
-            shutil.move(temp_zip_path, zip_path)
-            logger(f"成功: 已从 '{os.path.basename(zip_path)}' 中删除白色扉页。")
+        shutil.move(temp_zip_path, zip_path)
+        logger(f"成功: 已从 '{os.path.basename(zip_path)}' 中删除白色扉页。")
+        return ZipResult(zip_path, STATUS_PROCESSED, "removed")
 
     except Exception as e:
         logger(f"错误: 处理 '{os.path.basename(zip_path)}' 时发生错误: {e}")
         logger(traceback.format_exc())
         if os.path.exists(temp_zip_path):
             os.remove(temp_zip_path)
+        return ZipResult(zip_path, STATUS_FAILED, "error")
 
-def remove_white_pages_entry_point(initial_paths, logger=print):
+@traced_run("run.remove")
+def remove_white_pages_entry_point(initial_paths, logger=print, jobs=1, cache=None,
+                                   buffer_size=RAW_COPY_CHUNK_SIZE, progress=None, pipeline=False,
+                                   compression=None, journal=None, cancel=None, device_limit=None, prefetch=0):
     if not initial_paths:
         logger("任务中止: 没有提供任何文件或文件夹路径。")
-        return
+        return []
+
+    if pipeline:
+        with open_prefetcher(removal_reads, prefetch) as prefetcher:
+            return run_pipelined(remove_white_page_from_zip, initial_paths, "remove", REMOVE_LOGIC_VERSION,
+                                 logger=logger, jobs=jobs, cache=cache, progress=progress, journal=journal,
+                                 cancel=cancel, prefetcher=prefetcher, buffer_size=buffer_size,
+                                 compression=compression, compress_workers=compress_workers_per_job(jobs))
 
     logger("步骤 1/3: 开始查找所有ZIP文件...")
     all_zips = find_all_zip_files(initial_paths, logger=logger)
     if not all_zips:
         logger("任务完成: 未找到任何ZIP文件。")
-        return
+        return []
     logger(f"查找到 {len(all_zips)} 个ZIP文件。")
+    resumed_results = []
+    if journal is not None:
+        all_zips, resumed_results = journal.resume(all_zips, logger=logger)
+        progress = journal.track(progress)
 
     logger("\n步骤 2/3: 开始计算哈希值以去重...")
-    unique_zips = deduplicate_files_by_hash(all_zips, logger=logger)
+    duplicate_results, on_duplicate = collect_duplicates(journal)
+    unique_zips = deduplicate_files_by_hash(all_zips, logger=logger, cache=cache, on_duplicate=on_duplicate)
     logger(f"去重后剩余 {len(unique_zips)} 个独立文件。")
 
+    cached_results = []
+    if cache is not None:
+        unique_zips, cached_results = cache.split_cached(unique_zips, "remove", REMOVE_LOGIC_VERSION, logger=logger)
+    if journal is not None:
+        journal.mark_planned(unique_zips)
+
     logger("\n步骤 3/3: 开始逐一检查并处理ZIP文件...")
-    for i, zip_file in enumerate(unique_zips):
-        logger(f"\n--- ({i+1}/{len(unique_zips)}) ---")
-        remove_white_page_from_zip(zip_file, logger=logger)
-    
-    logger("\n所有删除任务已完成！")
\ No newline at end of file
+    with open_prefetcher(removal_reads, prefetch) as prefetcher:
+        results = run_batch(remove_white_page_from_zip, unique_zips, logger=logger, jobs=jobs, progress=progress,
+                            cancel=cancel, device_limit=device_limit, prefetcher=prefetcher, buffer_size=buffer_size,
+                            compression=compression, compress_workers=compress_workers_per_job(jobs))
+    if cache is not None:
+        cache.record_results(results, "remove", REMOVE_LOGIC_VERSION)
+
+    if cancel is not None and cancel.is_set():
+        logger("\n任务已取消，已完成的压缩包下次运行时会跳过。")
+    else:
+        logger("\n所有删除任务已完成！")
+    return resumed_results + duplicate_results + cached_results + results
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""对 zipfile 私有实现的全部依赖都集中在这里，其它模块只通过这些函数访问。
+
+需要 Python 3.9 及以上。下面用到的私有接口在 3.9 到 3.13 的 zipfile 中都存在；
+升级 Python 后先运行 test/test_zip_internals.py，接口被改名或行为变化时测试会直接失败。
+"""
+import zipfile
+
+MIN_PYTHON = (3, 9)
+
+def get_compressor(compress_type, compresslevel=None):
+    """返回与 zipfile 写入时相同的压缩器；ZIP_STORED 返回 None"""
+    return zipfile._get_compressor(compress_type, compresslevel)
+
+def get_decompressor(compress_type):
+    """返回与 zipfile 读取时相同的解压器；ZIP_STORED 返回 None"""
+    return zipfile._get_decompressor(compress_type)
+
+def archive_lock(zf):
+    # ZipFile 读写 fp 时持有的锁；自行按偏移读取 zf.fp 时也要持有，避免与 zf.open 打开的条目互相移动文件位置
+    return zf._lock
+
+def central_directory_offset(zf):
+    """读取时是中央目录的起始偏移，写入时是下一个条目的写入位置"""
+    return zf.start_dir
+
+def begin_raw_write(zout, zinfo):
+    """定位到 zout 的写入位置并记录条目偏移，随后调用方直接往 zout.fp 写入本地头和数据。
+
+    与 ZipFile.writestr 一样做写入前的检查（已关闭、重名、条目数超过 Zip64 限制等）。
+    """
+    zout._writecheck(zinfo)
+    zout.fp.seek(zout.start_dir)
+    zinfo.header_offset = zout.fp.tell()
+    zout._didModify = True
+
+def end_raw_write(zout, zinfo):
+    """登记已经写完的条目，关闭 zout 时 zipfile 会把它写进中央目录"""
+    zout.filelist.append(zinfo)
+    zout.NameToInfo[zinfo.filename] = zinfo
+    zout.start_dir = zout.fp.tell()
+
+def move_last_entry(zout, index):
+    # 只改变条目在中央目录中的顺序，数据仍在文件中原来的位置
+    zout.filelist.insert(index, zout.filelist.pop())
+
+def set_compresslevel(zinfo, compresslevel):
+    """指定 ZipFile.open(zinfo, 'w') 使用的压缩级别"""
+    # 3.13 起改名为 compress_level，旧名字只作为兼容属性保留
+    if hasattr(zipfile.ZipInfo, 'compress_level'):
+        zinfo.compress_level = compresslevel
+    else:
+        zinfo._compresslevel = compresslevel
+
+class RawNameZipInfo(zipfile.ZipInfo):
+    # zipfile 以 cp437 解码非 UTF-8 文件名，重写中央目录时按原字节写回，避免 GBK 等文件名被转成乱码
+    __slots__ = ()
+
+    def _encodeFilenameFlags(self):
+        return self.filename.encode('cp437'), self.flag_bits
@@ -0,0 +1,108 @@
+import os
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from ZipWriteLogic import find_all_zip_files, deduplicate_files_by_hash, plan_insertion, read_archive_index
+from ZipDeleteLogic import plan_removal
+
+ACTION_MODIFY = "modify"
+ACTION_SKIP = "skip"
+ACTION_FAIL = "fail"
+
+PLAN_FIELDS = ["path", "operation", "action", "reason", "size", "estimated_bytes"]
+PLAN_WORKERS = 16
+
+def plan_archive(zip_path, operation="insert", in_place=False):
+    """只读取中央目录，判断压缩包在正式运行时会被修改、跳过还是失败，并估算需要改写的字节数"""
+    entry = {"path": zip_path, "operation": operation, "action": ACTION_FAIL,
+             "reason": "", "size": 0, "estimated_bytes": 0}
+    try:
+        entry["size"] = os.path.getsize(zip_path)
+        directory, index = read_archive_index(zip_path)
+        central_directory_size = directory.file_size - directory.start_dir
+        if operation == "insert":
+            reason = plan_insertion(index).reason
+        else:
+            reason = plan_removal(index).reason
+    except Exception as e:
+        entry["reason"] = f"error: {e}"
+        return entry
+
+    if reason is not None:
+        entry["action"] = ACTION_SKIP
+        entry["reason"] = reason
+        return entry
+    entry["action"] = ACTION_MODIFY
+    # 删除时是否真的是白页要到正式运行时才检查，这里只表示存在候选文件
+    entry["reason"] = "insert" if operation == "insert" else "candidate"
+    if operation == "insert" and in_place:
+        entry["estimated_bytes"] = central_directory_size
+    else:
+        entry["estimated_bytes"] = entry["size"]
+    return entry
+
+def _duplicate_entry(zip_path, operation):
+    entry = {"path": zip_path, "operation": operation, "action": ACTION_SKIP,
+             "reason": "duplicate", "size": 0, "estimated_bytes": 0}
+    try:
+        entry["size"] = os.path.getsize(zip_path)
+    except OSError as e:
+        # 去重之后文件被删除或移走，与 plan_archive 一样记为失败
+        entry["action"] = ACTION_FAIL
+        entry["reason"] = f"error: {e}"
+    return entry
+
+def plan_entry_point(initial_paths, logger=print, operation="insert", in_place=False,
+                     dedup=False, jobs=PLAN_WORKERS):
+    """对整个书库做一次演练，返回每个压缩包的计划；不读取也不修改任何图片数据"""
+    if not initial_paths:
+        logger("任务中止: 没有提供任何文件或文件夹路径。")
+        return []
+
+    all_zips = sorted(find_all_zip_files(initial_paths, logger=logger))
+    if not all_zips:
+        logger("任务完成: 未在指定路径下找到任何ZIP文件。")
+        return []
+    logger(f"查找到 {len(all_zips)} 个ZIP文件，开始读取中央目录...")
+
+    duplicates = set()
+    if dedup:
+        # 哈希失败的文件不算重复，照常读取中央目录，由 plan_archive 报告错误
+        deduplicate_files_by_hash(all_zips, logger=logger, on_duplicate=duplicates.add)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        plan = list(executor.map(lambda p: plan_archive(p, operation, in_place),
+                                 [p for p in all_zips if p not in duplicates]))
+    plan.extend(_duplicate_entry(p, operation) for p in sorted(duplicates))
+
+    counts = {ACTION_MODIFY: 0, ACTION_SKIP: 0, ACTION_FAIL: 0}
+    for entry in plan:
+        counts[entry["action"]] += 1
+    total_bytes = sum(entry["estimated_bytes"] for entry in plan)
+    logger(f"计划: 修改 {counts[ACTION_MODIFY]} 个, 跳过 {counts[ACTION_SKIP]} 个, 失败 {counts[ACTION_FAIL]} 个, "
+           f"预计改写 {total_bytes / (1024 * 1024):.1f} MB。")
+    return plan
+
+def write_plan(plan, out_path, fmt=None):
+    """把计划写成 JSON 或 CSV；fmt 为空时按扩展名判断"""
+    fmt = fmt or ("csv" if out_path.lower().endswith(".csv") else "json")
+    if fmt == "csv":
+        with open(out_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=PLAN_FIELDS)
+            writer.writeheader()
+            writer.writerows(plan)
+    else:
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False, indent=1)
+
+def load_plan(plan_path):
+    if plan_path.lower().endswith(".csv"):
+        with open(plan_path, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+    with open(plan_path, encoding='utf-8') as f:
+        return json.load(f)
+
+def load_plan_paths(plan_path, action=ACTION_MODIFY):
+    """读取计划文件，返回需要处理的压缩包路径，可以直接作为正式运行的输入列表"""
+    return [entry["path"] for entry in load_plan(plan_path) if entry["action"] == action]
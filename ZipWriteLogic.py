@@ -1,29 +1,108 @@
 import os
 import zipfile
 import hashlib
-import io
 import shutil
-import re
 import copy
+import struct
+import zlib
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from PIL import Image
 import traceback
 
-UTF8_FLAG = 0x800
+from BatchExecutor import (
+    run_batch,
+    run_pipeline,
+    ZipResult,
+    STATUS_PROCESSED,
+    STATUS_SKIPPED,
+    STATUS_FAILED,
+    DUPLICATE_REASON
+)
+from ZipCache import file_signature
+from Instrumentation import span, traced, traced_run
+from ImageProbe import read_image_size
+from BlankPageCache import get_blank_page, image_format_for_name
+from CentralDirectory import read_central_directory
+from FileTransfer import copy_range
+from Prefetch import (
+    PrefetchedFile,
+    usable_prefetch,
+    prefetched_central_directory,
+    open_prefetcher,
+    PREFETCH_MEMBER_BYTES
+)
+from ZipArchiveIndex import (
+    ZipArchiveIndex,
+    UTF8_FLAG
+)
+from ZipInternals import (
+    get_compressor,
+    get_decompressor,
+    archive_lock,
+    central_directory_offset,
+    begin_raw_write,
+    end_raw_write,
+    move_last_entry,
+    set_compresslevel,
+    RawNameZipInfo
+)
 
-def natural_sort_key(s):
-    split_list = re.split(r'(\d+)', s)
-    result_key = []
-    for text_part in split_list:
-        if text_part.isdigit():
-            result_key.append(int(text_part))
-        else:
-            result_key.append(text_part.lower())
-    return result_key
+ENCRYPTED_FLAG = 0x1
+DATA_DESCRIPTOR_FLAG = 0x8
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+LOCAL_HEADER_SIZE = 30
+RAW_COPY_CHUNK_SIZE = 1024 * 1024
+IN_PLACE_JOURNAL_SUFFIX = ".cdjournal"
+IN_PLACE_JOURNAL_MAGIC = b'CFXCDJ02'
+# 魔数, 旧中央目录偏移, 原文件大小, 新条目本地文件头的长度；其后依次是新条目的本地文件头和旧的文件末尾
+IN_PLACE_JOURNAL_HEADER = '<8sQQH'
+# 插入逻辑有改动时递增，缓存中旧版本的处理结果随之失效
+INSERT_LOGIC_VERSION = 2
+EOCD_SIGNATURE = b'PK\x05\x06'
+EOCD_SIZE = 22
+PARTIAL_HASH_SIZE = 64 * 1024
+CENTRAL_DIRECTORY_HASH_LIMIT = 16 * 1024 * 1024
+FULL_HASH_CHUNK_SIZE = 4 * 1024 * 1024
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+# 并行重新压缩时，在途条目解压后的总大小上限，以及单个条目进入线程池的大小上限
+PARALLEL_WINDOW_BYTES = 256 * 1024 * 1024
+PARALLEL_MEMBER_LIMIT = 32 * 1024 * 1024
+COMPRESS_WORKERS = os.cpu_count() or 1
+# 这些格式本身已经压缩过，再用 deflate 几乎不会变小
+PRECOMPRESSED_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
 
-def find_all_zip_files(paths, logger=print):
+# 写出条目时的压缩策略。默认保留每个条目原来的压缩方式；
+# store_images 为真时已压缩的图片格式一律存储(ZIP_STORED)；deflate_level 不为空时 deflate 条目按该级别重新压缩
+CompressionPolicy = namedtuple('CompressionPolicy', ['store_images', 'deflate_level'], defaults=(False, None))
+
+def _scan_zip_files(directory):
+    # 用 os.scandir 逐个目录遍历，找到一个就立即交出；与 os.walk 一样不进入符号链接目录、忽略无法访问的目录
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            elif entry.name.lower().endswith('.zip'):
+                yield entry.path
+        pending.extend(reversed(subdirs))
+
+def iter_zip_files(paths, logger=print):
+    """边扫描边产出 ZIP 文件路径，同一路径只产出一次"""
     logger(f"--- 正在执行 find_all_zip_files ---")
-    zip_files = set()
+    seen = set()
     for path_str in paths:
         path = Path(path_str)
         if not path.exists():
@@ -31,117 +110,686 @@ def find_all_zip_files(paths, logger=print):
             continue
         if path.is_dir():
             logger(f"正在扫描目录: {path_str}...")
-            for root, _, files in os.walk(path):
-                for file in files:
-                    if file.lower().endswith('.zip'):
-                        zip_files.add(os.path.join(root, file))
-        elif path.is_file():
-            if path.name.lower().endswith('.zip'):
-                zip_files.add(str(path))
-    return list(zip_files)
-
-def deduplicate_files_by_hash(file_paths, logger=print):
+            found = _scan_zip_files(str(path))
+        elif path.is_file() and path.name.lower().endswith('.zip'):
+            found = [str(path)]
+        else:
+            found = []
+        for zip_path in found:
+            if zip_path not in seen:
+                seen.add(zip_path)
+                yield zip_path
+
+def find_all_zip_files(paths, logger=print):
+    with span("scan") as scan_span:
+        zip_files = list(iter_zip_files(paths, logger=logger))
+        scan_span.add(archives=len(zip_files))
+    return zip_files
+
+def _hash_file_partial(file_path):
+    # 只读文件头、文件尾和中央目录；内容相同的文件结果必然相同，可以安全地用来排除不同的文件
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        hasher.update(f.read(PARTIAL_HASH_SIZE))
+        tail_offset = max(0, file_size - PARTIAL_HASH_SIZE)
+        f.seek(tail_offset)
+        tail = f.read()
+        hasher.update(tail)
+        eocd_pos = tail.rfind(EOCD_SIGNATURE)
+        if eocd_pos >= 0 and len(tail) - eocd_pos >= EOCD_SIZE:
+            cd_size, cd_offset = struct.unpack('<LL', tail[eocd_pos + 12:eocd_pos + 20])
+            if cd_offset != 0xFFFFFFFF and cd_offset + cd_size <= file_size:
+                f.seek(cd_offset)
+                hasher.update(f.read(min(cd_size, CENTRAL_DIRECTORY_HASH_LIMIT)))
+    return hasher.hexdigest()
+
+def _hash_file_full(file_path):
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(FULL_HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def _try_hash(hash_func, file_path):
+    try:
+        return hash_func(file_path), None
+    except Exception as e:
+        return None, e
+
+def _hash_stage(executor, file_paths, hash_func, cached_hashes, logger):
+    # 已缓存的哈希直接复用，其余的并行计算；失败的文件记录日志后略过
+    missing = [p for p in file_paths if cached_hashes.get(p) is None]
+    computed = dict(zip(missing, executor.map(lambda p: _try_hash(hash_func, p), missing)))
+    hashes = {}
+    for file_path in file_paths:
+        if cached_hashes.get(file_path) is not None:
+            hashes[file_path] = cached_hashes[file_path]
+            continue
+        file_hash, error = computed[file_path]
+        if error is not None:
+            logger(f"错误: 计算哈希值失败 {file_path}, 原因: {error}")
+            continue
+        hashes[file_path] = file_hash
+    return hashes, set(computed) & set(hashes)
+
+def deduplicate_files_by_hash(file_paths, logger=print, jobs=HASH_WORKERS, cache=None, on_duplicate=None):
+    """分阶段去重：先按大小分组，大小相同的再比较头尾和中央目录，仍然相同才计算完整哈希。
+
+    返回值与逐个计算完整 SHA-256 相同：每组内容相同的文件只保留输入顺序中的第一个。
+    传入 ZipCache 时，未改动文件的哈希值直接从缓存读取。
+    on_duplicate 不为空时，对每个被判定为重复的文件调用一次；读取失败的文件既不在返回值里，也不算重复。
+    """
     logger(f"--- 正在执行 deduplicate_files_by_hash ---")
-    unique_files = {}
+    signatures = {}
     for file_path in file_paths:
         try:
-            logger(f"  -> 计算哈希值: {os.path.basename(file_path)}")
-            hasher = hashlib.sha256()
-            with open(file_path, 'rb') as f:
-                while chunk := f.read(8192):
-                    hasher.update(chunk)
-            file_hash = hasher.hexdigest()
-            if file_hash not in unique_files:
-                unique_files[file_hash] = file_path
+            signatures[file_path] = file_signature(file_path)
         except Exception as e:
             logger(f"错误: 计算哈希值失败 {file_path}, 原因: {e}")
+
+    size_groups = {}
+    for file_path, signature in signatures.items():
+        size_groups.setdefault(signature[0], []).append(file_path)
+
+    # 去重键: 大小唯一的文件只用大小; 否则依次加上部分哈希、完整哈希
+    dedup_keys = {paths[0]: (size,) for size, paths in size_groups.items() if len(paths) == 1}
+    same_size = [p for paths in size_groups.values() if len(paths) > 1 for p in paths]
+    logger(f"  -> 按大小分组: {len(dedup_keys)} 个文件大小唯一, {len(same_size)} 个文件需要进一步比较")
+
+    cached_partial, cached_full = {}, {}
+    if cache is not None:
+        for file_path in same_size:
+            cached_partial[file_path], cached_full[file_path] = cache.get_hashes(file_path, signatures[file_path])
+
+    with span("hash", archives=len(file_paths)) as hash_span, ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        partial_hashes, new_partial = _hash_stage(executor, same_size, _hash_file_partial, cached_partial, logger)
+        partial_groups = {}
+        for file_path, partial_hash in partial_hashes.items():
+            partial_groups.setdefault((signatures[file_path][0], partial_hash), []).append(file_path)
+
+        need_full_hash = []
+        for key, paths in partial_groups.items():
+            if len(paths) == 1:
+                dedup_keys[paths[0]] = key
+            else:
+                need_full_hash.extend(paths)
+
+        for file_path in need_full_hash:
+            if cached_full.get(file_path) is None:
+                logger(f"  -> 计算哈希值: {os.path.basename(file_path)}")
+        full_hashes, new_full = _hash_stage(executor, need_full_hash, _hash_file_full, cached_full, logger)
+        for file_path, full_hash in full_hashes.items():
+            dedup_keys[file_path] = (signatures[file_path][0], full_hash)
+        if hash_span.enabled:
+            # 部分哈希按头尾各 PARTIAL_HASH_SIZE 估算，不含中央目录
+            hash_span.add(bytes_read=sum(min(signatures[p][0], 2 * PARTIAL_HASH_SIZE) for p in new_partial)
+                          + sum(signatures[p][0] for p in new_full))
+
+    if cache is not None:
+        for file_path in new_partial | new_full:
+            cache.put_hashes(file_path, signatures[file_path],
+                             partial_hash=partial_hashes.get(file_path), full_hash=full_hashes.get(file_path))
+        cache.conn.commit()
+
+    unique_files = {}
+    for file_path in file_paths:
+        key = dedup_keys.get(file_path)
+        if key is None:
+            continue
+        if key not in unique_files:
+            unique_files[key] = file_path
+        elif on_duplicate is not None:
+            on_duplicate(file_path)
     return list(unique_files.values())
 
-def _decode_zip_filename(filename_bytes):
-    encodings_to_try = ['utf-8', 'gbk', 'shift-jis', 'big5']
-    for encoding in encodings_to_try:
+def collect_duplicates(journal=None):
+    """返回 (结果列表, on_duplicate 回调)：每个重复的压缩包记为 ZipResult(路径, 跳过, "duplicate")，
+    入口函数的返回值因此覆盖每一个输入的压缩包；传入 RunJournal 时同时记入进度日志"""
+    duplicate_results = []
+    def on_duplicate(zip_path):
+        duplicate_results.append(ZipResult(zip_path, STATUS_SKIPPED, DUPLICATE_REASON))
+        if journal is not None:
+            journal.mark_duplicate(zip_path)
+    return duplicate_results, on_duplicate
+
+class IncrementalDeduplicator:
+    """流水线用的增量去重：每来一个文件就判断它是否与之前接纳的文件内容相同，结果与 deduplicate_files_by_hash 相同。
+
+    接纳的文件随后会被交给工作进程改写，之后就算不出它原来的内容哈希了，后来的文件也就无法与它比较。
+    所以每个文件在接纳时（交出去之前）立即计算完整哈希；传入 ZipCache 时未改动文件的哈希直接从缓存读取。
+    """
+
+    def __init__(self, logger=print, cache=None, on_duplicate=None):
+        self.logger = logger
+        self.cache = cache
+        self.on_duplicate = on_duplicate
+        self.accepted = set()  # 已接纳文件的 (大小, 完整哈希)
+
+    def _full_hash(self, file_path, signature):
+        if self.cache is not None:
+            cached = self.cache.get_hashes(file_path, signature)[1]
+            if cached is not None:
+                return cached
+        full_hash = _hash_file_full(file_path)
+        if self.cache is not None:
+            self.cache.put_hashes(file_path, signature, full_hash=full_hash)
+        return full_hash
+
+    def add(self, file_path):
+        """文件是新内容时返回 True；与已接纳的文件重复或读取失败时返回 False"""
         try:
-            return filename_bytes.decode(encoding)
-        except UnicodeDecodeError:
-            continue
-    return f"DECODE_ERROR_{filename_bytes.hex()}"
+            signature = file_signature(file_path)
+            key = (signature[0], self._full_hash(file_path, signature))
+        except Exception as e:
+            self.logger(f"错误: 计算哈希值失败 {file_path}, 原因: {e}")
+            return False
+        if key in self.accepted:
+            if self.on_duplicate is not None:
+                self.on_duplicate(file_path)
+            return False
+        self.accepted.add(key)
+        return True
+
+    def filter(self, file_paths):
+        for file_path in file_paths:
+            if self.add(file_path):
+                yield file_path
+
+def _read_local_header(fp, info):
+    """返回 (本地文件头的原始字节, 压缩数据的起始偏移)"""
+    # 本地文件头里的文件名/扩展字段长度可能与中央目录不同，必须以本地头为准
+    fp.seek(info.header_offset)
+    header = fp.read(LOCAL_HEADER_SIZE)
+    if len(header) != LOCAL_HEADER_SIZE or header[:4] != LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"本地文件头损坏: {info.filename}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    header += fp.read(name_length + extra_length)
+    return header, info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length
+
+def _iter_raw_chunks(fp, size, chunk_size=RAW_COPY_CHUNK_SIZE, lock=None, position=None):
+    # position 为空时从 fp 的当前位置读起；lock 不为空时每次读取前重新定位，其它线程可以同时通过 zin.open 读取同一个文件
+    if position is None:
+        position = fp.tell()
+    elif lock is None:
+        fp.seek(position)
+    remaining = size
+    while remaining > 0:
+        if lock is None:
+            chunk = fp.read(min(chunk_size, remaining))
+        else:
+            with lock:
+                fp.seek(position)
+                chunk = fp.read(min(chunk_size, remaining))
+        position += len(chunk)
+        if not chunk:
+            raise zipfile.BadZipFile("压缩数据被截断")
+        remaining -= len(chunk)
+        yield chunk
+
+def _raw_entry_zip64(zinfo):
+    # 本地头和数据描述符必须对 Zip64 的判断一致，所以显式按真实大小决定
+    return zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+
+def _begin_raw_entry(zout, zinfo):
+    """定位到 zout 的写入位置并登记条目偏移，返回本地头是否使用 Zip64"""
+    zip64 = _raw_entry_zip64(zinfo)
+    begin_raw_write(zout, zinfo)
+    return zip64
+
+def _finish_raw_entry(zout, zinfo, zip64):
+    if zinfo.flag_bits & DATA_DESCRIPTOR_FLAG:
+        if zip64:
+            zout.fp.write(struct.pack('<4sLQQ', b'PK\x07\x08', zinfo.CRC, zinfo.compress_size, zinfo.file_size))
+        else:
+            zout.fp.write(struct.pack('<4sLLL', b'PK\x07\x08', zinfo.CRC, zinfo.compress_size, zinfo.file_size))
+    end_raw_write(zout, zinfo)
+
+def _write_raw_entry(zout, zinfo, raw_chunks):
+    """把已经压缩好的数据连同 CRC/大小原样写入 zout，不经过解压和重新压缩"""
+    zip64 = _begin_raw_entry(zout, zinfo)
+    zout.fp.write(zinfo.FileHeader(zip64))
+    for chunk in raw_chunks:
+        zout.fp.write(chunk)
+    _finish_raw_entry(zout, zinfo, zip64)
+
+def _transfer_raw_range(zin, zout, offset, size, buffer_size=RAW_COPY_CHUNK_SIZE):
+    """把 zin 中从 offset 开始的 size 字节追加到 zout，能在内核中复制的部分不经过 Python 缓冲区"""
+    zout.fp.flush()
+    dst_offset = zout.fp.tell()
+    # 显式给出偏移，不移动 zin.fp 的位置，不需要持有 zin 的锁
+    copied = copy_range(zin.fp, offset, zout.fp, dst_offset, size)
+    zout.fp.seek(dst_offset + copied)
+    for chunk in _iter_raw_chunks(zin.fp, size - copied, buffer_size, archive_lock(zin), offset + copied):
+        zout.fp.write(chunk)
+
+def _copy_raw_entry(zin, zout, info, arcname, buffer_size=RAW_COPY_CHUNK_SIZE):
+    """以原始压缩流的形式复制一个条目，只改写文件名，返回写入后的 ZipInfo"""
+    info_copy = copy.copy(info)
+    info_copy.filename = arcname
+    info_copy.extra = b''
+    # 大小和CRC已知，直接写进本地文件头；加密条目的校验字节依赖数据描述符标志，保持不动
+    if not info_copy.flag_bits & ENCRYPTED_FLAG:
+        info_copy.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    with archive_lock(zin):
+        local_header, data_offset = _read_local_header(zin.fp, info)
+    zip64 = _begin_raw_entry(zout, info_copy)
+    header = info_copy.FileHeader(zip64)
+    if header == local_header:
+        # 本地头逐字节相同时连同本地头整段搬运：文件开头未改动的条目在新旧文件中偏移相同，reflink 可以整块克隆
+        _transfer_raw_range(zin, zout, info.header_offset, len(header) + info.compress_size, buffer_size)
+    else:
+        zout.fp.write(header)
+        _transfer_raw_range(zin, zout, data_offset, info.compress_size, buffer_size)
+    _finish_raw_entry(zout, info_copy, zip64)
+    return info_copy
+
+def _copy_recompressed_entry(zin, zout, info, arcname, compress_type, compresslevel=None,
+                             buffer_size=RAW_COPY_CHUNK_SIZE):
+    """边解压边按新的压缩方式写出，内存占用不超过 buffer_size 量级，返回写入后的 ZipInfo"""
+    info_copy = copy.copy(info)
+    info_copy.filename = arcname
+    info_copy.extra = b''
+    info_copy.compress_type = compress_type
+    set_compresslevel(info_copy, compresslevel)
+    # file_size 保留原值，zipfile 据此提前决定是否需要 Zip64 头
+    with zin.open(info) as src, zout.open(info_copy, 'w') as dst:
+        while chunk := src.read(buffer_size):
+            dst.write(chunk)
+    return info_copy
+
+def resolve_compression(policy, compress_type, arcname):
+    """按策略返回 (压缩方式, 压缩级别)；compress_type 是条目原来的压缩方式，级别为 None 表示不需要重新压缩"""
+    if policy is None:
+        return compress_type, None
+    if policy.store_images and os.path.splitext(arcname)[1].lower() in PRECOMPRESSED_IMAGE_EXTENSIONS:
+        return zipfile.ZIP_STORED, None
+    if policy.deflate_level is not None and compress_type == zipfile.ZIP_DEFLATED:
+        return zipfile.ZIP_DEFLATED, policy.deflate_level
+    return compress_type, None
+
+def _copy_entry(zin, zout, info, arcname, compress_type=None, compresslevel=None,
+                buffer_size=RAW_COPY_CHUNK_SIZE):
+    # 压缩方式和级别都不变时直接搬运压缩流，否则流式重新压缩
+    if compress_type is None or (compress_type == info.compress_type and compresslevel is None):
+        return _copy_raw_entry(zin, zout, info, arcname, buffer_size)
+    return _copy_recompressed_entry(zin, zout, info, arcname, compress_type, compresslevel, buffer_size)
 
-def process_single_zip(zip_path, logger=print):
+def _recompression_for(info, arcname, policy):
+    """条目需要重新压缩时返回 (压缩方式, 压缩级别)，可以原样搬运时返回 None"""
+    if policy is None or info.is_dir() or info.flag_bits & ENCRYPTED_FLAG:
+        # 目录没有数据，加密条目无法解压重压，都按原样搬运
+        return None
+    compress_type, compresslevel = resolve_compression(policy, info.compress_type, arcname)
+    if compress_type == info.compress_type and compresslevel is None:
+        return None
+    return compress_type, compresslevel
+
+def _copy_entry_with_policy(zin, zout, info, arcname, policy=None, buffer_size=RAW_COPY_CHUNK_SIZE):
+    recompression = _recompression_for(info, arcname, policy)
+    if recompression is None:
+        return _copy_raw_entry(zin, zout, info, arcname, buffer_size)
+    return _copy_recompressed_entry(zin, zout, info, arcname, *recompression, buffer_size)
+
+def rewrite_counters(entries, output_path, policy=None):
+    # 改写阶段的字节统计：读取的压缩数据、写出的文件大小、需要解压重压的数据
+    entries = list(entries)
+    return {
+        "bytes_read": sum(info.compress_size for info, _ in entries),
+        "bytes_written": os.path.getsize(output_path),
+        "bytes_decompressed": sum(info.file_size for info, arcname in entries
+                                  if _recompression_for(info, arcname, policy) is not None),
+    }
+
+def _decompress_member(info, raw):
+    # 与 ZipExtFile 一样校验解压后的大小和 CRC
+    decompressor = get_decompressor(info.compress_type)
+    if decompressor is None:
+        data = raw
+    else:
+        data = decompressor.decompress(raw)
+        if hasattr(decompressor, 'flush'):
+            data += decompressor.flush()
+    if len(data) != info.file_size or zlib.crc32(data) != info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+    return data
+
+def _recompress_member(zin, info, compress_type, compresslevel):
+    # 在线程池中执行：整个条目读入内存后解压并重新压缩，zlib 在压缩/解压期间会释放 GIL。
+    # 不能调用 zin.open：ZipFile 对打开的条目计数时没有加锁，多个线程同时打开/关闭可能提前关掉 zin.fp。
+    # 这里在 zin 的锁下按显式偏移读取原始压缩流，再自行解压
+    lock = archive_lock(zin)
+    with lock:
+        _, data_offset = _read_local_header(zin.fp, info)
+    raw = b''.join(_iter_raw_chunks(zin.fp, info.compress_size, RAW_COPY_CHUNK_SIZE, lock, data_offset))
+    data = _decompress_member(info, raw)
+    compressor = get_compressor(compress_type, compresslevel)
+    compressed = data if compressor is None else compressor.compress(data) + compressor.flush()
+    return compressed, zlib.crc32(data), len(data)
+
+def _write_recompressed_member(zout, info, arcname, compress_type, compresslevel, recompressed):
+    compressed, crc, file_size = recompressed
+    info_copy = copy.copy(info)
+    info_copy.filename = arcname
+    info_copy.extra = b''
+    info_copy.compress_type = compress_type
+    set_compresslevel(info_copy, compresslevel)
+    info_copy.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    info_copy.CRC = crc
+    info_copy.file_size = file_size
+    info_copy.compress_size = len(compressed)
+    _write_raw_entry(zout, info_copy, [compressed])
+    return info_copy
+
+def _copy_entries(zin, zout, entries, policy=None, buffer_size=RAW_COPY_CHUNK_SIZE, workers=1):
+    """按顺序复制 entries 中的 (条目, 新文件名)，每写完一个产出 (写入后的 ZipInfo, 新文件名)。
+
+    需要重新压缩的条目在 workers 个线程里提前压缩，写入仍由当前线程按原顺序进行；
+    在途条目的解压后大小合计不超过 PARALLEL_WINDOW_BYTES，超过 PARALLEL_MEMBER_LIMIT 的大条目仍按流式逐个处理。
+    """
+    if workers <= 1 or policy is None:
+        for info, arcname in entries:
+            yield _copy_entry_with_policy(zin, zout, info, arcname, policy, buffer_size), arcname
+        return
+
+    pending = deque()  # (条目, 新文件名, 压缩方式, 压缩级别, future 或 None)
+    in_flight_bytes = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def write_first():
+            nonlocal in_flight_bytes
+            info, arcname, compress_type, compresslevel, future = pending.popleft()
+            if future is None:
+                return _copy_entry_with_policy(zin, zout, info, arcname, policy, buffer_size), arcname
+            in_flight_bytes -= info.file_size
+            return _write_recompressed_member(zout, info, arcname, compress_type, compresslevel,
+                                              future.result()), arcname
+
+        for info, arcname in entries:
+            future = compress_type = compresslevel = None
+            recompression = _recompression_for(info, arcname, policy)
+            if recompression is not None and info.file_size <= PARALLEL_MEMBER_LIMIT:
+                compress_type, compresslevel = recompression
+                future = executor.submit(_recompress_member, zin, info, compress_type, compresslevel)
+                in_flight_bytes += info.file_size
+            pending.append((info, arcname, compress_type, compresslevel, future))
+            while pending and (pending[0][4] is None or pending[0][4].done()
+                               or in_flight_bytes > PARALLEL_WINDOW_BYTES or len(pending) > workers * 4):
+                yield write_first()
+        while pending:
+            yield write_first()
+
+def _open_zipfile(zip_path, prefetched=None):
+    if prefetched is None:
+        return zipfile.ZipFile(zip_path, 'r')
+    zin = zipfile.ZipFile(PrefetchedFile(prefetched), 'r')
+    # 让 ZipFile 关闭时一并关闭 PrefetchedFile（及其按需打开的真实文件）
+    zin._filePassed = 0
+    return zin
+
+def open_archive_index(zip_path, prefetched=None):
+    """打开压缩包并读取中央目录，返回 (ZipFile, ZipArchiveIndex)，由调用方负责关闭 ZipFile。
+
+    prefetched 是 Prefetcher 预读的 PrefetchedArchive，命中的部分不再读取文件。
+    """
+    with span("central_directory", archive=zip_path) as directory_span:
+        zin = _open_zipfile(zip_path, prefetched)
+        try:
+            index = ZipArchiveIndex.from_zipfile(zin)
+        except Exception:
+            zin.close()
+            raise
+        if directory_span.enabled:
+            directory_span.add(bytes_read=os.path.getsize(zip_path) - central_directory_offset(zin))
+    return zin, index
+
+def read_archive_index(zip_path, prefetched=None):
+    """只用 mmap（或预读的数据）解析中央目录，不打开 ZipFile，返回 (CentralDirectory, ZipArchiveIndex)"""
+    with span("central_directory", archive=zip_path) as directory_span:
+        if prefetched is not None:
+            directory = prefetched_central_directory(prefetched)
+        else:
+            directory = read_central_directory(zip_path)
+        index = ZipArchiveIndex(directory.infolist())
+        if directory_span.enabled:
+            directory_span.add(bytes_read=directory.file_size - directory.start_dir)
+    return directory, index
+
+def open_archive_for_plan(zip_path, planner, prefetched=None):
+    """先用 read_archive_index 判断压缩包是否需要处理，需要时才用 ZipFile 打开。
+
+    返回 (zin, index, plan)；plan.reason 不为 None 表示跳过，此时 zin 为 None。
+    快速读取失败（例如压缩包损坏）时直接走 ZipFile，由它给出原有的错误信息。
+    预读之后文件又被改动过时忽略 prefetched。
+    """
+    prefetched = usable_prefetch(zip_path, prefetched)
+    try:
+        _, index = read_archive_index(zip_path, prefetched)
+        plan = planner(index)
+        if plan.reason is not None:
+            return None, index, plan
+    except Exception:
+        pass
+    zin, index = open_archive_index(zip_path, prefetched)
+    try:
+        plan = planner(index)
+    except Exception:
+        zin.close()
+        raise
+    if plan.reason is not None:
+        zin.close()
+        zin = None
+    return zin, index, plan
+
+def _blank_page_info(template_info, arcname, blank_page):
+    # 以图1的条目为模板（时间、属性、压缩方式），CRC和大小直接取缓存里预先算好的值
+    new_info = copy.copy(template_info)
+    new_info.filename = arcname
+    new_info.extra = b''
+    new_info.flag_bits = 0
+    new_info.compress_type = blank_page.compress_type
+    new_info.CRC = blank_page.crc
+    new_info.file_size = blank_page.file_size
+    new_info.compress_size = blank_page.compress_size
+    return new_info
+
+def _fsync_path(path):
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+def _fsync_directory(path):
+    # 让目录项（改名、新建）也落盘；Windows 不能打开目录，NTFS 的元数据日志本身保证了这一点
+    if os.name == 'nt':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _read_in_place_journal(journal_path):
+    """返回 (旧中央目录偏移, 原文件大小, 新条目本地文件头, 旧的文件末尾)"""
+    with open(journal_path, 'rb') as j:
+        data = j.read()
+    header_size = struct.calcsize(IN_PLACE_JOURNAL_HEADER)
+    if len(data) < header_size or data[:8] != IN_PLACE_JOURNAL_MAGIC:
+        raise zipfile.BadZipFile(f"回滚日志已损坏: {journal_path}")
+    _, cd_offset, original_size, new_header_length = struct.unpack_from(IN_PLACE_JOURNAL_HEADER, data)
+    new_header = data[header_size:header_size + new_header_length]
+    old_tail = data[header_size + new_header_length:]
+    if len(new_header) != new_header_length or len(old_tail) != original_size - cd_offset:
+        raise zipfile.BadZipFile(f"回滚日志已损坏: {journal_path}")
+    return cd_offset, original_size, new_header, old_tail
+
+def _matches_in_place_write(f, cd_offset, new_header, old_tail):
+    """压缩包在 cd_offset 处是否仍是原地写入留下的内容：新条目的本地文件头（可能只写了一部分），
+    其后是尚未被覆盖的旧中央目录。被其它程序重写过的压缩包不满足这一点，不能用日志回滚"""
+    f.seek(cd_offset)
+    compare_size = min(len(old_tail), 4096)
+    current = f.read(max(len(new_header), compare_size))
+    if len(current) < compare_size:
+        # 追加模式只会让文件变长，比写入前还短说明被其它程序改写过
+        return False
+    written = 0
+    while written < len(new_header) and current[written] == new_header[written]:
+        written += 1
+    if written == len(new_header) and written:
+        return True
+    return current[written:] == old_tail[written:len(current)]
+
+def _restore_from_journal(zip_path, journal_path):
+    """按日志恢复原地写入前的压缩包并删除日志，返回 True；日志与压缩包对不上时只删除日志，返回 False"""
+    cd_offset, original_size, new_header, old_tail = _read_in_place_journal(journal_path)
+    with open(zip_path, 'rb+') as f:
+        if not _matches_in_place_write(f, cd_offset, new_header, old_tail):
+            restored = False
+        else:
+            f.seek(cd_offset)
+            f.write(old_tail)
+            f.truncate(original_size)
+            f.flush()
+            os.fsync(f.fileno())
+            restored = True
+    os.remove(journal_path)
+    return restored
+
+def rollback_in_place_journal(zip_path, logger=print):
+    """如果上次原地追加被中断，用日志里保存的旧中央目录恢复压缩包，返回是否执行了回滚。
+
+    压缩包在日志写下之后又被其它程序改写过时，日志已经过期，只删除日志，不改动压缩包。
+    """
+    journal_path = zip_path + IN_PLACE_JOURNAL_SUFFIX
+    if not os.path.exists(journal_path):
+        return False
+    if not _restore_from_journal(zip_path, journal_path):
+        logger(f"  -> 警告: 原地写入日志与压缩包内容不符（压缩包已被改写过），已忽略该日志: "
+               f"{os.path.basename(journal_path)}")
+        return False
+    logger(f"  -> 检测到未完成的原地写入，已回滚: {os.path.basename(zip_path)}")
+    return True
+
+def _insert_entry_in_place(zip_path, new_info, blank_page, anchor_index):
+    """把新条目写在旧中央目录的位置上，再在其后写出新的中央目录，不重写已有数据"""
+    journal_path = zip_path + IN_PLACE_JOURNAL_SUFFIX
+    journal_written = False
+    try:
+        with zipfile.ZipFile(zip_path, 'a') as zout:
+            cd_offset = central_directory_offset(zout)
+            zout.fp.seek(0, os.SEEK_END)
+            original_size = zout.fp.tell()
+            zout.fp.seek(cd_offset)
+            old_tail = zout.fp.read()
+            # 新条目的本地文件头会写在 cd_offset 处，回滚前据此确认压缩包没有被其它程序改写过
+            new_header = new_info.FileHeader(_raw_entry_zip64(new_info))
+            # 先落盘旧中央目录，写临时文件再改名并同步目录，保证日志要么完整要么不存在
+            journal_tmp_path = journal_path + ".tmp"
+            with open(journal_tmp_path, 'wb') as j:
+                j.write(struct.pack(IN_PLACE_JOURNAL_HEADER, IN_PLACE_JOURNAL_MAGIC, cd_offset, original_size,
+                                    len(new_header)))
+                j.write(new_header)
+                j.write(old_tail)
+                j.flush()
+                os.fsync(j.fileno())
+            os.replace(journal_tmp_path, journal_path)
+            journal_written = True
+            _fsync_directory(journal_path)
+
+            _write_raw_entry(zout, new_info, [blank_page.compressed_data])
+            # 数据追加在末尾，但中央目录里把新页排在图1之后，阅读器看到的顺序与重写模式一致
+            move_last_entry(zout, anchor_index + 1)
+            for info in zout.infolist():
+                if info is not new_info and not info.flag_bits & UTF8_FLAG:
+                    info.__class__ = RawNameZipInfo
+        _fsync_path(zip_path)
+    except BaseException:
+        # 写到一半失败（例如磁盘已满）时，ZipFile.close 仍会写出新的中央目录，必须立即回滚
+        if journal_written:
+            _restore_from_journal(zip_path, journal_path)
+        raise
+    os.remove(journal_path)
+
+# reason 为 None 表示需要插入白页，否则是跳过原因
+InsertPlan = namedtuple('InsertPlan', ['reason', 'img1_name', 'img2_name', 'new_path'])
+
+def plan_insertion(index):
+    """只根据中央目录判断压缩包是否需要插入白页，不读取任何图片数据"""
+    if index.is_empty():
+        return InsertPlan("empty", None, None, None)
+    original_images = index.original_images()
+    if len(original_images) < 2:
+        return InsertPlan("too_few_images", None, None, None)
+    img1_name, img2_name = original_images[0], original_images[1]
+    new_path = index.sibling_path(img1_name)
+    if new_path in index.sort_keys:
+        return InsertPlan("already_exists", img1_name, img2_name, new_path)
+    return InsertPlan(None, img1_name, img2_name, new_path)
+
+def insertion_reads(index):
+    """供 Prefetcher 使用：需要插入白页时预读图2的开头，用来取得尺寸"""
+    plan = plan_insertion(index)
+    if plan.reason is not None:
+        return []
+    return [(index.name_to_info[plan.img2_name], PREFETCH_MEMBER_BYTES)]
+
+@traced("insert")
+def process_single_zip(zip_path, logger=print, in_place=False, buffer_size=RAW_COPY_CHUNK_SIZE, compression=None,
+                       compress_workers=1, prefetched=None):
     logger(f"--- 正在执行 process_single_zip, 处理: {os.path.basename(zip_path)} ---")
     temp_zip_path = ""
+    in_place_job = None
     try:
         temp_zip_path = zip_path + ".tmp"
-        with zipfile.ZipFile(zip_path, 'r') as zin:
-            filename_to_info_map = {}
-            for info in zin.infolist():
-                if info.flag_bits & UTF8_FLAG:
-                    filename = info.filename
-                else:
-                    filename = _decode_zip_filename(info.filename.encode('cp437', 'replace'))
-                
-                if not info.is_dir():
-                    filename_to_info_map[filename] = info
-            
-            correct_file_list = list(filename_to_info_map.keys())
-            if not correct_file_list:
-                logger(f"跳过: '{os.path.basename(zip_path)}' 是空的压缩包。")
-                return
-
-            deepest_dir = os.path.dirname(max(correct_file_list, key=lambda p: p.count('/')))
-            image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
-            images_in_deepest_dir = sorted(
-                [f for f in correct_file_list 
-                 if os.path.dirname(f) == deepest_dir and Path(f).suffix.lower() in image_extensions],
-                key=natural_sort_key
-            )
-            
-            original_images = [img for img in images_in_deepest_dir if not Path(img).stem.endswith('-1')]
-            if len(original_images) < 2:
-                logger(f"跳过: '{os.path.basename(zip_path)}' 在最深层目录 '{deepest_dir}' 中原始图片不足2张。")
-                return
-            
-            img1_name = original_images[0]
-            img2_name = original_images[1]
-            new_image_name = f"{Path(img1_name).stem}-1{Path(img1_name).suffix}"
-            
-            if new_image_name in images_in_deepest_dir:
-                logger(f"跳过: 文件 '{new_image_name}' 已存在，无需重复处理。")
-                return
-            
-            img2_info = filename_to_info_map[img2_name]
-            
-            with zin.open(img2_info) as f_img2:
-                img2_data = io.BytesIO(f_img2.read())
-                with Image.open(img2_data) as img:
-                    img2_size = img.size
+        rollback_in_place_journal(zip_path, logger=logger)
+        # 大多数压缩包在重复运行时都会被跳过，这种情况只读中央目录，不打开 ZipFile
+        zin, index, plan = open_archive_for_plan(zip_path, plan_insertion, prefetched)
+        if plan.reason == "empty":
+            logger(f"跳过: '{os.path.basename(zip_path)}' 是空的压缩包。")
+            return ZipResult(zip_path, STATUS_SKIPPED, plan.reason)
+        if plan.reason == "too_few_images":
+            logger(f"跳过: '{os.path.basename(zip_path)}' 在最深层目录 '{index.deepest_dir}' 中原始图片不足2张。")
+            return ZipResult(zip_path, STATUS_SKIPPED, plan.reason)
+        if plan.reason == "already_exists":
+            logger(f"跳过: 文件 '{os.path.basename(plan.new_path)}' 已存在，无需重复处理。")
+            return ZipResult(zip_path, STATUS_SKIPPED, plan.reason)
+
+        with zin:
+            img1_name = plan.img1_name
+            new_image_path_in_zip = plan.new_path
+            img1_info = index.name_to_info[img1_name]
+            img2_info = index.name_to_info[plan.img2_name]
             
-            new_image_path_in_zip = os.path.join(deepest_dir, new_image_name).replace("\\", "/")
-            white_image = Image.new('RGB', img2_size, 'white')
-            new_image_bytes = io.BytesIO()
-            image_format = 'JPEG' if Path(img1_name).suffix.lower() in ['.jpg', '.jpeg'] else Path(img1_name).suffix.lstrip('.').upper()
-            white_image.save(new_image_bytes, format=image_format)
-            new_image_data = new_image_bytes.getvalue()
+            # 只解析文件头取得尺寸，不必解压整张图片
+            with span("image_decode", archive=zip_path):
+                img2_size = read_image_size(lambda: zin.open(img2_info))
+                compress_type, compresslevel = resolve_compression(compression, img1_info.compress_type, new_image_path_in_zip)
+                blank_page = get_blank_page(img2_size, image_format_for_name(img1_name),
+                                            compress_type=compress_type, compresslevel=compresslevel)
             
-            with zipfile.ZipFile(temp_zip_path, 'w', zipfile.ZIP_DEFLATED) as zout:
-                for info in zin.infolist():
-                    info_copy = copy.copy(info)
-                    file_data = zin.read(info.filename)
-                    if info.flag_bits & UTF8_FLAG:
-                        correct_filename_str = info.filename
-                    else:
-                        correct_filename_str = _decode_zip_filename(info.filename.encode('cp437', 'replace'))
-                    
-                    info_copy.filename = correct_filename_str
-                    info_copy.extra = b''
-                    zout.writestr(info_copy, file_data)
-                    
-                    if correct_filename_str == img1_name:
-                        new_img_info = copy.copy(info_copy)
-                        new_img_info.filename = new_image_path_in_zip
-                        zout.writestr(new_img_info, new_image_data)
-                        
+            if in_place:
+                # 原地模式不改写已有条目的文件名编码，只追加新页
+                new_img_info = _blank_page_info(img1_info, new_image_path_in_zip, blank_page)
+                in_place_job = (new_img_info, blank_page, index.infos.index(img1_info))
+            else:
+                with span("rewrite", archive=zip_path) as rewrite_span:
+                    with zipfile.ZipFile(temp_zip_path, 'w', zipfile.ZIP_DEFLATED) as zout:
+                        # 原有条目直接搬运压缩流，只有新的白页（以及压缩策略要求重新压缩的条目）需要压缩
+                        for info_copy, correct_filename_str in _copy_entries(zin, zout, index.entries(), compression,
+                                                                             buffer_size, compress_workers):
+                            if correct_filename_str == img1_name:
+                                new_img_info = _blank_page_info(info_copy, new_image_path_in_zip, blank_page)
+                                _write_raw_entry(zout, new_img_info, [blank_page.compressed_data])
+                    if rewrite_span.enabled:
+                        rewrite_span.add(**rewrite_counters(index.entries(), temp_zip_path, compression))
+                            
+        if in_place_job:
+            with span("rewrite", archive=zip_path) as rewrite_span:
+                _insert_entry_in_place(zip_path, *in_place_job)
+                if rewrite_span.enabled:
+                    # 原地模式只写入旧中央目录位置之后的部分
+                    rewrite_span.add(bytes_written=os.path.getsize(zip_path) - central_directory_offset(zin))
+        else:
             shutil.move(temp_zip_path, zip_path)
-            logger(f"成功: 已处理 '{os.path.basename(zip_path)}'。")
+        logger(f"成功: 已处理 '{os.path.basename(zip_path)}'。")
+        return ZipResult(zip_path, STATUS_PROCESSED, "inserted")
 
     except Exception as e:
         logger(f"错误: 处理 '{os.path.basename(zip_path)}' 失败, 原因: {e}")
@@ -150,26 +798,100 @@ def process_single_zip(zip_path, logger=print):
         logger(error_details)
         if os.path.exists(temp_zip_path):
             os.remove(temp_zip_path)
+        if in_place_job:
+            rollback_in_place_journal(zip_path, logger=logger)
+        return ZipResult(zip_path, STATUS_FAILED, "error")
+
+def compress_workers_per_job(jobs):
+    # 多个压缩包并行处理时平分CPU，避免每个进程都开满线程
+    return max(1, COMPRESS_WORKERS // max(1, jobs or 1))
 
-def process_entry_point(initial_paths, logger=print):
+def run_pipelined(func, initial_paths, operation, logic_version, logger=print, jobs=1, cache=None,
+                  progress=None, journal=None, cancel=None, **kwargs):
+    """查找、去重、处理三个阶段流水线执行：找到第一个压缩包就开始处理，而不是等整个书库扫描和哈希完成"""
+    logger("流水线模式: 边查找边去重边处理...")
+    zip_paths = iter_zip_files(initial_paths, logger=logger)
+    resumed_results = []
+    if journal is not None:
+        zip_paths = journal.iter_resume(zip_paths, resumed_results, logger=logger)
+        progress = journal.track(progress)
+    duplicate_results, on_duplicate = collect_duplicates(journal)
+    zip_paths = IncrementalDeduplicator(logger=logger, cache=cache, on_duplicate=on_duplicate).filter(zip_paths)
+    cached_results = []
+    if cache is not None:
+        zip_paths = cache.iter_uncached(zip_paths, operation, logic_version, cached_results)
+    if journal is not None:
+        zip_paths = journal.iter_planned(zip_paths)
+    results = run_pipeline(func, zip_paths, logger=logger, jobs=jobs, progress=progress, cancel=cancel,
+                           header="开始处理文件", **kwargs)
+    if cache is not None:
+        cache.record_results(results, operation, logic_version)
+        if cached_results:
+            logger(f"  -> 缓存命中: {len(cached_results)} 个压缩包自上次处理后未改动，已跳过。")
+    if resumed_results:
+        logger(f"  -> 续接上次运行: {len(resumed_results)} 个压缩包已完成，已跳过。")
+    if not results and not cached_results and not resumed_results and not duplicate_results:
+        logger("任务完成: 未在指定路径下找到任何ZIP文件。")
+        return []
+    if cancel is not None and cancel.is_set():
+        logger("\n任务已取消，已完成的压缩包下次运行时会跳过。")
+    else:
+        logger("\n所有任务已完成！")
+    return resumed_results + duplicate_results + cached_results + results
+
+@traced_run("run.insert")
+def process_entry_point(initial_paths, logger=print, in_place=False, jobs=1, cache=None,
+                        buffer_size=RAW_COPY_CHUNK_SIZE, progress=None, pipeline=False, compression=None,
+                        journal=None, cancel=None, device_limit=None, prefetch=0):
+    """journal 是 RunJournal，传入时跳过上次已完成的压缩包并记录本次进度；
+    cancel 是 threading.Event，设置后做完正在处理的压缩包即停止；
+    device_limit 限制每个磁盘同时处理的压缩包数（仅批处理模式，见 DeviceScheduler）；
+    prefetch 大于 0 时在后台预读接下来这么多个压缩包的中央目录和图2（见 Prefetcher）"""
     if not initial_paths:
         logger("任务中止: 没有提供任何文件或文件夹路径。")
-        return
+        return []
+
+    if pipeline:
+        with open_prefetcher(insertion_reads, prefetch) as prefetcher:
+            return run_pipelined(process_single_zip, initial_paths, "insert", INSERT_LOGIC_VERSION,
+                                 logger=logger, jobs=jobs, cache=cache, progress=progress, journal=journal,
+                                 cancel=cancel, prefetcher=prefetcher, in_place=in_place, buffer_size=buffer_size,
+                                 compression=compression, compress_workers=compress_workers_per_job(jobs))
 
     logger("步骤 1/4: 开始查找所有ZIP文件...")
     all_zips = find_all_zip_files(initial_paths, logger=logger)
     if not all_zips:
         logger("任务完成: 未在指定路径下找到任何ZIP文件。")
-        return
+        return []
     logger(f"查找到 {len(all_zips)} 个ZIP文件。")
+    resumed_results = []
+    if journal is not None:
+        all_zips, resumed_results = journal.resume(all_zips, logger=logger)
+        progress = journal.track(progress)
 
     logger("\n步骤 2/4: 开始计算哈希值以去重...")
-    unique_zips = deduplicate_files_by_hash(all_zips, logger=logger)
+    # 只有真正重复的文件记为已完成；哈希失败的文件留在日志之外，续接时会重试
+    duplicate_results, on_duplicate = collect_duplicates(journal)
+    unique_zips = deduplicate_files_by_hash(all_zips, logger=logger, cache=cache, on_duplicate=on_duplicate)
     logger(f"去重后剩余 {len(unique_zips)} 个独立文件。")
 
+    cached_results = []
+    if cache is not None:
+        unique_zips, cached_results = cache.split_cached(unique_zips, "insert", INSERT_LOGIC_VERSION, logger=logger)
+    if journal is not None:
+        journal.mark_planned(unique_zips)
+
     logger("\n步骤 3/4: 开始逐一处理ZIP文件...")
-    for i, zip_file in enumerate(unique_zips):
-        logger(f"\n--- ({i+1}/{len(unique_zips)}) 开始处理文件 ---")
-        process_single_zip(zip_file, logger=logger)
+    with open_prefetcher(insertion_reads, prefetch) as prefetcher:
+        results = run_batch(process_single_zip, unique_zips, logger=logger, jobs=jobs, progress=progress,
+                            cancel=cancel, device_limit=device_limit, prefetcher=prefetcher, header="开始处理文件",
+                            in_place=in_place, buffer_size=buffer_size,
+                            compression=compression, compress_workers=compress_workers_per_job(jobs))
+    if cache is not None:
+        cache.record_results(results, "insert", INSERT_LOGIC_VERSION)
     
-    logger("\n步骤 4/4: 所有任务已完成！")
\ No newline at end of file
+    if cancel is not None and cancel.is_set():
+        logger("\n任务已取消，已完成的压缩包下次运行时会跳过。")
+    else:
+        logger("\n步骤 4/4: 所有任务已完成！")
+    return resumed_results + duplicate_results + cached_results + results
\ No newline at end of file
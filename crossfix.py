@@ -0,0 +1,223 @@
+"""命令行入口，供服务器和流水线使用，不依赖 Tk：
+
+    python -m crossfix insert PATHS... [--jobs N] [--in-place]
+    python -m crossfix remove PATHS... [--jobs N]
+    python -m crossfix plan PATHS... [--operation insert|remove] [--output plan.json]
+    python -m crossfix watch FOLDERS... [--operation insert|remove] [--settle SECONDS]
+
+结果以每行一个 JSON 对象的形式写到标准输出，日志写到标准错误。
+"""
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_NO_ARCHIVES = 3
+
+def _read_path_list(source):
+    stream = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    try:
+        return [line.strip() for line in stream if line.strip()]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def _collect_paths(args):
+    paths = list(args.paths)
+    for source in args.from_file or []:
+        if source.lower().endswith(('.json', '.csv')):
+            from ZipPlanner import load_plan_paths
+            paths.extend(load_plan_paths(source))
+        else:
+            paths.extend(_read_path_list(source))
+    return paths
+
+def _make_logger(args):
+    if args.quiet:
+        return lambda message: None
+    return lambda message: print(message, file=sys.stderr, flush=True)
+
+def _emit(record):
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+def _open_cache(args):
+    if args.no_cache:
+        return None
+    from ZipCache import ZipCache
+    return ZipCache(args.cache)
+
+def _compression_policy(args):
+    if not args.store_images and args.deflate_level is None:
+        return None
+    from ZipWriteLogic import CompressionPolicy
+    return CompressionPolicy(args.store_images, args.deflate_level)
+
+def _open_trace_sink(args):
+    if not args.trace and not args.stats:
+        return None
+    from Instrumentation import AggregatingSink, JsonLinesSink, TeeSink, set_sink
+    sinks = [AggregatingSink()]
+    if args.trace:
+        sinks.append(JsonLinesSink(args.trace))
+    sink = TeeSink(*sinks)
+    set_sink(sink)
+    return sink
+
+def _open_journal(args, paths):
+    if not args.resume:
+        return None
+    from RunJournal import RunJournal, default_journal_path
+    return RunJournal(default_journal_path(args.command, paths), args.command)
+
+def _install_cancel_handler():
+    # 第一次 Ctrl+C 只请求取消，等正在处理的压缩包写完；第二次恢复默认行为立即中断
+    cancel = threading.Event()
+    def request_cancel(signum, frame):
+        print("正在取消: 等待当前压缩包处理完成，再按一次 Ctrl+C 立即中断。", file=sys.stderr, flush=True)
+        cancel.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGINT, request_cancel)
+    return cancel
+
+def _run_entry_point(args, entry_point, **kwargs):
+    paths = _collect_paths(args)
+    if not paths:
+        print("错误: 没有提供任何文件或文件夹路径。", file=sys.stderr)
+        return EXIT_USAGE
+    cache = _open_cache(args)
+    sink = _open_trace_sink(args)
+    journal = _open_journal(args, paths)
+    cancel = _install_cancel_handler()
+    completed = False
+    try:
+        results = entry_point(paths, logger=_make_logger(args), jobs=args.jobs, cache=cache,
+                              pipeline=args.pipeline, compression=_compression_policy(args), journal=journal,
+                              cancel=cancel, device_limit=args.per_device, prefetch=args.prefetch, **kwargs)
+        completed = not cancel.is_set()
+    finally:
+        if journal is not None:
+            # 正常跑完才删除进度日志，取消或中断时保留，下次加 --resume 续接
+            journal.close(completed=completed)
+        if cache is not None:
+            cache.close()
+        if sink is not None:
+            from Instrumentation import set_sink
+            set_sink(None)
+            sink.close()
+    for result in results:
+        _emit(result._asdict())
+    if not results:
+        return EXIT_NO_ARCHIVES
+    return EXIT_FAILURES if any(result.status == "failed" for result in results) else EXIT_OK
+
+def command_insert(args):
+    from ZipWriteLogic import process_entry_point
+    return _run_entry_point(args, process_entry_point, in_place=args.in_place)
+
+def command_remove(args):
+    from ZipDeleteLogic import remove_white_pages_entry_point
+    return _run_entry_point(args, remove_white_pages_entry_point)
+
+def command_plan(args):
+    from ZipPlanner import plan_entry_point, write_plan
+    paths = _collect_paths(args)
+    if not paths:
+        print("错误: 没有提供任何文件或文件夹路径。", file=sys.stderr)
+        return EXIT_USAGE
+    plan = plan_entry_point(paths, logger=_make_logger(args), operation=args.operation,
+                            in_place=args.in_place, dedup=args.dedup)
+    if args.output:
+        write_plan(plan, args.output, args.format)
+    else:
+        for entry in plan:
+            _emit(entry)
+    if not plan:
+        return EXIT_NO_ARCHIVES
+    return EXIT_FAILURES if any(entry["action"] == "fail" for entry in plan) else EXIT_OK
+
+def command_watch(args):
+    from WatchFolder import watch_folders
+    paths = _collect_paths(args)
+    if not paths:
+        print("错误: 没有提供任何文件夹路径。", file=sys.stderr)
+        return EXIT_USAGE
+    kwargs = {"in_place": args.in_place} if args.operation == "insert" else {}
+    if args.settle is not None:
+        kwargs["settle"] = args.settle
+    if args.poll_interval is not None:
+        kwargs["poll_interval"] = args.poll_interval
+    cache = _open_cache(args)
+    cancel = _install_cancel_handler()
+    try:
+        counts = watch_folders(paths, operation=args.operation, logger=_make_logger(args), jobs=args.jobs,
+                               cache=cache, cancel=cancel, on_result=lambda result: _emit(result._asdict()),
+                               use_inotify=not args.polling, compression=_compression_policy(args), **kwargs)
+    finally:
+        if cache is not None:
+            cache.close()
+    return EXIT_FAILURES if counts.get("failed") else EXIT_OK
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="crossfix", description="为漫画压缩包插入或删除跨页用的空白扉页")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("paths", nargs="*", help="压缩包或文件夹路径")
+    common.add_argument("--from-file", action="append", metavar="FILE",
+                        help="从文件读取路径列表，每行一个；'-' 表示标准输入；也可以是 plan 生成的 JSON/CSV")
+    common.add_argument("-q", "--quiet", action="store_true", help="不输出日志")
+
+    processing = argparse.ArgumentParser(add_help=False)
+    processing.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    processing.add_argument("--cache", metavar="DB", help="缓存数据库路径，默认位于用户缓存目录")
+    processing.add_argument("--no-cache", action="store_true", help="不读写缓存")
+    processing.add_argument("--store-images", action="store_true", help="JPEG/PNG/GIF 改为不压缩存储，阅读器翻页更快")
+    processing.add_argument("--deflate-level", type=int, choices=range(0, 10), metavar="0-9",
+                            help="按此级别重新压缩 deflate 条目，默认保持原压缩流不变")
+
+    runner = argparse.ArgumentParser(add_help=False, parents=[processing])
+    runner.add_argument("--pipeline", action="store_true", help="边查找边处理，不等整个书库扫描和去重完成")
+    runner.add_argument("--per-device", type=int, metavar="N",
+                        help="每个磁盘同时处理的压缩包数上限，默认机械硬盘为 1、其余不限；"
+                             "不同磁盘总是并行（不适用于 --pipeline）")
+    runner.add_argument("--prefetch", type=int, default=0, metavar="N",
+                        help="后台预读接下来 N 个压缩包的中央目录和要用到的图片，适合网络共享盘；默认不预读")
+    runner.add_argument("--resume", action="store_true",
+                        help="记录进度日志；同样的任务被中断后再次运行时跳过已完成的压缩包")
+    runner.add_argument("--trace", metavar="FILE", help="把各阶段/各压缩包的耗时和字节数以 JSON 行追加写入 FILE")
+    runner.add_argument("--stats", action="store_true", help="结束时输出各阶段耗时和吞吐量汇总表")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    insert_parser = subparsers.add_parser("insert", parents=[common, runner], help="插入空白扉页")
+    insert_parser.add_argument("--in-place", action="store_true", help="原地追加白页，不重写整个压缩包")
+    insert_parser.set_defaults(func=command_insert)
+    subparsers.add_parser("remove", parents=[common, runner], help="删除空白扉页").set_defaults(func=command_remove)
+    plan_parser = subparsers.add_parser("plan", parents=[common], help="只读取中央目录，生成处理计划")
+    plan_parser.add_argument("--operation", choices=["insert", "remove"], default="insert")
+    plan_parser.add_argument("--in-place", action="store_true", help="按原地追加模式估算改写字节数")
+    plan_parser.add_argument("--dedup", action="store_true", help="计划前先去重（需要读取文件内容）")
+    plan_parser.add_argument("-o", "--output", metavar="FILE", help="计划文件路径，默认以 JSON 行输出到标准输出")
+    plan_parser.add_argument("--format", choices=["json", "csv"], help="计划文件格式，默认按扩展名判断")
+    plan_parser.set_defaults(func=command_plan)
+    watch_parser = subparsers.add_parser("watch", parents=[common, processing],
+                                         help="持续监视文件夹，自动处理新放入或改动的压缩包")
+    watch_parser.add_argument("--operation", choices=["insert", "remove"], default="insert")
+    watch_parser.add_argument("--in-place", action="store_true", help="原地追加白页，不重写整个压缩包")
+    watch_parser.add_argument("--settle", type=float, metavar="SECONDS",
+                              help="压缩包多少秒内不再变化才认为已经写完，默认 5 秒")
+    watch_parser.add_argument("--poll-interval", type=float, metavar="SECONDS",
+                              help="轮询模式下检查文件变化的间隔，默认 2 秒")
+    watch_parser.add_argument("--polling", action="store_true", help="不使用 inotify，始终轮询")
+    watch_parser.set_defaults(func=command_watch)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
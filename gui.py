@@ -1,37 +1,185 @@
 import tkinter as tk
 from tkinter import ttk
+from tkinter import font as tkfont
 from tkinterdnd2 import DND_FILES, TkinterDnD
 from PIL import Image, ImageTk
 from  ZipWriteLogic import process_entry_point
 from  ZipDeleteLogic import remove_white_pages_entry_point
+from BatchExecutor import summarize_results, STATUS_PROCESSED, STATUS_SKIPPED, STATUS_FAILED
+from FileList import FileListModel, expand_paths, STATUS_PENDING
+from ZipCache import ZipCache
+from RunJournal import RunJournal, default_journal_path
+import contextlib
+import multiprocessing
+import os
+import queue
 import threading
 
+WORKER_COUNT = os.cpu_count() or 1
+LOG_POLL_INTERVAL_MS = 100  # 主线程从队列取日志的间隔
+LOG_BATCH_LIMIT = 2000      # 每次最多处理的队列记录数，避免一次取太多卡住界面
+MAX_LOG_LINES = 5000        # 日志框最多保留的行数
+WHEEL_SCROLL_ROWS = 3       # 鼠标滚轮每格滚动的行数
+STATUS_LABELS = {STATUS_PENDING: "等待", STATUS_PROCESSED: "完成", STATUS_SKIPPED: "跳过", STATUS_FAILED: "错误"}
+STATUS_COLORS = {STATUS_PENDING: "gray40", STATUS_PROCESSED: "dark green", STATUS_SKIPPED: "dark orange",
+                 STATUS_FAILED: "red"}
+
+# 工作线程只往队列里放记录，所有 Tk 操作都由主线程在 after 定时器里完成
+ui_queue = queue.Queue()
+# 取消时设置，工作线程做完当前压缩包后停止；勾选断点续接时进度日志保留，下次处理同样的文件列表时续接
+cancel_event = threading.Event()
+worker_thread = None
+# 文件列表的数据，只在主线程中修改
+file_model = FileListModel()
+# 清空列表时设置，正在后台展开的文件夹随之停止，已排队的结果也不再加入列表
+expand_cancel = threading.Event()
+
+class VirtualFileList:
+    """只绘制可见行的文件列表：行数据保存在 FileListModel 中，Canvas 上只保留一屏的文本项并反复复用，
+    几万个压缩包也不会拖慢界面；状态变化时只改写可见行的文字，不重建控件。"""
+
+    def __init__(self, parent, model):
+        self.model = model
+        self.font = tkfont.nametofont("TkDefaultFont")
+        self.row_height = self.font.metrics("linespace") + 2
+        self.status_width = max(self.font.measure(label) for label in STATUS_LABELS.values()) + 10
+        self.top = 0      # 第一个可见行的行号
+        self.slots = []   # 每个可见行的 (状态文本项, 路径文本项)
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+        self.canvas = tk.Canvas(parent, background="white", highlightthickness=0)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Configure>", self._on_resize)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.canvas.bind(sequence, self._on_wheel)
+
+    def _visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def _clamp(self):
+        self.top = max(0, min(self.top, len(self.model) - self._visible_rows()))
+
+    def _on_resize(self, event):
+        # 窗口变高时补足文本项；变矮时多出的文本项留着不用
+        while len(self.slots) < self._visible_rows() + 1:
+            y = len(self.slots) * self.row_height + 1
+            self.slots.append((self.canvas.create_text(4, y, anchor=tk.NW, font=self.font),
+                               self.canvas.create_text(4 + self.status_width, y, anchor=tk.NW, font=self.font)))
+        self._clamp()
+        self.refresh()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.yview("scroll", -WHEEL_SCROLL_ROWS, "units")
+        else:
+            self.yview("scroll", WHEEL_SCROLL_ROWS, "units")
+
+    def yview(self, *args):
+        """滚动条回调，参数格式与 Listbox.yview 相同"""
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.model))
+        elif args[0] == "scroll":
+            self.top += int(args[1]) * (self._visible_rows() if args[2] == "pages" else 1)
+        self._clamp()
+        self.refresh()
+
+    def is_at_end(self):
+        return self.top + self._visible_rows() >= len(self.model)
+
+    def scroll_to_end(self):
+        self.top = len(self.model)
+        self._clamp()
+
+    def refresh(self):
+        """按当前滚动位置填充可见行的文字，并同步滚动条"""
+        total = len(self.model)
+        for offset, (status_item, path_item) in enumerate(self.slots):
+            row = self.top + offset
+            if row < total:
+                status = self.model.statuses[row]
+                self.canvas.itemconfigure(status_item, text=STATUS_LABELS.get(status, status),
+                                          fill=STATUS_COLORS.get(status, "black"))
+                self.canvas.itemconfigure(path_item, text=self.model.paths[row])
+            else:
+                self.canvas.itemconfigure(status_item, text="")
+                self.canvas.itemconfigure(path_item, text="")
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self._visible_rows()) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
 def handle_drop(event):
     # event.data 是一个包含所有文件路径的字符串，使用 tk.splitlist分割
-    file_paths = root.tk.splitlist(event.data)
-    for file_path in file_paths:
-        file_listbox.insert(tk.END, file_path)
-    file_listbox.yview_moveto(1.0) 
+    new_paths = file_model.add_roots(root.tk.splitlist(event.data))
+    if not new_paths:
+        log_message("拖入的路径都已在列表中。")
+        return
+    log_message(f"正在后台展开 {len(new_paths)} 个拖入的路径...")
+    # 文件夹在后台线程中展开，找到的压缩包分批经队列交给主线程加入列表
+    threading.Thread(target=run_expand_thread, args=(new_paths, expand_cancel), daemon=True).start()
+
+def run_expand_thread(paths, cancel):
+    try:
+        total = expand_paths(paths, lambda batch: ui_queue.put(("files", cancel, batch)),
+                             logger=log_message, cancel=cancel)
+        ui_queue.put(("expanded", cancel, total))
+    except Exception as e:
+        log_message(f"展开文件夹时出错: {e}")
+
+def current_options():
+    """在主线程中读取界面上的选项，工作线程只使用这份快照；全部不勾选时与原来一样逐个顺序处理"""
+    return {"jobs": WORKER_COUNT if parallel_var.get() else 1,
+            "pipeline": pipeline_var.get(),
+            "cache": cache_var.get(),
+            "journal": journal_var.get()}
+
+def open_cache(options):
+    return ZipCache() if options["cache"] else contextlib.nullcontext()
+
+def open_journal(options, operation, paths):
+    if not options["journal"]:
+        return contextlib.nullcontext()
+    return RunJournal(default_journal_path(operation, paths), operation)
+
+def report_results(results):
+    # 缓存命中和续接跳过的压缩包不经过 progress 回调，结束时按最终结果统一更新列表状态
+    ui_queue.put(("statuses", [(result.path, result.status) for result in results]))
     
-def run_processing_thread(paths):
+def run_processing_thread(paths, options):
+    completed = False  # 入口函数正常返回且没有被取消
     try:
-        process_entry_point(paths, logger=log_message)
+        with open_cache(options) as cache, open_journal(options, "insert", paths) as journal:
+            results = process_entry_point(paths, logger=log_message, jobs=options["jobs"], cache=cache,
+                                          progress=report_progress, pipeline=options["pipeline"], journal=journal,
+                                          cancel=cancel_event)
+            if journal is not None:
+                journal.close(completed=not cancel_event.is_set())
+        report_results(results)
+        log_summary(results)
+        completed = not cancel_event.is_set()
     except Exception as e:
         log_message(f"发生严重错误: {e}")# 捕获任何未预料的全局错误
         import traceback
         log_message(traceback.format_exc())
     finally:
-        log_message("="*20)#重新启用按钮
+        log_message("="*20)
         log_message("任务处理结束。")
         log_message("="*20)
-        button1.config(state=tk.NORMAL)
-        button2.config(state=tk.NORMAL)
-        button3.config(state=tk.NORMAL)
+        ui_queue.put(("finished", completed))#由主线程重新启用按钮
         
-def run_processing_thread2(paths, entry_point_func, task_name):
+def run_processing_thread2(paths, entry_point_func, task_name, operation, options):
+    completed = False
     try:
         # 调用传入的特定功能函数
-        entry_point_func(paths, logger=log_message)
+        with open_cache(options) as cache, open_journal(options, operation, paths) as journal:
+            results = entry_point_func(paths, logger=log_message, jobs=options["jobs"], cache=cache,
+                                       progress=report_progress, pipeline=options["pipeline"], journal=journal,
+                                       cancel=cancel_event)
+            if journal is not None:
+                journal.close(completed=not cancel_event.is_set())
+        report_results(results)
+        log_summary(results)
+        completed = not cancel_event.is_set()
     except Exception as e:
         # 捕获任何未预料的全局错误
         log_message(f"任务 '{task_name}' 发生严重错误: {e}")
@@ -42,65 +190,168 @@ def run_processing_thread2(paths, entry_point_func, task_name):
         log_message("="*20)
         log_message(f"任务 '{task_name}' 处理结束。")
         log_message("="*20)
-        button1.config(state=tk.NORMAL)
-        button2.config(state=tk.NORMAL)
-        button3.config(state=tk.NORMAL)
+        ui_queue.put(("finished", completed))
         
+def start_paths():
+    """返回拖入的原始路径（处理时重新扫描，与列表中展开的结果一致），列表为空时返回 None"""
+    if not file_model.roots:
+        log_message("文件列表为空，请先拖入文件或文件夹。")
+        return None
+    file_model.reset_statuses()
+    file_list.refresh()
+    return list(file_model.roots)
+
 def button1_action():
-    file_paths = file_listbox.get(0, tk.END)
+    file_paths = start_paths()
     if not file_paths:
-        log_message("文件列表为空，请先拖入文件或文件夹。")
         return
     button1.config(state=tk.DISABLED)#阻塞时禁用按钮
     button2.config(state=tk.DISABLED)
     button3.config(state=tk.DISABLED)
+    cancel_button.config(state=tk.NORMAL)
+    reset_progress()
     log_message("="*20)
     log_message("任务已开始，处理中请稍候...")
     log_message("="*20)
     #创建并启动一个后台线程来执行 process_entry_point
-    thread = threading.Thread(
-        target=run_processing_thread, 
-        args=(file_paths,)
-    )
-    thread.daemon = True  # 设置为守护线程，主窗口关闭时线程也会退出
-    thread.start()
+    start_worker(target=run_processing_thread, args=(file_paths, current_options()))
 
 def button2_action():
-    file_paths = file_listbox.get(0, tk.END)
+    file_paths = start_paths()
     if not file_paths:
-        log_message("文件列表为空，请先拖入文件或文件夹。")
         return
     button1.config(state=tk.DISABLED)#阻塞时禁用按钮
     button2.config(state=tk.DISABLED)
     button3.config(state=tk.DISABLED)
+    cancel_button.config(state=tk.NORMAL)
+    reset_progress()
     log_message("="*20)
     log_message("【删除白页】任务已开始...")
     log_message("="*20)
-    thread = threading.Thread(
-        target=run_processing_thread2, 
-        args=(file_paths, remove_white_pages_entry_point, "【删除白页】")
-    )
-    thread.daemon = True
-    thread.start()
+    start_worker(target=run_processing_thread2,
+                 args=(file_paths, remove_white_pages_entry_point, "【删除白页】", "remove", current_options()))
     
+def start_worker(target, args):
+    global worker_thread
+    cancel_event.clear()
+    # 守护线程：正常关闭窗口时会先请求取消并等待，见 on_close
+    worker_thread = threading.Thread(target=target, args=args, daemon=True)
+    worker_thread.start()
+
+def cancel_action():
+    if worker_thread is not None and worker_thread.is_alive() and not cancel_event.is_set():
+        cancel_event.set()
+        cancel_button.config(state=tk.DISABLED)
+        log_message("正在取消: 等待当前压缩包处理完成...")
+
+def on_close():
+    # 有任务在运行时先取消并等它做完当前压缩包，避免压缩包写到一半被强行终止
+    if worker_thread is not None and worker_thread.is_alive():
+        cancel_action()
+        root.after(LOG_POLL_INTERVAL_MS, on_close)
+        return
+    root.destroy()
+
 def button3_action():
+    global expand_cancel
     log_message("正在清空文件列表")
-    file_listbox.delete(0, tk.END)
+    expand_cancel.set()
+    expand_cancel = threading.Event()
+    file_model.clear()
+    file_list.top = 0
+    file_list.refresh()
     log_message("文件列表已清空。")
     
+def log_summary(results):
+    counts = summarize_results(results)
+    log_message(f"统计: 已处理 {counts['processed']} 个, 跳过 {counts['skipped']} 个, 失败 {counts['failed']} 个。")
+
 def log_message(message):
-    """向底部的日志文本框中添加一条消息"""
+    """向日志队列添加一条消息，可以在任意线程中调用"""
+    ui_queue.put(("log", message))
+
+def report_progress(done, total, result):
+    ui_queue.put(("progress", done, total, result.status, result.path))
+
+def reset_progress():
+    progress_counts.update(processed=0, skipped=0, failed=0)
+    progress_bar.config(mode='determinate', value=0, maximum=1)
+    progress_label.config(text="")
+
+def drain_ui_queue():
+    """在主线程中批量取出队列记录，一次性写入日志框并刷新进度"""
+    lines = []
+    finished = False
+    list_changed = False
+    follow = file_list.is_at_end()
     try:
-        log_text.config(state=tk.NORMAL)  
-        log_text.insert(tk.END, message + "\n")
-        log_text.config(state=tk.DISABLED) # 重新锁定，设为只读
-        log_text.yview_moveto(1.0) # log_text文本框滚动，0为顶部、1为底部
-        root.update_idletasks()  # 强制更新UI
-    except Exception as e:
-        print(f"日志输出错误: {e}")
+        for _ in range(LOG_BATCH_LIMIT):
+            record = ui_queue.get_nowait()
+            if record[0] == "log":
+                lines.append(record[1])
+            elif record[0] == "files":
+                _, token, batch = record
+                if token is expand_cancel:
+                    for zip_path in batch:
+                        file_model.add(zip_path)
+                    list_changed = True
+            elif record[0] == "expanded":
+                _, token, total = record
+                if token is expand_cancel:
+                    lines.append(f"展开完成: 找到 {total} 个压缩包，列表中共 {len(file_model)} 个（重复的只保留一个）。")
+            elif record[0] == "statuses":
+                for path, status in record[1]:
+                    file_model.set_status(path, status)
+                list_changed = True
+            elif record[0] == "progress":
+                _, done, total, status, path = record
+                file_model.set_status(path, status)
+                list_changed = True
+                progress_counts[status] = progress_counts.get(status, 0) + 1
+                if total is None:
+                    # 流水线模式下总数未知，进度条只表示仍在运行
+                    progress_bar.config(mode='indeterminate')
+                    progress_bar.step()
+                else:
+                    progress_bar.config(mode='determinate', maximum=max(total, 1), value=done)
+                progress_label.config(text=f"{done}{'' if total is None else f'/{total}'}  已处理 {progress_counts['processed']}  "
+                                           f"跳过 {progress_counts['skipped']}  失败 {progress_counts['failed']}")
+            elif record[0] == "finished":
+                finished = True
+                if record[1]:
+                    # 正常结束后仍为等待的行是去重时被判定为重复的压缩包；
+                    # 取消或出错时没有处理到的行保持等待，不能当作跳过
+                    file_model.mark_pending_as(STATUS_SKIPPED)
+                    list_changed = True
+    except queue.Empty:
+        pass
+
+    if list_changed:
+        if follow:
+            file_list.scroll_to_end()
+        file_list.refresh()
+
+    if lines:
+        try:
+            log_text.config(state=tk.NORMAL)
+            log_text.insert(tk.END, "\n".join(lines) + "\n")
+            line_count = int(log_text.index('end-1c').split('.')[0])
+            if line_count > MAX_LOG_LINES:
+                log_text.delete('1.0', f"{line_count - MAX_LOG_LINES}.0")
+            log_text.config(state=tk.DISABLED) # 重新锁定，设为只读
+            log_text.yview_moveto(1.0) # log_text文本框滚动，0为顶部、1为底部
+        except Exception as e:
+            print(f"日志输出错误: {e}")
+    if finished:
+        button1.config(state=tk.NORMAL)
+        button2.config(state=tk.NORMAL)
+        button3.config(state=tk.NORMAL)
+        cancel_button.config(state=tk.DISABLED)
+    root.after(LOG_POLL_INTERVAL_MS, drain_ui_queue)
 
 # 主程序
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包成exe后子进程需要
     root = TkinterDnD.Tk()
     root.title("跨页修正")
     root.geometry("600x480")
@@ -130,13 +381,8 @@ if __name__ == "__main__":
     file_list_frame = ttk.LabelFrame(top_frame, text=" 已选中的文件 ", padding=5)
     file_list_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
     
-    #滚动条
-    list_scrollbar = ttk.Scrollbar(file_list_frame, orient=tk.VERTICAL)
-    #列表框
-    file_listbox = tk.Listbox(file_list_frame, yscrollcommand=list_scrollbar.set, selectmode=tk.EXTENDED)
-    list_scrollbar.config(command=file_listbox.yview)
-    list_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-    file_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    #虚拟列表：只绘制可见行
+    file_list = VirtualFileList(file_list_frame, file_model)
     
     #按钮框架
     middle_frame = ttk.Frame(root, padding=(10, 0, 10, 0))
@@ -155,6 +401,26 @@ if __name__ == "__main__":
     button2.pack(side=tk.LEFT, padx=5)
     button3 = ttk.Button(button_container, text="清空文件列表", command=button3_action)
     button3.pack(side=tk.LEFT, padx=5)
+    cancel_button = ttk.Button(button_container, text="取消", command=cancel_action, state=tk.DISABLED)
+    cancel_button.pack(side=tk.LEFT, padx=5)
+    
+    #处理选项，默认全部关闭，即逐个顺序处理、不读写缓存和进度日志
+    option_frame = ttk.Frame(root, padding=(10, 0, 10, 0))
+    option_frame.pack(side=tk.TOP, fill=tk.X)
+    parallel_var = tk.BooleanVar(value=False)
+    pipeline_var = tk.BooleanVar(value=False)
+    cache_var = tk.BooleanVar(value=False)
+    journal_var = tk.BooleanVar(value=False)
+    for text, var in ((f"多进程({WORKER_COUNT})", parallel_var), ("边查找边处理", pipeline_var),
+                      ("缓存结果", cache_var), ("断点续接", journal_var)):
+        ttk.Checkbutton(option_frame, text=text, variable=var).pack(side=tk.LEFT, padx=(0, 10))
+    
+    #进度条与计数
+    progress_counts = {"processed": 0, "skipped": 0, "failed": 0}
+    progress_bar = ttk.Progressbar(middle_frame, orient='horizontal', mode='determinate', length=160)
+    progress_bar.pack(side=tk.LEFT, padx=(0, 5))
+    progress_label = ttk.Label(middle_frame, text="")
+    progress_label.pack(side=tk.LEFT)
     
     #底部框架
     bottom_frame = ttk.LabelFrame(root)
@@ -169,4 +435,6 @@ if __name__ == "__main__":
     log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
     log_message("程序已启动，等待操作。")
+    root.protocol("WM_DELETE_WINDOW", on_close)
+    root.after(LOG_POLL_INTERVAL_MS, drain_ui_queue)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,326 @@
+"""插入/删除扉页的性能基准。
+
+生成可复现的合成漫画书库，分阶段计时（查找、哈希去重、计划、改写），记录峰值内存，
+并可与保存的基准 JSON 比较：
+
+    python test/benchmark.py --archives 200 --pages 40 --save-baseline bench.json
+    python test/benchmark.py --archives 200 --pages 40 --baseline bench.json
+
+--latency-ms 给每次读取压缩包加上固定延迟，在本地模拟网络共享盘，用来比较 --prefetch 的效果：
+
+    python test/benchmark.py --latency-ms 20
+    python test/benchmark.py --latency-ms 20 --prefetch 8
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import builtins
+import tempfile
+import contextlib
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ZipWriteLogic import process_entry_point
+from ZipDeleteLogic import remove_white_pages_entry_point
+from ZipPlanner import plan_entry_point
+from BatchExecutor import summarize_results
+import CentralDirectory
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FIXED_DATE = (2020, 1, 1, 0, 0, 0)
+# 不同编码下的目录名和页面名，GBK/Shift-JIS 压缩包不设置 UTF-8 标志
+NAME_TEMPLATES = {
+    'utf-8': ('卷{0}', '第{0}页'),
+    'gbk': ('卷{0}', '第{0}页'),
+    'shift-jis': ('巻{0}', 'ページ{0}'),
+}
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'BMP': '.bmp'}
+# 入口函数日志里的步骤标记 -> 阶段名
+INSERT_PHASES = {"步骤 1/4": "scan", "步骤 2/4": "hash", "步骤 3/4": "rewrite", "步骤 4/4": None}
+REMOVE_PHASES = {"步骤 1/3": "scan", "步骤 2/3": "hash", "步骤 3/3": "rewrite"}
+# 变慢不足这个秒数的阶段不算退化，避免极短阶段的计时抖动
+MIN_REGRESSION_SECONDS = 0.05
+
+class _EncodedNameInfo(zipfile.ZipInfo):
+    """按指定编码写入文件名，模拟非 UTF-8 压缩包"""
+    encoding = 'utf-8'
+
+    def _encodeFilenameFlags(self):
+        try:
+            return self.filename.encode('ascii'), self.flag_bits
+        except UnicodeEncodeError:
+            if self.encoding == 'utf-8':
+                return self.filename.encode('utf-8'), self.flag_bits | 0x800
+            return self.filename.encode(self.encoding), self.flag_bits & ~0x800
+
+def _make_page(rng, size, image_format):
+    image = Image.new('RGB', size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(8):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle([x, y, x + rng.randrange(1, size[0] // 2 + 2), y + rng.randrange(1, size[1] // 2 + 2)],
+                       fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def make_archive(path, rng, pages, page_size, image_format, depth, encoding):
+    dir_template, page_template = NAME_TEMPLATES[encoding]
+    folder = '/'.join(dir_template.format(level + 1) for level in range(depth))
+    ext = FORMAT_EXTENSIONS[image_format]
+    info_class = type('_Info', (_EncodedNameInfo,), {'encoding': encoding})
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zout:
+        zout.writestr(info_class('readme.txt', FIXED_DATE), 'synthetic')
+        for page in range(1, pages + 1):
+            name = f"{folder}/{page_template.format(page)}{ext}" if folder else f"{page_template.format(page)}{ext}"
+            info = info_class(name, FIXED_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zout.writestr(info, _make_page(rng, page_size, image_format))
+
+def make_library(root, archives=20, pages=20, page_size=(800, 1200), image_format='JPEG', depth=2,
+                 encodings=('utf-8',), duplicates=0, seed=0):
+    """生成合成书库，相同参数和 seed 生成的文件逐字节相同；返回生成的压缩包路径列表"""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(archives):
+        series_dir = os.path.join(root, f"series{i % 10:02d}")
+        os.makedirs(series_dir, exist_ok=True)
+        path = os.path.join(series_dir, f"volume{i:05d}.zip")
+        make_archive(path, rng, pages, page_size, image_format, depth, encodings[i % len(encodings)])
+        paths.append(path)
+    if duplicates:
+        duplicate_dir = os.path.join(root, "duplicates")
+        os.makedirs(duplicate_dir, exist_ok=True)
+        for i in range(duplicates):
+            source = paths[i % len(paths)]
+            shutil.copyfile(source, os.path.join(duplicate_dir, f"copy{i:05d}.zip"))
+    return paths
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1 if sys.platform == 'darwin' else 1024  # Linux 以 KB 为单位
+    return max(own, children) * scale
+
+class PhaseTimer:
+    """作为入口函数的 logger 使用，遇到步骤标记时切换阶段并累计耗时"""
+
+    def __init__(self, phases, prefix):
+        self.phases = phases
+        self.prefix = prefix
+        self.timings = {}
+        self.current = None
+        self.started = None
+
+    def _switch(self, phase):
+        now = time.perf_counter()
+        if self.current is not None:
+            key = f"{self.prefix}.{self.current}"
+            self.timings[key] = self.timings.get(key, 0.0) + now - self.started
+        self.current, self.started = phase, now
+
+    def __call__(self, message):
+        for marker, phase in self.phases.items():
+            if message.lstrip().startswith(marker):
+                self._switch(phase)
+                break
+
+    def stop(self):
+        self._switch(None)
+        return self.timings
+
+class _LatencyRaw(io.RawIOBase):
+    """每次底层读取都先等待 delay 秒，相当于网络文件系统上的一次往返"""
+
+    def __init__(self, raw, delay):
+        self.raw = raw
+        self.delay = delay
+        self.name = raw.name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        time.sleep(self.delay)
+        return self.raw.readinto(buffer)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.raw.seek(offset, whence)
+
+    def tell(self):
+        return self.raw.tell()
+
+    def fileno(self):
+        return self.raw.fileno()
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+def _is_zip_path(file):
+    return isinstance(file, (str, os.PathLike)) and os.fspath(file).lower().endswith('.zip')
+
+@contextlib.contextmanager
+def simulated_latency(delay):
+    """以只读方式打开 .zip、读取、stat 以及 mmap 中央目录时各加一次往返延迟；写入（临时文件）不受影响。
+
+    多进程(--jobs > 1)时依赖 fork 继承这些替换，只在 Linux 上有效。
+    """
+    if not delay:
+        yield
+        return
+    real_open, real_stat, real_map_region = io.open, os.stat, CentralDirectory._map_region
+
+    def latency_open(file, mode='r', *args, **kwargs):
+        if mode != 'rb' or args or kwargs or not _is_zip_path(file):
+            return real_open(file, mode, *args, **kwargs)
+        time.sleep(delay)
+        return io.BufferedReader(_LatencyRaw(real_open(file, 'rb', buffering=0), delay))
+
+    def latency_stat(path, *args, **kwargs):
+        if _is_zip_path(path):
+            time.sleep(delay)
+        return real_stat(path, *args, **kwargs)
+
+    def latency_map_region(*args):
+        # 映射本身不产生往返，按缺页时读取一次文件末尾计
+        time.sleep(delay)
+        return real_map_region(*args)
+
+    builtins.open = io.open = latency_open
+    os.stat = latency_stat
+    CentralDirectory._map_region = latency_map_region
+    try:
+        yield
+    finally:
+        builtins.open = io.open = real_open
+        os.stat = real_stat
+        CentralDirectory._map_region = real_map_region
+
+def run_once(library_root, jobs, prefetch=0):
+    timings, results = {}, {}
+
+    start = time.perf_counter()
+    plan = plan_entry_point([library_root], logger=lambda message: None, operation="insert")
+    timings["insert.plan"] = time.perf_counter() - start
+
+    timer = PhaseTimer(INSERT_PHASES, "insert")
+    results["insert"] = summarize_results(process_entry_point([library_root], logger=timer, jobs=jobs,
+                                                              prefetch=prefetch))
+    timings.update(timer.stop())
+
+    start = time.perf_counter()
+    plan_entry_point([library_root], logger=lambda message: None, operation="remove")
+    timings["remove.plan"] = time.perf_counter() - start
+
+    timer = PhaseTimer(REMOVE_PHASES, "remove")
+    results["remove"] = summarize_results(remove_white_pages_entry_point([library_root], logger=timer, jobs=jobs,
+                                                                         prefetch=prefetch))
+    timings.update(timer.stop())
+
+    results["planned"] = len(plan)
+    return timings, results
+
+def run_benchmark(config, repeat=3, jobs=1, work_dir=None, prefetch=0, latency_ms=0):
+    """每轮都重新生成书库（插入/删除会改写文件），各阶段取多轮中的最小值。
+
+    latency_ms 不为 0 时，处理阶段在 simulated_latency 下运行（生成书库不受影响）。
+    """
+    best, results = {}, None
+    for _ in range(repeat):
+        library_root = tempfile.mkdtemp(prefix="crossfix-bench-", dir=work_dir)
+        try:
+            make_library(library_root, **config)
+            with simulated_latency(latency_ms / 1000):
+                timings, results = run_once(library_root, jobs, prefetch)
+        finally:
+            shutil.rmtree(library_root, ignore_errors=True)
+        for phase, seconds in timings.items():
+            best[phase] = min(seconds, best.get(phase, seconds))
+    return {"config": config, "jobs": jobs, "prefetch": prefetch, "latency_ms": latency_ms, "timings": best, "results": results, "peak_rss": peak_rss_bytes()}
+
+def compare_with_baseline(report, baseline, tolerance):
+    """返回 (是否通过, 输出行列表)。结果统计必须一致；任一阶段比基准慢 tolerance 倍以上视为退化"""
+    lines, ok = [], True
+    if report["results"] != baseline["results"]:
+        ok = False
+        lines.append(f"结果不一致: 基准 {baseline['results']}，本次 {report['results']}")
+    for phase in sorted(set(report["timings"]) | set(baseline["timings"])):
+        old, new = baseline["timings"].get(phase), report["timings"].get(phase)
+        if old is None or new is None:
+            lines.append(f"{phase:<16} {'-' if old is None else f'{old:.3f}s':>10} {'-' if new is None else f'{new:.3f}s':>10}")
+            continue
+        ratio = new / old if old > 0 else 1.0
+        flag = ""
+        if ratio > tolerance and new - old > MIN_REGRESSION_SECONDS:
+            ok = False
+            flag = "  <-- 变慢"
+        lines.append(f"{phase:<16} {old:>9.3f}s {new:>9.3f}s {ratio:>7.2f}x{flag}")
+    return ok, lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="插入/删除扉页的性能基准")
+    parser.add_argument("--archives", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-size", default="800x1200", help="页面尺寸，宽x高")
+    parser.add_argument("--format", choices=sorted(FORMAT_EXTENSIONS), default="JPEG")
+    parser.add_argument("--depth", type=int, default=2, help="图片所在目录的嵌套层数")
+    parser.add_argument("--encodings", default="utf-8,gbk,shift-jis", help="文件名编码，按压缩包轮换")
+    parser.add_argument("--duplicates", type=int, default=2, help="额外复制的重复压缩包数量")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0, help="给每次读取压缩包加上的延迟，模拟网络共享盘")
+    parser.add_argument("--prefetch", type=int, default=0, help="后台预读的压缩包数，0 表示不预读")
+    parser.add_argument("--work-dir", help="生成书库的位置，默认系统临时目录")
+    parser.add_argument("--baseline", help="与此基准 JSON 比较，退化时返回 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基准 JSON")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="允许的最大变慢倍数")
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.page_size.lower().split("x"))
+    config = {"archives": args.archives, "pages": args.pages, "page_size": [width, height],
+              "image_format": args.format, "depth": args.depth,
+              "encodings": args.encodings.split(","), "duplicates": args.duplicates, "seed": args.seed}
+    report = run_benchmark(config, repeat=args.repeat, jobs=args.jobs, work_dir=args.work_dir,
+                           prefetch=args.prefetch, latency_ms=args.latency_ms)
+
+    for phase, seconds in sorted(report["timings"].items()):
+        print(f"{phase:<16} {seconds:>9.3f}s")
+    print(f"结果: {report['results']}")
+    if report["peak_rss"] is not None:
+        print(f"峰值内存: {report['peak_rss'] / (1024 * 1024):.1f} MB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline["config"] != report["config"] or baseline.get("latency_ms", 0) != report["latency_ms"]:
+            print("警告: 基准与本次的书库参数不同，比较结果仅供参考。")
+        ok, lines = compare_with_baseline(report, baseline, args.tolerance)
+        print(f"\n{'阶段':<14} {'基准':>10} {'本次':>10} {'倍数':>8}")
+        for line in lines:
+            print(line)
+        return 0 if ok else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_page(color, size=(60, 90), image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def entry_list(zip_path):
+    """(文件名, 大小, CRC) 列表，并确认每个条目都能完整解压"""
+    with zipfile.ZipFile(zip_path) as z:
+        assert z.testzip() is None
+        return [(info.filename, info.file_size, info.CRC) for info in z.infolist()]
+
+@pytest.fixture
+def comic_zip(tmp_path):
+    """一本需要插入扉页的压缩包：book/ 下三张 JPEG"""
+    path = tmp_path / "comic.zip"
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('readme.txt', 'comic')
+        for i, color in enumerate([(200, 30, 30), (30, 200, 30), (30, 30, 200)], 1):
+            z.writestr(f'book/{i:03d}.jpg', make_page(color))
+    return str(path)
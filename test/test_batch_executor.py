@@ -0,0 +1,59 @@
+import os
+import time
+
+import pytest
+
+from BatchExecutor import run_batch, ZipResult, STATUS_PROCESSED, STATUS_FAILED
+
+# 工作函数要在子进程中按名字导入，必须定义在模块顶层
+
+def slow_first(zip_path, logger=print):
+    # 排在前面的压缩包最慢，完成顺序与输入顺序相反
+    index = int(os.path.basename(zip_path).split('.')[0])
+    for step in range(3):
+        logger(f"{index}: {step}")
+        time.sleep(0.02 * (5 - index))
+    return ZipResult(zip_path, STATUS_PROCESSED, f"done {index}")
+
+def fail_on_odd(zip_path, logger=print):
+    index = int(os.path.basename(zip_path).split('.')[0])
+    logger(f"{index}: start")
+    if index % 2:
+        raise RuntimeError(f"boom {index}")
+    return ZipResult(zip_path, STATUS_PROCESSED, "ok")
+
+@pytest.fixture
+def archives(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"{i}.zip"
+        path.write_bytes(b'')
+        paths.append(str(path))
+    return paths
+
+def test_results_in_input_order(archives):
+    progress = []
+    results = run_batch(slow_first, archives, logger=lambda m: None, jobs=3, device_limit=5,
+                        progress=lambda done, total, result: progress.append((done, total, result.path)))
+    assert results == [ZipResult(p, STATUS_PROCESSED, f"done {i}") for i, p in enumerate(archives)]
+    assert [(done, total) for done, total, _ in progress] == [(i, 5) for i in range(1, 6)]
+    assert sorted(path for _, _, path in progress) == sorted(archives)
+    # 完成顺序确实被打乱了
+    assert [path for _, _, path in progress] != archives
+
+def test_worker_logs_are_grouped_per_archive(archives):
+    lines = []
+    run_batch(slow_first, archives, logger=lines.append, jobs=5, device_limit=5, header="处理")
+    headers = [i for i, line in enumerate(lines) if line.startswith("\n--- (")]
+    assert [lines[i] for i in headers] == [f"\n--- ({n}/5) 处理 ---" for n in range(1, 6)]
+    for i in headers:
+        group = lines[i + 1:i + 4]
+        index = group[0].split(':')[0]
+        assert group == [f"{index}: {step}" for step in range(3)]
+
+def test_worker_exception_becomes_failed_result(archives):
+    lines = []
+    results = run_batch(fail_on_odd, archives, logger=lines.append, jobs=2, device_limit=5)
+    assert [r.status for r in results] == [STATUS_PROCESSED, STATUS_FAILED] * 2 + [STATUS_PROCESSED]
+    assert results[1] == ZipResult(archives[1], STATUS_FAILED, "error")
+    assert any("boom 3" in line for line in lines)
@@ -0,0 +1,97 @@
+import os
+import zipfile
+
+from CentralDirectory import read_central_directory, parse_central_directory
+
+def write_sample(path, comment=b'', prefix=b''):
+    with open(path, 'wb') as f:
+        f.write(prefix)
+        with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.writestr('book/', '')
+            z.writestr('book/001.jpg', b'\xff' * 5000)
+            z.writestr('book/002.jpg', b'page' * 300)
+            z.writestr(zipfile.ZipInfo('stored.txt'), 'stored', zipfile.ZIP_STORED)
+            z.writestr('第一卷/说明.txt', '中文名')
+            z.comment = comment
+
+def fields(info):
+    return (info.filename, info.flag_bits, info.compress_type, info.CRC, info.compress_size,
+            info.file_size, info.header_offset, info.is_dir())
+
+def assert_same_as_zipfile(path, reference=None):
+    """CentralDirectory 与 zipfile.ZipFile（默认读取同一文件）得到相同的条目和中央目录偏移"""
+    with zipfile.ZipFile(reference or path) as z:
+        expected = [fields(info) for info in z.infolist()]
+        expected_start = z.start_dir
+    directory = read_central_directory(path)
+    assert [fields(entry) for entry in directory.infolist()] == expected
+    assert directory.start_dir == expected_start
+    with open(path, 'rb') as f:
+        data = f.read()
+    parsed = parse_central_directory(data, 0, len(data))
+    assert [fields(entry) for entry in parsed.infolist()] == expected
+    return directory
+
+def test_plain_archive(tmp_path):
+    path = str(tmp_path / "plain.zip")
+    write_sample(path)
+    assert_same_as_zipfile(path)
+
+def test_zip64_records(tmp_path, monkeypatch):
+    # 调低阈值让 zipfile 写出 Zip64 扩展字段、Zip64 EOCD 和定位器，不必真的写出 4 GiB 的文件
+    path = str(tmp_path / "zip64.zip")
+    with monkeypatch.context() as m:
+        m.setattr(zipfile, 'ZIP64_LIMIT', 100)
+        m.setattr(zipfile, 'ZIP_FILECOUNT_LIMIT', 2)
+        write_sample(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert b'PK\x06\x06' in data and b'PK\x06\x07' in data
+    directory = assert_same_as_zipfile(path)
+    assert max(directory.header_offsets) > 100
+
+def test_prepended_data(tmp_path):
+    path = str(tmp_path / "sfx.zip")
+    write_sample(path, prefix=b'MZ' + b'\x00' * 4094)
+    directory = assert_same_as_zipfile(path)
+    assert min(directory.header_offsets) == 4096
+
+def test_prepended_data_with_zip64(tmp_path, monkeypatch):
+    path = str(tmp_path / "sfx64.zip")
+    with monkeypatch.context() as m:
+        m.setattr(zipfile, 'ZIP_FILECOUNT_LIMIT', 2)
+        write_sample(path, prefix=b'#!/bin/sh\n' * 100)
+    assert_same_as_zipfile(path)
+
+def test_comment_containing_eocd_signature(tmp_path):
+    # zipfile 取最后一个签名，会把注释里的签名当成 EOCD 而无法打开，
+    # 这里与不带该注释的同一压缩包比较
+    reference = str(tmp_path / "reference.zip")
+    write_sample(reference, comment=b'plain comment')
+    for comment in (b'see PK\x05\x06 in the middle of a comment',
+                    b'PK\x05\x06' + b'\x00' * 16 + b'\xff\xff',
+                    b'tail PK\x05\x06'):
+        path = str(tmp_path / "comment.zip")
+        write_sample(path, comment=comment)
+        assert_same_as_zipfile(path, reference)
+
+def test_name_with_nul_is_truncated(tmp_path):
+    path = str(tmp_path / "nul.zip")
+    write_sample(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data.replace(b'stored.txt', b'stored\x00txt'))
+    directory = assert_same_as_zipfile(path)
+    assert 'stored' in [entry.filename for entry in directory.infolist()]
+
+def test_backslash_separator_on_windows(tmp_path, monkeypatch):
+    # Windows 上 zipfile 把文件名中的 os.sep 换成 '/'，目录层级和分组依赖这一点
+    path = str(tmp_path / "backslash.zip")
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('book\\001.jpg', 'a')
+        z.writestr('book\\sub\\', '')
+    monkeypatch.setattr(os, 'sep', '\\')
+    directory = assert_same_as_zipfile(path)
+    assert [entry.filename for entry in directory.infolist()] == ['book/001.jpg', 'book/sub/']
+    assert directory.infolist()[1].is_dir()
@@ -0,0 +1,80 @@
+import json
+import shutil
+import signal
+
+import pytest
+
+import crossfix
+from crossfix import EXIT_OK, EXIT_FAILURES, EXIT_USAGE, EXIT_NO_ARCHIVES
+from ZipPlanner import PLAN_FIELDS
+
+@pytest.fixture(autouse=True)
+def restore_sigint():
+    # insert/remove 会安装自己的 Ctrl+C 处理函数
+    handler = signal.getsignal(signal.SIGINT)
+    yield
+    signal.signal(signal.SIGINT, handler)
+
+def run(capsys, *argv):
+    code = crossfix.main(list(argv))
+    out = capsys.readouterr().out
+    records = [json.loads(line) for line in out.splitlines()]
+    assert out == "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+    return code, records
+
+@pytest.fixture
+def library(tmp_path, comic_zip):
+    root = tmp_path / "library"
+    root.mkdir()
+    shutil.copyfile(comic_zip, root / "a.zip")
+    shutil.copyfile(comic_zip, root / "b.zip")
+    return root
+
+def test_insert_ok_with_duplicate(capsys, library):
+    code, records = run(capsys, "insert", str(library), "--no-cache", "-j", "1", "-q")
+    assert code == EXIT_OK
+    assert all(set(r) == {"path", "status", "reason"} for r in records)
+    assert sorted((r["status"], r["reason"]) for r in records) == [("processed", "inserted"), ("skipped", "duplicate")]
+    assert sorted(r["path"] for r in records) == [str(library / "a.zip"), str(library / "b.zip")]
+
+def test_failures_exit_code(capsys, library):
+    (library / "broken.zip").write_bytes(b'not a zip file')
+    code, records = run(capsys, "remove", str(library), "--no-cache", "-j", "2", "-q")
+    assert code == EXIT_FAILURES
+    assert {"path": str(library / "broken.zip"), "status": "failed", "reason": "error"} in records
+
+def test_usage_exit_code(capsys, tmp_path):
+    assert run(capsys, "insert", "--no-cache", "-q") == (EXIT_USAGE, [])
+    empty_list = tmp_path / "empty.txt"
+    empty_list.write_text("\n", encoding='utf-8')
+    assert run(capsys, "plan", "--from-file", str(empty_list), "-q") == (EXIT_USAGE, [])
+    with pytest.raises(SystemExit) as exc_info:
+        crossfix.main(["insert", "--no-such-option"])
+    assert exc_info.value.code == EXIT_USAGE
+
+def test_no_archives_exit_code(capsys, tmp_path):
+    (tmp_path / "notes.txt").write_text("no zips here", encoding='utf-8')
+    assert run(capsys, "insert", str(tmp_path), "--no-cache", "-q") == (EXIT_NO_ARCHIVES, [])
+    assert run(capsys, "plan", str(tmp_path), "-q") == (EXIT_NO_ARCHIVES, [])
+
+def test_plan_stdout_records(capsys, library):
+    code, records = run(capsys, "plan", str(library), "--dedup", "-q")
+    assert code == EXIT_OK
+    assert all(list(r) == PLAN_FIELDS for r in records)
+    assert sorted(r["action"] for r in records) == ["modify", "skip"]
+
+@pytest.mark.parametrize("plan_name", ["plan.json", "plan.csv"])
+def test_plan_output_feeds_from_file(capsys, library, tmp_path, plan_name):
+    done = library / "c_done.zip"
+    shutil.copyfile(library / "a.zip", done)
+    assert run(capsys, "insert", str(done), "--no-cache", "-j", "1", "-q")[0] == EXIT_OK
+    (library / "d_broken.zip").write_bytes(b'not a zip file')
+
+    plan_path = str(tmp_path / plan_name)
+    code, records = run(capsys, "plan", str(library), "--dedup", "-o", plan_path, "-q")
+    assert (code, records) == (EXIT_FAILURES, [])
+
+    # 计划中只有需要修改的压缩包会被处理
+    code, records = run(capsys, "insert", "--from-file", plan_path, "--no-cache", "-j", "1", "-q")
+    assert code == EXIT_OK
+    assert records == [{"path": str(library / "a.zip"), "status": "processed", "reason": "inserted"}]
@@ -0,0 +1,127 @@
+import os
+import hashlib
+import random
+import shutil
+import zipfile
+
+import pytest
+
+import ZipWriteLogic
+from BatchExecutor import ZipResult, STATUS_SKIPPED, DUPLICATE_REASON
+from ZipDeleteLogic import remove_white_pages_entry_point
+from ZipWriteLogic import deduplicate_files_by_hash, process_entry_point, IncrementalDeduplicator, PARTIAL_HASH_SIZE
+
+def quiet(message):
+    pass
+
+def test_hash_failures_are_not_reported_as_duplicates(tmp_path, monkeypatch):
+    a, b, c = (str(tmp_path / name) for name in ("a.zip", "b.zip", "c.zip"))
+    with open(a, 'wb') as f:
+        f.write(b'A' * 1000)
+    shutil.copyfile(a, b)
+    with open(c, 'wb') as f:
+        f.write(b'C' * 1000)
+
+    real_partial = ZipWriteLogic._hash_file_partial
+    def failing_partial(file_path):
+        if file_path == c:
+            raise PermissionError(13, "Permission denied")
+        return real_partial(file_path)
+    monkeypatch.setattr(ZipWriteLogic, "_hash_file_partial", failing_partial)
+
+    duplicates = []
+    unique = deduplicate_files_by_hash([a, b, c], logger=quiet, jobs=1, on_duplicate=duplicates.append)
+    assert unique == [a]
+    # c 读取失败，既不保留也不算重复，续接时会重试
+    assert duplicates == [b]
+
+def full_hash_reference(file_paths):
+    # 逐个计算完整 SHA-256，每组内容相同的文件保留输入顺序中的第一个
+    unique = {}
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            unique.setdefault(hashlib.sha256(f.read()).hexdigest(), file_path)
+    return list(unique.values())
+
+def write_variants(tmp_path, prefix, base, changes):
+    """写出 base 以及每个 {偏移: 新字节} 改动后的副本，返回路径列表；改动为空时得到完全相同的副本"""
+    paths = []
+    for i, change in enumerate(changes):
+        data = bytearray(base)
+        for offset, value in change.items():
+            data[offset] = value
+        path = str(tmp_path / f"{prefix}_{i}.zip")
+        with open(path, 'wb') as f:
+            f.write(bytes(data))
+        paths.append(path)
+    return paths
+
+def corrupted_archive_copies(tmp_path):
+    # 存储条目中间的数据被改动：文件头、文件尾和中央目录（含 CRC）都与原件相同
+    path = str(tmp_path / "archive_src.zip")
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as z:
+        z.writestr('book/001.jpg', random.Random(7).randbytes(5 * PARTIAL_HASH_SIZE))
+    with open(path, 'rb') as f:
+        base = f.read()
+    middle = len(base) // 2
+    return write_variants(tmp_path, "archive", base, [{}, {middle: base[middle] ^ 0xFF}, {}])
+
+def test_sampled_hash_matches_full_hash(tmp_path):
+    rng = random.Random(0)
+    paths = []
+    # 头尾相同、只有中间不同的大文件
+    big = rng.randbytes(4 * PARTIAL_HASH_SIZE)
+    middle = len(big) // 2
+    paths += write_variants(tmp_path, "middle", big, [{}, {middle: big[middle] ^ 1}, {}, {middle + 1: 0}])
+    # 头尾之间只剩一个字节没有被采样
+    gap = rng.randbytes(2 * PARTIAL_HASH_SIZE + 1)
+    paths += write_variants(tmp_path, "gap", gap, [{}, {PARTIAL_HASH_SIZE: gap[PARTIAL_HASH_SIZE] ^ 1}, {}])
+    # 比采样大小还小的文件，头尾采样互相重叠
+    for size in (1, 100, PARTIAL_HASH_SIZE - 1, PARTIAL_HASH_SIZE + 100):
+        small = rng.randbytes(size)
+        paths += write_variants(tmp_path, f"small{size}", small, [{}, {size - 1: small[size - 1] ^ 1}, {}])
+    paths += corrupted_archive_copies(tmp_path)
+    random.Random(1).shuffle(paths)
+
+    expected = full_hash_reference(paths)
+    for jobs in (1, 4):
+        duplicates = []
+        unique = deduplicate_files_by_hash(paths, logger=quiet, jobs=jobs, on_duplicate=duplicates.append)
+        assert unique == expected
+        assert sorted(duplicates) == sorted(set(paths) - set(expected))
+    assert list(IncrementalDeduplicator(logger=quiet).filter(paths)) == expected
+
+@pytest.mark.parametrize("pipeline", [False, True])
+@pytest.mark.parametrize("operation", ["insert", "remove"])
+def test_entry_points_report_every_input(tmp_path, comic_zip, operation, pipeline):
+    library = tmp_path / "library"
+    library.mkdir()
+    for name in ("a.zip", "b_copy.zip", "c_copy.zip"):
+        shutil.copyfile(comic_zip, library / name)
+    (library / "d_other.zip").write_bytes(b'not a zip file')
+    entry_point = process_entry_point if operation == "insert" else remove_white_pages_entry_point
+    results = entry_point([str(library)], logger=quiet, pipeline=pipeline)
+    by_name = {os.path.basename(result.path): result for result in results}
+    assert sorted(by_name) == ["a.zip", "b_copy.zip", "c_copy.zip", "d_other.zip"]
+    assert len(results) == 4
+    # 三个副本中按扫描顺序保留一个，另外两个作为重复报告
+    duplicates = [name for name in ("a.zip", "b_copy.zip", "c_copy.zip")
+                  if by_name[name] == ZipResult(str(library / name), STATUS_SKIPPED, DUPLICATE_REASON)]
+    assert len(duplicates) == 2
+
+def test_incremental_dedup_after_accepted_archive_was_modified(tmp_path):
+    # 流水线中先接纳的压缩包在后来的文件到达前已被处理改写
+    original = random.Random(3).randbytes(4 * PARTIAL_HASH_SIZE)
+    middle = len(original) // 2
+    first, near_copy, true_copy = write_variants(
+        tmp_path, "pipe", original, [{}, {middle: original[middle] ^ 1}, {}])
+    duplicates = []
+    dedup = IncrementalDeduplicator(logger=quiet, on_duplicate=duplicates.append)
+    assert dedup.add(first)
+    with open(first, 'r+b') as f:
+        f.seek(middle)
+        f.write(b'processed')
+    # 大小、头尾相同而只有中间不同的文件是新内容，与原件完全相同的才是重复
+    assert dedup.add(near_copy)
+    assert not dedup.add(true_copy)
+    assert duplicates == [true_copy]
@@ -0,0 +1,147 @@
+import errno
+import os
+import random
+import zipfile
+
+import pytest
+
+import FileTransfer
+import ZipWriteLogic
+from conftest import entry_list
+from FileTransfer import copy_range
+from ZipWriteLogic import _copy_entries
+
+def fake_copy(src_fd, dst_fd, count, src_offset, dst_offset):
+    data = os.pread(src_fd, count, src_offset)
+    return os.pwrite(dst_fd, data, dst_offset)
+
+def real_copy_file_range(src_fd, dst_fd, count, src_offset, dst_offset):
+    return fake_copy(src_fd, dst_fd, count, src_offset, dst_offset)
+
+def real_sendfile(out_fd, in_fd, offset, count):
+    # sendfile 写入目标的当前位置并推进它
+    data = os.pread(in_fd, count, offset)
+    return os.write(out_fd, data)
+
+def fail_with(error):
+    def failing(*args):
+        raise OSError(error, os.strerror(error))
+    return failing
+
+def partial(func, limit):
+    # 第一次调用只复制 limit 字节，之后返回 0，模拟中途停止的内核复制
+    calls = []
+    def wrapper(*args):
+        calls.append(args)
+        if len(calls) > 1:
+            return 0
+        args = list(args)
+        count_index = 2 if func is real_copy_file_range else 3
+        args[count_index] = min(args[count_index], limit)
+        return func(*args)
+    return wrapper
+
+def fails_after(func, limit):
+    # 先复制 limit 字节，下一次调用出错
+    copied = []
+    def wrapper(*args):
+        if copied:
+            raise OSError(errno.EIO, os.strerror(errno.EIO))
+        args = list(args)
+        count_index = 2 if func is real_copy_file_range else 3
+        args[count_index] = min(args[count_index], limit)
+        copied.append(func(*args))
+        return copied[0]
+    return wrapper
+
+def fake_reflink(src_fd, src_offset, dst_fd, dst_offset, length):
+    fake_copy(src_fd, dst_fd, length, src_offset, dst_offset)
+
+unsupported_reflink = fail_with(errno.EOPNOTSUPP)
+
+# 场景名: (生成 (copy_file_range, sendfile, reflink) 的函数, copy_range 应复制多少)，None 表示平台没有该调用；
+# 每个测试重新生成，partial/fails_after 的调用计数不会跨测试残留
+SCENARIOS = {
+    "copy_file_range": (lambda: (real_copy_file_range, None, unsupported_reflink), "all"),
+    "sendfile_only": (lambda: (None, real_sendfile, unsupported_reflink), "all"),
+    "nothing_available": (lambda: (None, None, unsupported_reflink), "none"),
+    "copy_file_range_exdev": (lambda: (fail_with(errno.EXDEV), real_sendfile, unsupported_reflink), "all"),
+    "copy_file_range_enosys": (lambda: (fail_with(errno.ENOSYS), None, unsupported_reflink), "none"),
+    "copy_file_range_partial": (lambda: (partial(real_copy_file_range, 5000), None, unsupported_reflink),
+                                "partial"),
+    "copy_file_range_error_midway": (lambda: (fails_after(real_copy_file_range, 7000), None, unsupported_reflink),
+                                     "partial"),
+    "sendfile_partial": (lambda: (None, partial(real_sendfile, 3000), unsupported_reflink), "partial"),
+    "sendfile_error_midway": (lambda: (fail_with(errno.EXDEV), fails_after(real_sendfile, 9000),
+                                       unsupported_reflink), "partial"),
+    "reflink": (lambda: (real_copy_file_range, None, fake_reflink), "all"),
+    "reflink_with_sendfile": (lambda: (None, real_sendfile, fake_reflink), "all"),
+}
+
+def use_scenario(monkeypatch, name):
+    copy_file_range, sendfile, reflink = SCENARIOS[name][0]()
+    monkeypatch.setattr(FileTransfer, "_reflink_unsupported", set())
+    monkeypatch.setattr(FileTransfer, "_reflink", reflink)
+    monkeypatch.setattr(FileTransfer, "_copy_file_range_available", copy_file_range is not None)
+    monkeypatch.setattr(FileTransfer, "_sendfile_available", sendfile is not None)
+    if copy_file_range is not None:
+        monkeypatch.setattr(os, "copy_file_range", copy_file_range, raising=False)
+    if sendfile is not None:
+        monkeypatch.setattr(os, "sendfile", sendfile, raising=False)
+
+def random_bytes(size, seed):
+    return random.Random(seed).randbytes(size)
+
+@pytest.mark.parametrize("scenario", sorted(SCENARIOS))
+def test_copy_range_copies_prefix_exactly(tmp_path, monkeypatch, scenario):
+    use_scenario(monkeypatch, scenario)
+    source = random_bytes(300000, 1)
+    (tmp_path / "src").write_bytes(source)
+    with open(tmp_path / "src", 'rb') as src, open(tmp_path / "dst", 'w+b') as dst:
+        dst.write(b'x' * 4100)
+        dst.flush()
+        # 源和目标偏移相差整块，reflink 场景会走 “按字节到块边界 + 整块克隆 + 尾部” 的路径
+        copied = copy_range(src, 4100 + 8192, dst, 4100, 250000)
+        dst.seek(0)
+        result = dst.read()
+    expected = SCENARIOS[scenario][1]
+    if expected == "all":
+        assert copied == 250000
+    elif expected == "none":
+        assert copied == 0
+    else:
+        assert 0 < copied < 250000
+    # 返回值之内的字节必须已经正确写入，之后的部分交给调用方
+    assert result[:4100] == b'x' * 4100
+    assert result[4100:4100 + copied] == source[4100 + 8192:4100 + 8192 + copied]
+    if scenario == "copy_file_range_enosys":
+        assert FileTransfer._copy_file_range_available is False
+
+def write_source_archive(path):
+    # 第一个条目比各场景的部分复制量大，部分复制会停在条目中间
+    with zipfile.ZipFile(path, 'w') as z:
+        for i in range(6):
+            compress_type = zipfile.ZIP_DEFLATED if i % 2 else zipfile.ZIP_STORED
+            z.writestr(f'book/{i:03d}.jpg', random_bytes(20000 + 7919 * i, i), compress_type)
+        z.writestr('readme.txt', 'comic')
+
+def rewrite(src, dst):
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, 'w') as zout:
+        # 前半保留原名（本地头相同，连同本地头整段搬运），后半改名（重写本地头，只搬运数据）
+        entries = [(info, info.filename if i < 4 else 'renamed/' + info.filename)
+                   for i, info in enumerate(zin.infolist())]
+        for _ in _copy_entries(zin, zout, entries):
+            pass
+
+@pytest.mark.parametrize("scenario", sorted(SCENARIOS))
+def test_rewritten_archive_matches_userspace_copy(tmp_path, monkeypatch, scenario):
+    src = tmp_path / "src.zip"
+    write_source_archive(src)
+    with monkeypatch.context() as m:
+        m.setattr(ZipWriteLogic, "copy_range", lambda *args: 0)
+        rewrite(src, tmp_path / "userspace.zip")
+
+    use_scenario(monkeypatch, scenario)
+    rewrite(src, tmp_path / "kernel.zip")
+    assert (tmp_path / "kernel.zip").read_bytes() == (tmp_path / "userspace.zip").read_bytes()
+    assert len(entry_list(tmp_path / "kernel.zip")) == 7
@@ -0,0 +1,94 @@
+import io
+import zipfile
+
+import pytest
+from PIL import Image
+
+import BlankPageCache
+from BlankPageCache import get_blank_page, set_blank_page_cache_budget, clear_blank_page_cache, DEFAULT_CACHE_BUDGET
+from ImageProbe import probe_image_size, read_image_size
+from ZipDeleteLogic import is_known_blank_page
+
+def encode(size, image_format, mode='RGB', **save_options):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (120, 60, 30) if mode == 'RGB' else 7).save(buffer, format=image_format, **save_options)
+    return buffer.getvalue()
+
+def exif_jpeg(size):
+    # 较大的 APP1(EXIF) 段排在 SOF 之前
+    exif = Image.Exif()
+    exif[0x010E] = "x" * 20000
+    return encode(size, 'JPEG', exif=exif.tobytes())
+
+@pytest.mark.parametrize("data", [
+    encode((123, 45), 'JPEG'),
+    encode((640, 960), 'JPEG', progressive=True),
+    exif_jpeg((77, 33)),
+    encode((300, 17), 'PNG'),
+    encode((31, 200), 'GIF', mode='P'),
+    encode((19, 23), 'BMP'),
+], ids=["jpeg", "jpeg-progressive", "jpeg-exif", "png", "gif", "bmp"])
+def test_probe_matches_pil(data):
+    with Image.open(io.BytesIO(data)) as img:
+        expected = img.size
+    assert probe_image_size(io.BytesIO(data)) == expected
+    assert read_image_size(lambda: io.BytesIO(data)) == expected
+
+@pytest.mark.parametrize("data", [
+    encode((50, 50), 'JPEG')[:20],
+    exif_jpeg((50, 50))[:1000],
+    encode((50, 50), 'PNG')[:20],
+    encode((50, 50), 'GIF', mode='P')[:8],
+    encode((50, 50), 'BMP')[:20],
+    b'\xff',
+    b'not an image',
+], ids=["jpeg", "jpeg-exif", "png", "gif", "bmp", "one-byte", "unknown"])
+def test_truncated_or_unknown_header(data):
+    assert probe_image_size(io.BytesIO(data)) is None
+
+@pytest.fixture
+def blank_cache():
+    clear_blank_page_cache()
+    yield
+    set_blank_page_cache_budget(DEFAULT_CACHE_BUDGET)
+    clear_blank_page_cache()
+
+def page_bytes(page):
+    return len(page.data) + len(page.compressed_data)
+
+def test_blank_page_cache_evicts_least_recently_used(blank_cache):
+    sizes = [(100, 100), (100, 101), (100, 102)]
+    pages = [get_blank_page(size, 'PNG') for size in sizes]
+    clear_blank_page_cache()
+    # 只够放两页
+    set_blank_page_cache_budget(max(page_bytes(p) for p in pages) * 2)
+
+    a = get_blank_page(sizes[0], 'PNG')
+    get_blank_page(sizes[1], 'PNG')
+    assert get_blank_page(sizes[0], 'PNG') is a  # 命中后移到最近使用
+    get_blank_page(sizes[2], 'PNG')
+    assert [key[0] for key in BlankPageCache._cache] == [sizes[0], sizes[2]]
+    assert BlankPageCache._cache_bytes == sum(page_bytes(p) for p in BlankPageCache._cache.values())
+
+    set_blank_page_cache_budget(0)
+    assert len(BlankPageCache._cache) == 0
+    assert BlankPageCache._cache_bytes == 0
+
+@pytest.mark.parametrize("image_format", ['JPEG', 'PNG'])
+def test_same_size_pages_have_equal_crc_and_size(blank_cache, image_format):
+    first = get_blank_page((210, 297), image_format, compress_type=zipfile.ZIP_STORED)
+    clear_blank_page_cache()
+    second = get_blank_page((210, 297), image_format, compress_type=zipfile.ZIP_STORED)
+    assert first is not second
+    assert (first.crc, first.file_size) == (second.crc, second.file_size)
+    assert get_blank_page((210, 298), image_format, compress_type=zipfile.ZIP_STORED).crc != first.crc
+
+def test_known_blank_page_recognized_without_decoding(blank_cache, tmp_path):
+    zip_path = tmp_path / "blank.zip"
+    blank = get_blank_page((64, 80), 'JPEG', compress_type=zipfile.ZIP_STORED)
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('book/002.jpg', blank.data)
+        z.writestr('book/003.jpg', encode((64, 80), 'JPEG'))
+    with zipfile.ZipFile(zip_path) as z:
+        assert is_known_blank_page(z, z.getinfo('book/002.jpg'), '002.jpg')
+        assert not is_known_blank_page(z, z.getinfo('book/003.jpg'), '003.jpg')
@@ -0,0 +1,105 @@
+import os
+import shutil
+import zipfile
+
+import pytest
+
+import ZipWriteLogic
+from ZipWriteLogic import process_single_zip, rollback_in_place_journal, IN_PLACE_JOURNAL_SUFFIX
+from conftest import entry_list
+
+def quiet(message):
+    pass
+
+def test_failed_append_is_rolled_back_immediately(comic_zip, monkeypatch):
+    with open(comic_zip, 'rb') as f:
+        original = f.read()
+
+    def fail_midway(zout, zinfo, raw_chunks):
+        zout.fp.write(zinfo.FileHeader(False))
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(ZipWriteLogic, "_write_raw_entry", fail_midway)
+
+    result = process_single_zip(comic_zip, logger=quiet, in_place=True)
+    assert result.status == "failed"
+    with open(comic_zip, 'rb') as f:
+        assert f.read() == original
+    assert not os.path.exists(comic_zip + IN_PLACE_JOURNAL_SUFFIX)
+
+def test_interrupted_append_rolls_back(comic_zip, monkeypatch, tmp_path):
+    expected = entry_list(comic_zip)
+    crash_copy = str(tmp_path / "crash.zip")
+    real_write = ZipWriteLogic._write_raw_entry
+
+    def crash_midway(zout, zinfo, raw_chunks):
+        # 写入本地头和一半数据后"断电"：保存此刻磁盘上的压缩包和日志
+        data = b''.join(raw_chunks)
+        zout.fp.seek(zout.start_dir)
+        zout.fp.write(zinfo.FileHeader(False) + data[:len(data) // 2])
+        zout.fp.flush()
+        shutil.copyfile(comic_zip, crash_copy)
+        shutil.copyfile(comic_zip + IN_PLACE_JOURNAL_SUFFIX, crash_copy + IN_PLACE_JOURNAL_SUFFIX)
+        raise RuntimeError("simulated crash")
+    monkeypatch.setattr(ZipWriteLogic, "_write_raw_entry", crash_midway)
+    process_single_zip(comic_zip, logger=quiet, in_place=True)
+    monkeypatch.setattr(ZipWriteLogic, "_write_raw_entry", real_write)
+
+    with pytest.raises(zipfile.BadZipFile):
+        entry_list(crash_copy)
+    assert rollback_in_place_journal(crash_copy, logger=quiet)
+    assert entry_list(crash_copy) == expected
+    assert not os.path.exists(crash_copy + IN_PLACE_JOURNAL_SUFFIX)
+
+def _keep_journal(monkeypatch):
+    # 模拟 ZipFile 关闭之后、删除日志之前崩溃
+    real_remove = os.remove
+    monkeypatch.setattr(os, "remove",
+                        lambda path: None if path.endswith(IN_PLACE_JOURNAL_SUFFIX) else real_remove(path))
+    return real_remove
+
+def test_leftover_journal_after_completed_write(comic_zip, monkeypatch):
+    expected = entry_list(comic_zip)
+    real_remove = _keep_journal(monkeypatch)
+    assert process_single_zip(comic_zip, logger=quiet, in_place=True).status == "processed"
+    monkeypatch.setattr(os, "remove", real_remove)
+    assert os.path.exists(comic_zip + IN_PLACE_JOURNAL_SUFFIX)
+    assert len(entry_list(comic_zip)) == len(expected) + 1
+
+    # 写入没有提交，回滚到写入前的状态
+    assert rollback_in_place_journal(comic_zip, logger=quiet)
+    assert entry_list(comic_zip) == expected
+    assert not os.path.exists(comic_zip + IN_PLACE_JOURNAL_SUFFIX)
+
+def test_journal_after_archive_was_rewritten_elsewhere(comic_zip, monkeypatch, tmp_path):
+    real_remove = _keep_journal(monkeypatch)
+    assert process_single_zip(comic_zip, logger=quiet, in_place=True).status == "processed"
+    monkeypatch.setattr(os, "remove", real_remove)
+
+    # 其它程序（这里用 zipfile）去掉第一张图后重写了整个压缩包，日志留了下来
+    rewritten = str(tmp_path / "rewritten.zip")
+    with zipfile.ZipFile(comic_zip) as zin, zipfile.ZipFile(rewritten, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            if info.filename != 'book/001.jpg':
+                zout.writestr(info, zin.read(info))
+    os.replace(rewritten, comic_zip)
+    expected = entry_list(comic_zip)
+
+    logs = []
+    assert not rollback_in_place_journal(comic_zip, logger=logs.append)
+    assert any("已忽略" in line for line in logs)
+    assert not os.path.exists(comic_zip + IN_PLACE_JOURNAL_SUFFIX)
+    assert entry_list(comic_zip) == expected
+
+def test_removal_rolls_back_pending_journal_first(comic_zip, monkeypatch):
+    from ZipDeleteLogic import remove_white_page_from_zip
+    expected = entry_list(comic_zip)
+    real_remove = _keep_journal(monkeypatch)
+    process_single_zip(comic_zip, logger=quiet, in_place=True)
+    monkeypatch.setattr(os, "remove", real_remove)
+
+    remove_white_page_from_zip(comic_zip, logger=quiet)
+    assert not os.path.exists(comic_zip + IN_PLACE_JOURNAL_SUFFIX)
+    assert entry_list(comic_zip) == expected
+    # 之后再插入扉页也不会被过期的日志破坏
+    assert process_single_zip(comic_zip, logger=quiet).status == "processed"
+    assert len(entry_list(comic_zip)) == len(expected) + 1
@@ -0,0 +1,19 @@
+import unicodedata
+
+from Instrumentation import AggregatingSink
+
+def display_width(text):
+    return sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text)
+
+def test_summary_columns_line_up():
+    sink = AggregatingSink()
+    sink.emit({"name": "hash", "duration": 1.5, "bytes_read": 3 << 20, "archives": 3})
+    sink.emit({"name": "image_decode", "duration": 0.25})
+    sink.emit({"name": "rewrite", "duration": 12.0, "bytes_read": 900 << 20, "bytes_written": 910 << 20})
+    lines = sink.summary_lines()
+    assert len(lines) == 4
+    assert len({display_width(line) for line in lines}) == 1
+    # 每列右端在表头和数据行中位于同一显示列
+    header_ends = [display_width(lines[0][:lines[0].index(title) + len(title)]) for title in ('次数', 'MB/s', '个/s')]
+    assert header_ends == [28, 77, 86]
+    assert display_width(lines[1]) == 86
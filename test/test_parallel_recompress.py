@@ -0,0 +1,33 @@
+import threading
+import zipfile
+
+from ZipWriteLogic import _copy_entries, CompressionPolicy
+from ZipArchiveIndex import ZipArchiveIndex
+
+def _recompress(src, dst, workers):
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, 'w') as zout:
+        entries = ZipArchiveIndex.from_zipfile(zin).entries()
+        for _ in _copy_entries(zin, zout, entries, CompressionPolicy(False, 9), workers=workers):
+            pass
+
+def test_workers_do_not_open_members(tmp_path, monkeypatch):
+    src = tmp_path / "src.zip"
+    with zipfile.ZipFile(src, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        for i in range(40):
+            z.writestr(f'vol/{i:03d}.txt', (f'page {i} ' * 5000).encode())
+
+    # ZipFile.open 对打开的条目计数时不加锁，只允许在主线程中调用
+    off_thread_opens = []
+    real_open = zipfile.ZipFile.open
+    def checked_open(self, *args, **kwargs):
+        if threading.current_thread() is not threading.main_thread():
+            off_thread_opens.append(args)
+        return real_open(self, *args, **kwargs)
+    monkeypatch.setattr(zipfile.ZipFile, "open", checked_open)
+
+    _recompress(src, tmp_path / "serial.zip", workers=1)
+    _recompress(src, tmp_path / "parallel.zip", workers=4)
+    assert off_thread_opens == []
+    assert (tmp_path / "serial.zip").read_bytes() == (tmp_path / "parallel.zip").read_bytes()
+    with zipfile.ZipFile(tmp_path / "parallel.zip") as z:
+        assert z.testzip() is None
@@ -0,0 +1,61 @@
+import os
+import shutil
+
+import pytest
+
+import ZipPlanner
+from ZipPlanner import plan_entry_point, write_plan, load_plan, load_plan_paths, ACTION_MODIFY, ACTION_SKIP, ACTION_FAIL
+from ZipWriteLogic import process_single_zip
+
+def quiet(message):
+    pass
+
+@pytest.fixture
+def library(tmp_path, comic_zip):
+    """一个待处理、一个与它重复、一个已插入过扉页、一个损坏的压缩包"""
+    root = tmp_path / "library"
+    root.mkdir()
+    todo = str(root / "a_todo.zip")
+    shutil.copyfile(comic_zip, todo)
+    shutil.copyfile(comic_zip, root / "b_copy.zip")
+    done = str(root / "c_done.zip")
+    shutil.copyfile(comic_zip, done)
+    process_single_zip(done, logger=quiet)
+    (root / "d_broken.zip").write_bytes(b'not a zip file')
+    return root
+
+def by_path(plan):
+    return {os.path.basename(entry["path"]): entry for entry in plan}
+
+def test_plan_round_trip(library, tmp_path):
+    plan = plan_entry_point([str(library)], logger=quiet, dedup=True)
+    entries = by_path(plan)
+    assert {name: entry["action"] for name, entry in entries.items()} == {
+        "a_todo.zip": ACTION_MODIFY, "b_copy.zip": ACTION_SKIP, "c_done.zip": ACTION_SKIP, "d_broken.zip": ACTION_FAIL}
+    assert entries["b_copy.zip"]["reason"] == "duplicate"
+    assert entries["b_copy.zip"]["size"] == os.path.getsize(library / "b_copy.zip")
+
+    for name in ("plan.json", "plan.csv"):
+        out_path = str(tmp_path / name)
+        write_plan(plan, out_path)
+        loaded = load_plan(out_path)
+        assert [(e["path"], e["action"], e["reason"]) for e in loaded] == \
+            [(e["path"], e["action"], e["reason"]) for e in plan]
+        assert load_plan_paths(out_path) == [str(library / "a_todo.zip")]
+        assert load_plan_paths(out_path, ACTION_FAIL) == [str(library / "d_broken.zip")]
+    assert load_plan(str(tmp_path / "plan.json")) == plan
+
+def test_duplicate_removed_during_planning(library, monkeypatch):
+    real_dedup = ZipPlanner.deduplicate_files_by_hash
+    def dedup_then_delete(file_paths, logger=print, on_duplicate=None):
+        duplicates = []
+        unique = real_dedup(file_paths, logger=logger, on_duplicate=duplicates.append)
+        for file_path in duplicates:
+            os.remove(file_path)
+            on_duplicate(file_path)
+        return unique
+    monkeypatch.setattr(ZipPlanner, "deduplicate_files_by_hash", dedup_then_delete)
+
+    entry = by_path(plan_entry_point([str(library)], logger=quiet, dedup=True))["b_copy.zip"]
+    assert entry["action"] == ACTION_FAIL
+    assert entry["reason"].startswith("error: ")
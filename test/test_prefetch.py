@@ -0,0 +1,106 @@
+import os
+import random
+import zipfile
+
+import pytest
+
+from Prefetch import PrefetchedArchive, PrefetchedFile, prefetch_archive, usable_prefetch, PREFETCH_MEMBER_BYTES
+from ZipCache import file_signature
+
+CONTENT = bytes(range(256)) * 40
+
+@pytest.fixture
+def prefetched(tmp_path):
+    """两段条目数据和包含文件末尾的最后一段，中间的空隙只能从真实文件读取"""
+    path = tmp_path / "data.bin"
+    path.write_bytes(CONTENT)
+    ranges = [(100, CONTENT[100:200]), (1000, CONTENT[1000:1100]), (9000, CONTENT[9000:])]
+    return PrefetchedArchive(str(path), file_signature(str(path)), len(CONTENT), ranges)
+
+def read_at(f, position, n=-1):
+    f.seek(position)
+    return f.read(n)
+
+def test_reads_inside_ranges_do_not_open_file(prefetched):
+    f = PrefetchedFile(prefetched)
+    assert read_at(f, 120, 50) == CONTENT[120:170]
+    assert read_at(f, 1000, 100) == CONTENT[1000:1100]
+    assert f.tell() == 1100
+    # 最后一段延伸到文件末尾，读过头时与真实文件一样返回剩余部分
+    assert read_at(f, 9500) == CONTENT[9500:]
+    assert read_at(f, 10000, 1000) == CONTENT[10000:]
+    assert f.read(10) == b''
+    assert f._file is None
+
+def test_reads_outside_ranges_fall_through(prefetched):
+    f = PrefetchedFile(prefetched)
+    try:
+        # 跨过一段的末尾
+        assert read_at(f, 150, 100) == CONTENT[150:250]
+        assert f._file is not None
+        assert f.tell() == 250
+        # 落在空隙中
+        assert read_at(f, 500, 10) == CONTENT[500:510]
+        # read(-1) 从一段中间开始，一直读到文件末尾
+        assert read_at(f, 1050) == CONTENT[1050:]
+        assert read_at(f, 50, -1) == CONTENT[50:]
+    finally:
+        f.close()
+    assert f._file is None
+
+def test_seek(prefetched):
+    f = PrefetchedFile(prefetched)
+    assert f.seek(-10, os.SEEK_END) == len(CONTENT) - 10
+    assert f.seek(-5, os.SEEK_CUR) == len(CONTENT) - 15
+    assert f.read() == CONTENT[-15:]
+    with pytest.raises(ValueError):
+        f.seek(-1)
+
+@pytest.fixture
+def archive(tmp_path):
+    """小条目、压缩后仍超过预读字节数的大条目和一个不压缩的大条目"""
+    rng = random.Random(0)
+    path = tmp_path / "archive.zip"
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('readme.txt', 'comic')
+        for i in range(20):
+            z.writestr(f'book/{i:03d}.bin', rng.randbytes(rng.randrange(1, 3000)))
+        z.writestr('book/large.txt', ''.join(rng.choices('abcd\n', k=8 * PREFETCH_MEMBER_BYTES)))
+        z.writestr('book/random.bin', rng.randbytes(3 * PREFETCH_MEMBER_BYTES), compress_type=zipfile.ZIP_STORED)
+    return str(path)
+
+def members(zf):
+    return {info.filename: zf.read(info) for info in zf.infolist()}
+
+@pytest.mark.parametrize("max_bytes", [None, PREFETCH_MEMBER_BYTES, 16])
+def test_zipfile_over_prefetched_file_matches_real_file(archive, max_bytes):
+    pref = prefetch_archive(archive, lambda index: [(info, max_bytes) for info in index.infos], limit=1 << 30)
+    assert pref.ranges[-1][0] + len(pref.ranges[-1][1]) == os.path.getsize(archive)
+    with zipfile.ZipFile(archive) as z:
+        expected = members(z)
+        large = [info for info in z.infolist() if info.compress_size > PREFETCH_MEMBER_BYTES]
+    assert len(large) == 2
+    f = PrefetchedFile(pref)
+    try:
+        with zipfile.ZipFile(f) as z:
+            assert z.testzip() is None
+            assert members(z) == expected
+    finally:
+        f.close()
+
+def test_fully_prefetched_small_archive_is_read_from_memory(comic_zip):
+    pref = prefetch_archive(comic_zip, lambda index: [(info, None) for info in index.infos])
+    f = PrefetchedFile(pref)
+    with zipfile.ZipFile(comic_zip) as z:
+        expected = members(z)
+    with zipfile.ZipFile(f) as z:
+        assert members(z) == expected
+    assert f._file is None
+
+def test_prefetch_ignored_after_archive_changes(comic_zip):
+    pref = prefetch_archive(comic_zip, lambda index: [])
+    assert usable_prefetch(comic_zip, pref) is pref
+    assert usable_prefetch(comic_zip + ".other", pref) is None
+    with open(comic_zip, 'ab') as f:
+        f.write(b'\0')
+    assert usable_prefetch(comic_zip, pref) is None
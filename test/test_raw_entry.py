@@ -0,0 +1,130 @@
+import shutil
+import struct
+import subprocess
+import zipfile
+import zlib
+
+import pytest
+
+from conftest import entry_list
+from ZipWriteLogic import _write_raw_entry, _copy_raw_entry, _copy_entries, DATA_DESCRIPTOR_FLAG
+
+class UnseekableWriter:
+    """不可定位的输出流：zipfile 会为每个条目写数据描述符"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, data):
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+def unzip_test(path):
+    if shutil.which('unzip') is None:
+        return
+    result = subprocess.run(['unzip', '-tqq', str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+def member_data(path):
+    with zipfile.ZipFile(path) as z:
+        return {info.filename: z.read(info) for info in z.infolist()}
+
+def local_header(path, info):
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        f.seek(name_length, 1)
+        return header, f.read(extra_length)
+
+def zip64_extra(extra):
+    position = 0
+    while position + 4 <= len(extra):
+        extra_id, length = struct.unpack_from('<HH', extra, position)
+        if extra_id == 1:
+            return True
+        position += 4 + length
+    return False
+
+@pytest.mark.parametrize("compress_type", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_zip64_member_with_data_descriptor(tmp_path, monkeypatch, compress_type):
+    data = bytes(range(256)) * 400
+    if compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        raw = compressor.compress(data) + compressor.flush()
+    else:
+        raw = data
+    path = tmp_path / "dd64.zip"
+    # 调低阈值让 100 KB 的条目按 Zip64 写出：本地头带 Zip64 扩展字段，数据描述符使用 8 字节大小
+    with monkeypatch.context() as m:
+        m.setattr(zipfile, 'ZIP64_LIMIT', 1024)
+        with zipfile.ZipFile(path, 'w') as zout:
+            zout.writestr('before.txt', 'before')
+            info = zipfile.ZipInfo('vol/big.bin')
+            info.compress_type = compress_type
+            info.flag_bits |= DATA_DESCRIPTOR_FLAG
+            info.CRC = zlib.crc32(data)
+            info.file_size = len(data)
+            info.compress_size = len(raw)
+            _write_raw_entry(zout, info, [raw[:1000], raw[1000:]])
+            zout.writestr('after.txt', 'after')
+
+    entries = entry_list(path)
+    assert [name for name, _, _ in entries] == ['before.txt', 'vol/big.bin', 'after.txt']
+    assert member_data(path)['vol/big.bin'] == data
+    unzip_test(path)
+    with zipfile.ZipFile(path) as z:
+        big = z.getinfo('vol/big.bin')
+        header, extra = local_header(path, big)
+        after = z.getinfo('after.txt')
+    assert zip64_extra(extra)
+    data_end = big.header_offset + len(header) + len(big.filename) + len(extra) + big.compress_size
+    with open(path, 'rb') as f:
+        f.seek(data_end)
+        descriptor = f.read(24)
+    assert struct.unpack('<4sLQQ', descriptor) == (b'PK\x07\x08', big.CRC, big.compress_size, big.file_size)
+    assert after.header_offset == data_end + 24
+
+def test_copy_member_whose_local_header_has_zip64_extra(tmp_path):
+    src = tmp_path / "src.zip"
+    with open(src, 'wb') as f, zipfile.ZipFile(UnseekableWriter(f), 'w', zipfile.ZIP_DEFLATED) as z:
+        with z.open('book/001.jpg', 'w', force_zip64=True) as member:
+            member.write(b'page one ' * 2000)
+        with z.open('book/002.jpg', 'w', force_zip64=True) as member:
+            member.write(b'page two ' * 3000)
+        z.writestr('readme.txt', 'stored', zipfile.ZIP_STORED)
+    with zipfile.ZipFile(src) as z:
+        infos = z.infolist()
+        # 中央目录里没有 Zip64 字段，只有本地头有，复制时必须按本地头的扩展字段长度定位数据
+        assert all(not zip64_extra(info.extra) for info in infos)
+        assert all(zip64_extra(local_header(src, info)[1]) for info in infos[:2])
+        assert all(info.flag_bits & DATA_DESCRIPTOR_FLAG for info in infos)
+
+    dst = tmp_path / "dst.zip"
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, 'w') as zout:
+        for info in zin.infolist():
+            _copy_raw_entry(zin, zout, info, 'copy/' + info.filename)
+    assert entry_list(dst) == [('copy/' + name, size, crc) for name, size, crc in entry_list(src)]
+    assert member_data(dst) == {'copy/' + name: data for name, data in member_data(src).items()}
+    unzip_test(dst)
+
+def test_rewrite_archive_with_more_than_65535_entries(tmp_path):
+    count = 0xFFFF + 10
+    src = tmp_path / "many.zip"
+    with zipfile.ZipFile(src, 'w') as z:
+        for i in range(count):
+            z.writestr(f'p/{i:05d}.txt', str(i))
+    dst = tmp_path / "many_copy.zip"
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, 'w') as zout:
+        entries = [(info, info.filename) for info in zin.infolist()]
+        for _ in _copy_entries(zin, zout, entries):
+            pass
+    with open(dst, 'rb') as f:
+        f.seek(-200, 2)
+        assert b'PK\x06\x06' in f.read()
+    copied = entry_list(dst)
+    assert len(copied) == count
+    assert copied == entry_list(src)
+    unzip_test(dst)
@@ -0,0 +1,90 @@
+import os
+import shutil
+import zipfile
+
+import pytest
+
+import ZipWriteLogic
+from ZipWriteLogic import process_entry_point
+from RunJournal import RunJournal, JOURNAL_STATE_PLANNED, JOURNAL_STATE_DONE
+from BatchExecutor import ZipResult, STATUS_PROCESSED, STATUS_SKIPPED, DUPLICATE_REASON
+from conftest import make_page
+
+def quiet(message):
+    pass
+
+@pytest.fixture
+def library(tmp_path, comic_zip):
+    """三本内容不同的压缩包，外加 a.zip 的一个副本"""
+    root = tmp_path / "library"
+    root.mkdir()
+    for name, color in (("a", None), ("c", (1, 2, 3)), ("d", (4, 5, 6))):
+        path = root / f"{name}.zip"
+        shutil.copyfile(comic_zip, path)
+        if color is not None:
+            with zipfile.ZipFile(path, 'a') as z:
+                z.writestr('extra.jpg', make_page(color))
+    shutil.copyfile(comic_zip, root / "b.zip")
+    return root
+
+def test_unfinished_records_are_processed_again(tmp_path, comic_zip):
+    journal_path = str(tmp_path / "run.jsonl")
+    with RunJournal(journal_path, "insert") as journal:
+        journal.mark_planned([comic_zip])
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"path": "' + comic_zip + '", "operation": "insert", "sta')  # 写了一半的最后一行
+
+    with RunJournal(journal_path, "insert") as journal:
+        assert journal.entries[comic_zip]["state"] == JOURNAL_STATE_PLANNED
+        assert journal.resume([comic_zip], logger=quiet) == ([comic_zip], [])
+        journal.mark_done(ZipResult(comic_zip, STATUS_PROCESSED, "inserted"))
+    with RunJournal(journal_path, "insert") as journal:
+        assert journal.entries[comic_zip]["state"] == JOURNAL_STATE_DONE
+        assert journal.resume([comic_zip], logger=quiet) == ([], [ZipResult(comic_zip, STATUS_PROCESSED, "inserted")])
+        # 完成之后又被改动过的压缩包重新处理
+        with open(comic_zip, 'ab') as f:
+            f.write(b'\0')
+        assert journal.resume([comic_zip], logger=quiet) == ([comic_zip], [])
+
+def test_resume_after_crash(library, tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "run.jsonl")
+    real_process = ZipWriteLogic.process_single_zip
+    started = []
+
+    def crash_on_second(zip_path, logger=print, **kwargs):
+        started.append(zip_path)
+        if len(started) == 2:
+            # 中途被强行结束，留下写了一半的临时文件
+            with open(zip_path + ".tmp", 'wb') as f:
+                f.write(b'partial')
+            raise KeyboardInterrupt
+        return real_process(zip_path, logger=logger, **kwargs)
+    monkeypatch.setattr(ZipWriteLogic, "process_single_zip", crash_on_second)
+
+    with pytest.raises(KeyboardInterrupt):
+        with RunJournal(journal_path, "insert") as journal:
+            process_entry_point([str(library)], logger=quiet, journal=journal)
+    first, crashed = started
+    with RunJournal(journal_path, "insert") as journal:
+        states = {os.path.basename(p): record["state"] for p, record in journal.entries.items()}
+    assert sorted(states.values()) == [JOURNAL_STATE_DONE] * 2 + [JOURNAL_STATE_PLANNED] * 2
+    assert states[os.path.basename(crashed)] == JOURNAL_STATE_PLANNED
+
+    # 只有处于 planned 状态的压缩包旁边的临时文件是上次中断留下的
+    kept_temps = [first + ".tmp", str(library / "new.zip.tmp")]
+    for temp_path in kept_temps:
+        with open(temp_path, 'wb') as f:
+            f.write(b'not ours')
+    monkeypatch.setattr(ZipWriteLogic, "process_single_zip", real_process)
+    with RunJournal(journal_path, "insert") as journal:
+        results = process_entry_point([str(library)], logger=quiet, journal=journal)
+
+    by_name = {os.path.basename(result.path): result for result in results}
+    assert sorted(by_name) == ["a.zip", "b.zip", "c.zip", "d.zip"]
+    assert by_name[os.path.basename(first)].status == STATUS_PROCESSED
+    duplicates = [r for r in results if r.reason == DUPLICATE_REASON]
+    assert len(duplicates) == 1 and duplicates[0].status == STATUS_SKIPPED
+    assert duplicates[0].path in (str(library / "a.zip"), str(library / "b.zip"))
+    assert by_name[os.path.basename(crashed)] == ZipResult(crashed, STATUS_PROCESSED, "inserted")
+    assert not os.path.exists(crashed + ".tmp")
+    assert all(os.path.exists(temp_path) for temp_path in kept_temps)
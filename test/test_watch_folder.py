@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from WatchFolder import SettleTracker, PollingWatcher, InotifyWatcher, _load_inotify
+
+def write_zip(path, data=b'PK\x05\x06' + b'\x00' * 18):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+def handle_now(tracker, zip_path):
+    tracker.observe(zip_path, 0.0)
+    assert tracker.take_ready(10.0) == [zip_path]
+    tracker.finish(zip_path)
+
+def test_removed_or_renamed_archives_are_forgotten(tmp_path):
+    tracker = SettleTracker(settle=1.0)
+    a = write_zip(tmp_path / "a.zip")
+    b = write_zip(tmp_path / "b.zip")
+    handle_now(tracker, a)
+    handle_now(tracker, b)
+    assert set(tracker.handled) == {a, b}
+
+    os.remove(a)
+    tracker.observe(a, 20.0)
+    renamed = str(tmp_path / "renamed.zip")
+    os.rename(b, renamed)
+    tracker.observe(b, 20.0)
+    assert tracker.handled == {}
+    # 改名后的文件是新路径，照常等待处理
+    tracker.observe(renamed, 20.0)
+    assert renamed in tracker.pending
+
+def test_handled_is_capped_oldest_first(tmp_path):
+    tracker = SettleTracker(settle=1.0, handled_limit=3)
+    paths = [write_zip(tmp_path / f"{i}.zip") for i in range(5)]
+    for zip_path in paths:
+        handle_now(tracker, zip_path)
+    assert list(tracker.handled) == paths[2:]
+    # 再次处理的压缩包移到最后，不会先被忘掉
+    with open(paths[2], 'ab') as f:
+        f.write(b'more')
+    handle_now(tracker, paths[2])
+    handle_now(tracker, write_zip(tmp_path / "new.zip"))
+    assert list(tracker.handled) == [paths[4], paths[2], str(tmp_path / "new.zip")]
+
+def test_unchanged_handled_archive_is_ignored(tmp_path):
+    tracker = SettleTracker(settle=1.0)
+    a = write_zip(tmp_path / "a.zip")
+    handle_now(tracker, a)
+    tracker.observe(a, 20.0)
+    assert tracker.pending == {}
+
+def test_polling_reports_removed_archives(tmp_path):
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    a = write_zip(tmp_path / "a.zip")
+    b = write_zip(sub / "b.zip")
+    notified = []
+    watcher = PollingWatcher([str(tmp_path)], notified.append)
+    os.remove(a)
+    for name in os.listdir(sub):
+        os.remove(sub / name)
+    os.rmdir(sub)
+    # 删除发生在同一时间戳内时目录修改时间可能不变，清掉缓存的修改时间，强制重新列出
+    watcher.directories = {d: (None,) + entry[1:] for d, entry in watcher.directories.items()}
+    watcher.poll()
+    assert sorted(notified) == sorted([a, b])
+
+def test_inotify_reports_deleted_and_moved_archives(tmp_path):
+    libc = _load_inotify()
+    if libc is None:
+        pytest.skip("inotify 不可用")
+    a = write_zip(tmp_path / "a.zip")
+    b = write_zip(tmp_path / "b.zip")
+    notified = []
+    watcher = InotifyWatcher(libc, [str(tmp_path)], notified.append)
+    try:
+        os.remove(a)
+        os.rename(b, tmp_path / "b.txt")
+        watcher._handle_events(os.read(watcher.fd, 64 * 1024))
+    finally:
+        watcher.close()
+    assert notified == [a, b]
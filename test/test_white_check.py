@@ -0,0 +1,34 @@
+import io
+
+import pytest
+from PIL import Image
+
+from ZipDeleteLogic import is_image_completely_white, WHITE_CHECK_BAND_HEIGHT
+
+def reopen(img, image_format):
+    # 按压缩包里的方式从字节流惰性打开
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+@pytest.mark.parametrize("image_format", ['PNG', 'GIF', 'BMP'])
+@pytest.mark.parametrize("mode", ['RGB', 'L', 'P'])
+def test_banded_check_matches_full_conversion(mode, image_format):
+    height = WHITE_CHECK_BAND_HEIGHT * 3 + 5
+    white = Image.new(mode, (50, height), 'white')
+    assert is_image_completely_white(reopen(white, image_format))
+    # 单个非白像素：位于最后一个不完整的横条里，或是第二个横条第一行的近白色
+    for xy, color in (((49, height - 1), (0, 0, 0)), ((0, WHITE_CHECK_BAND_HEIGHT), (250, 250, 250))):
+        page = white.convert('RGB')
+        page.putpixel(xy, color)
+        page = page.convert(mode)
+        expected = reopen(page, image_format).convert('L').getextrema() == (255, 255)
+        assert is_image_completely_white(reopen(page, image_format)) is expected
+        assert not expected or color != (0, 0, 0)
+
+def test_jpeg_white_page():
+    assert is_image_completely_white(reopen(Image.new('RGB', (300, 400), 'white'), 'JPEG'))
+    page = Image.new('RGB', (300, 400), 'white')
+    page.paste((0, 0, 0), (100, 390, 140, 400))
+    assert not is_image_completely_white(reopen(page, 'JPEG'))
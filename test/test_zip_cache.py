@@ -0,0 +1,110 @@
+import builtins
+import os
+import shutil
+import time
+import zipfile
+
+import pytest
+
+from ZipCache import ZipCache, file_signature
+from BatchExecutor import ZipResult, STATUS_PROCESSED, STATUS_SKIPPED, STATUS_FAILED
+
+def quiet(message):
+    pass
+
+@pytest.fixture
+def cache(tmp_path):
+    with ZipCache(str(tmp_path / "cache.sqlite3")) as cache:
+        yield cache
+
+def append_byte(path):
+    with open(path, 'ab') as f:
+        f.write(b'\0')
+
+def touch_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+
+def replace_inode(path):
+    # 内容、大小和修改时间都不变，只换成另一个文件
+    copy = path + ".copy"
+    shutil.copy2(path, copy)
+    os.replace(copy, path)
+
+@pytest.mark.parametrize("change", [append_byte, touch_mtime, replace_inode], ids=["size", "mtime_ns", "ino"])
+def test_signature_change_invalidates(cache, comic_zip, change):
+    signature = file_signature(comic_zip)
+    cache.put_hashes(comic_zip, signature, partial_hash="p", full_hash="f")
+    cache.record_results([ZipResult(comic_zip, STATUS_PROCESSED, "inserted")], "insert", 1)
+    assert cache.get_outcome(comic_zip, "insert", 1) == (STATUS_PROCESSED, "inserted")
+    assert cache.get_hashes(comic_zip, signature) == ("p", "f")
+
+    change(comic_zip)
+    new_signature = file_signature(comic_zip)
+    assert new_signature != signature
+    assert cache.get_outcome(comic_zip, "insert", 1) is None
+    assert cache.get_hashes(comic_zip, new_signature) == (None, None)
+    assert cache.split_cached([comic_zip], "insert", 1, logger=quiet) == ([comic_zip], [])
+
+def test_logic_version_bump_invalidates(cache, comic_zip):
+    cache.record_results([ZipResult(comic_zip, STATUS_SKIPPED, "already_processed")], "insert", 1)
+    assert cache.get_outcome(comic_zip, "insert", 1) == (STATUS_SKIPPED, "already_processed")
+    assert cache.get_outcome(comic_zip, "insert", 2) is None
+    assert cache.get_outcome(comic_zip, "remove", 1) is None
+    assert cache.split_cached([comic_zip], "insert", 2, logger=quiet) == ([comic_zip], [])
+
+def test_failed_and_cached_results(cache, comic_zip):
+    cache.record_results([ZipResult(comic_zip, STATUS_PROCESSED, "inserted")], "insert", 1)
+    # 命中缓存的结果不重新记录，失败的结果清除旧记录
+    cache.record_results([ZipResult(comic_zip, STATUS_SKIPPED, "cached")], "insert", 1)
+    assert cache.get_outcome(comic_zip, "insert", 1) == (STATUS_PROCESSED, "inserted")
+    cache.record_results([ZipResult(comic_zip, STATUS_FAILED, "error")], "insert", 1)
+    assert cache.get_outcome(comic_zip, "insert", 1) is None
+
+def fill(cache, paths, start):
+    """按顺序写入，每条的使用时间比上一条晚一秒"""
+    for i, path in enumerate(paths):
+        cache.put_hashes(path, (1, 2, 3), partial_hash=f"p{i}")
+        cache.conn.execute("UPDATE hashes SET used = ? WHERE path = ?", (start + i, path))
+        cache.conn.execute("INSERT OR REPLACE INTO outcomes VALUES (?, 'insert', 1, 1, 2, 3, ?, '', ?)",
+                           (path, STATUS_PROCESSED, start + i))
+    cache.conn.commit()
+
+def cached_paths(cache):
+    return {table: sorted(row[0] for row in cache.conn.execute(f"SELECT path FROM {table}"))
+            for table in ('hashes', 'outcomes')}
+
+def test_eviction_by_entry_count(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    paths = [f"/library/{i}.zip" for i in range(5)]
+    with ZipCache(db_path) as cache:
+        fill(cache, paths, time.time() - 100)
+    # 重新打开时按最近使用时间只保留 max_entries 条
+    with ZipCache(db_path, max_entries=3) as cache:
+        assert cached_paths(cache) == {"hashes": paths[2:], "outcomes": paths[2:]}
+
+def test_eviction_by_age(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    now = time.time()
+    with ZipCache(db_path) as cache:
+        fill(cache, ["/library/old.zip"], now - 31 * 86400)
+        fill(cache, ["/library/new.zip"], now - 29 * 86400)
+    with ZipCache(db_path, max_age_days=30) as cache:
+        assert cached_paths(cache) == {"hashes": ["/library/new.zip"], "outcomes": ["/library/new.zip"]}
+
+def test_split_cached_does_not_open_archives(cache, comic_zip, tmp_path, monkeypatch):
+    other = str(tmp_path / "other.zip")
+    shutil.copyfile(comic_zip, other)
+    cache.record_results([ZipResult(comic_zip, STATUS_PROCESSED, "inserted")], "insert", 1)
+
+    def no_open(*args, **kwargs):
+        raise AssertionError(f"不应打开文件: {args}")
+    with monkeypatch.context() as m:
+        m.setattr(zipfile, "ZipFile", no_open)
+        m.setattr(builtins, "open", no_open)
+        todo, cached = cache.split_cached([comic_zip, other], "insert", 1, logger=quiet)
+        streamed = []
+        assert list(cache.iter_uncached([comic_zip, other], "insert", 1, streamed)) == [other]
+    assert todo == [other]
+    assert cached == [ZipResult(comic_zip, STATUS_SKIPPED, "cached")]
+    assert streamed == cached
@@ -0,0 +1,126 @@
+"""ZipInternals 依赖的 zipfile 私有接口；升级 Python 后这里失败，说明需要先修改 ZipInternals"""
+import io
+import struct
+import sys
+import zipfile
+import zlib
+
+import pytest
+
+from ZipInternals import (
+    MIN_PYTHON,
+    get_compressor,
+    get_decompressor,
+    archive_lock,
+    central_directory_offset,
+    begin_raw_write,
+    end_raw_write,
+    move_last_entry,
+    set_compresslevel,
+    RawNameZipInfo
+)
+
+DATA = b'crossfix page data\n' * 500
+
+def test_python_version():
+    assert sys.version_info >= MIN_PYTHON
+
+def test_private_names_exist():
+    for name in ('_get_compressor', '_get_decompressor'):
+        assert callable(getattr(zipfile, name, None)), f"zipfile.{name} 已不存在"
+    assert callable(getattr(zipfile.ZipFile, '_writecheck', None))
+    assert callable(getattr(zipfile.ZipInfo, '_encodeFilenameFlags', None))
+    assert 'compress_level' in zipfile.ZipInfo.__slots__ or '_compresslevel' in zipfile.ZipInfo.__slots__
+    with zipfile.ZipFile(io.BytesIO(), 'w') as zout:
+        for name in ('_lock', '_didModify', 'start_dir', 'filelist', 'NameToInfo', 'fp'):
+            assert hasattr(zout, name), f"ZipFile.{name} 已不存在"
+        assert zout.infolist() is zout.filelist
+
+def test_compressor_round_trip():
+    compressor = get_compressor(zipfile.ZIP_DEFLATED, 9)
+    compressed = compressor.compress(DATA) + compressor.flush()
+    assert zlib.decompress(compressed, -15) == DATA
+    decompressor = get_decompressor(zipfile.ZIP_DEFLATED)
+    assert decompressor.decompress(compressed) == DATA
+    assert get_compressor(zipfile.ZIP_STORED) is None
+    assert get_decompressor(zipfile.ZIP_STORED) is None
+
+def test_set_compresslevel_is_used_by_open():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zout:
+        for level in (1, 9):
+            info = zipfile.ZipInfo(f'level{level}.txt')
+            info.compress_type = zipfile.ZIP_DEFLATED
+            set_compresslevel(info, level)
+            with zout.open(info, 'w') as dst:
+                dst.write(DATA)
+    with zipfile.ZipFile(buffer) as zin:
+        for level in (1, 9):
+            info = zin.getinfo(f'level{level}.txt')
+            expected = zlib.compressobj(level, zlib.DEFLATED, -15)
+            assert info.compress_size == len(expected.compress(DATA) + expected.flush())
+            assert zin.read(info) == DATA
+
+def write_raw(zout, name, data):
+    info = zipfile.ZipInfo(name)
+    info.compress_type = zipfile.ZIP_STORED
+    info.file_size = info.compress_size = len(data)
+    info.CRC = zlib.crc32(data)
+    begin_raw_write(zout, info)
+    zout.fp.write(info.FileHeader(False))
+    zout.fp.write(data)
+    end_raw_write(zout, info)
+    return info
+
+def test_raw_write_registers_entries():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zout:
+        zout.writestr('001.jpg', b'first')
+        start = central_directory_offset(zout)
+        info = write_raw(zout, '003.jpg', b'raw data')
+        assert info.header_offset == start
+        assert central_directory_offset(zout) == zout.fp.tell() > start
+        assert zout.getinfo('003.jpg') is info
+        # 之后照常写入的条目接在文件末尾，在中央目录中移到第二位
+        zout.writestr('002.jpg', b'second')
+        move_last_entry(zout, 1)
+        # _writecheck 仍在起作用：重名时与 writestr 一样给出警告
+        with pytest.warns(UserWarning, match="Duplicate name"):
+            write_raw(zout, '001.jpg', b'again')
+        zout.filelist.pop()
+    with zipfile.ZipFile(buffer) as zin:
+        assert zin.testzip() is None
+        assert zin.namelist() == ['001.jpg', '002.jpg', '003.jpg']
+        assert zin.read('003.jpg') == b'raw data'
+        assert central_directory_offset(zin) == len(buffer.getvalue()) - 22 - sum(
+            46 + len(i.filename) for i in zin.infolist())
+
+def test_raw_write_on_closed_archive_fails():
+    zout = zipfile.ZipFile(io.BytesIO(), 'w')
+    zout.close()
+    with pytest.raises(ValueError):
+        write_raw(zout, 'late.jpg', b'data')
+
+def test_archive_lock_guards_fp():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zout:
+        zout.writestr('a.txt', DATA)
+    with zipfile.ZipFile(buffer) as zin:
+        lock = archive_lock(zin)
+        with lock:
+            # 可重入：zipfile 自己在持有锁时也会再次获取
+            with lock:
+                zin.fp.seek(0)
+                assert zin.fp.read(4) == b'PK\x03\x04'
+        with zin.open('a.txt') as f:
+            assert f.read() == DATA
+
+def test_raw_name_keeps_original_bytes():
+    raw_name = '第一卷/扉页.jpg'.encode('gbk')
+    info = zipfile.ZipInfo(raw_name.decode('cp437'))
+    info.CRC = 0
+    info.__class__ = RawNameZipInfo
+    assert info._encodeFilenameFlags() == (raw_name, 0)
+    header = info.FileHeader(False)
+    name_length, = struct.unpack_from('<H', header, 26)
+    assert header[30:30 + name_length] == raw_name